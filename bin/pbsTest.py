@@ -62,7 +62,7 @@ class Pbs(object):
         
 def main(db, visit, dataSource,
          noop=False, nCcd=10, queue='batch', nodes=None, ppn=None, camera="suprimecam-mit",
-         mail=None, rmlog=False, newQa=False, jobs=None):
+         mail=None, rmlog=False, newQa=False, jobs=None, nShard=None, shardCost=None):
 
     ###############################
     # init some variables
@@ -114,13 +114,24 @@ def main(db, visit, dataSource,
     #########
     # scatter
     qaPath = "pipeQa.py"
-    scatCmd = qaPath + " --noWwwCache -C %s -v %s -d %s -c $PBS_ARRAYID -S none %s" % (camera, visit,
-                                                                                       dataSource, db)
+    shardDir = os.path.join(cwd, "pipeQaShards_" + wwwrerun)
+    if nShard:
+        # each array job runs a balanced share of all the (visit,ccd) units
+        nJob = nShard
+        shardOpt = "--shard $PBS_ARRAYID/%d --shardDir %s" % (nShard, shardDir)
+        if shardCost:
+            shardOpt += " --shardCost %s" % (shardCost)
+        scatCmd = qaPath + " --noWwwCache -C %s -v %s -d %s %s -S none %s" % (camera, visit, dataSource,
+                                                                               shardOpt, db)
+    else:
+        nJob = nCcd
+        scatCmd = qaPath + " --noWwwCache -C %s -v %s -d %s -c $PBS_ARRAYID -S none %s" % (camera, visit,
+                                                                                           dataSource, db)
     scat.addCmd(scatCmd, noop=noop)
 
     scatFile = "qsub-scat.sh"
     scat.write(scatFile)
-    scatCmd = ["qsub", "-V", "-t",  "0-%d%s" % (nCcd-1, "%"+str(jobs) if jobs else ""),  scatFile]
+    scatCmd = ["qsub", "-V", "-t",  "0-%d%s" % (nJob-1, "%"+str(jobs) if jobs else ""),  scatFile]
     scatProc = subprocess.Popen(scatCmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
     scatId = scatProc.communicate()[0].strip()
     scatId = re.sub("\[\].*", "[]", scatId)
@@ -130,7 +141,12 @@ def main(db, visit, dataSource,
     # gather
     # this should use 'afteranyarray' but there's a bug in the version currently installed on master
     gath.depend = "afterokarray:"+scatId
-    gathCmd = qaPath + " -C %s -v %s -d %s -S summOnly %s" % (camera, visit, dataSource, db)
+    if nShard:
+        # fail loudly if any shard didn't finish
+        gathCmd = qaPath + " -C %s -v %s -d %s -S summOnly --shardVerify %d --shardDir %s %s" % \
+            (camera, visit, dataSource, nShard, shardDir, db)
+    else:
+        gathCmd = qaPath + " -C %s -v %s -d %s -S summOnly %s" % (camera, visit, dataSource, db)
     gath.addCmd(gathCmd, noop=noop)
 
     gathFile = "qsub-gath.sh"
@@ -163,6 +179,10 @@ if __name__ == "__main__":
     parser.add_argument("--nodes", default=None, type=int, help="Number of nodes")
     parser.add_argument("--ppn", default=None, type=int, help="Processes per node")
     parser.add_argument("--jobs", default=None, type=int, help="Number of parallel jobs")
+    parser.add_argument("--shards", default=None, type=int,
+                        help="Split all (visit,ccd) units into this many balanced jobs (instead of 1 per CCD)")
+    parser.add_argument("--shardCost", default=None,
+                        help="Balance --shards by the costs in this file, or the run times in this shard directory")
     parser.add_argument("-Q", "--queue", type=str, default="batch", help="Name of PBS queue")
     parser.add_argument("-r", "--rmlog", action='store_true', default=False, help="Remove old logs.")
     parser.add_argument("-s", "--monitor", action='store_true', default=False,
@@ -172,7 +192,8 @@ if __name__ == "__main__":
     main(args.db, args.visit, args.dataSource,
          noop=args.noop, nCcd=args.nCcd, queue=args.queue,
          nodes=args.nodes, ppn=args.ppn,
-         camera=args.camera, mail=args.mail, rmlog=args.rmlog, newQa=args.newQa, jobs=args.jobs)
+         camera=args.camera, mail=args.mail, rmlog=args.rmlog, newQa=args.newQa, jobs=args.jobs,
+         nShard=args.shards, shardCost=args.shardCost)
 
     if args.monitor:
         import commands
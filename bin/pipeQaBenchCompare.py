@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+#
+# LSST Data Management System
+# Copyright 2008, 2009, 2010 LSST Corporation.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+#
+#
+# Compare two benchmark files written by 'pipeQa.py --benchFile', and exit
+# non-zero if any metric has regressed significantly.
+#
+#   pipeQaBenchCompare.py before.json after.json [--relTol 0.1] [--nSigma 3] [--all]
+#
+import sys
+import argparse
+import lsst.testing.pipeQA.BenchCompare as benchCompare
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("old", help="Benchmark file for the reference run")
+    parser.add_argument("new", help="Benchmark file for the run to check")
+    parser.add_argument("-r", "--relTol", default=0.1, type=float,
+                        help="Smallest fractional change considered significant (default=%(default)s)")
+    parser.add_argument("-n", "--nSigma", default=3.0, type=float,
+                        help="Changes must also exceed this many times the ccd-to-ccd noise (default=%(default)s)")
+    parser.add_argument("-a", "--all", default=False, action="store_true",
+                        help="List all metrics, not just those which changed significantly")
+    args = parser.parse_args()
+
+    results = benchCompare.compareBench(benchCompare.readBench(args.old), benchCompare.readBench(args.new),
+                                        args.relTol, args.nSigma)
+    print benchCompare.formatResults(results, args.all)
+
+    if [r for r in results if r['status'] == "REGRESSED"]:
+        sys.exit(1)
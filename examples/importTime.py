@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+#
+# Measure the startup cost of pipeQa: the time to import the task machinery and
+# build its config, and which of the heavy packages get pulled in along the way.
+#
+# Each case is run in a fresh python process, several times, and the best and
+# median wall times are reported.
+#
+#   examples/importTime.py [-n 5] [--config doPhotCompareQa=False ...]
+#
+
+import sys, os
+import argparse
+import subprocess
+import numpy
+
+
+heavyModules = ["matplotlib", "lsst.meas.astrom", "lsst.meas.photocal", "lsst.ap.cluster",
+                "lsst.daf.persistence", "pyfits", "lsst.testing.pipeQA.figures"]
+
+cases = [
+    ("pipeQA",          "import lsst.testing.pipeQA"),
+    ("PipeQaTask",      "from lsst.testing.pipeQA.analysis.PipeQaTask import PipeQaTask"),
+    ("PipeQaTask+args", "from lsst.testing.pipeQA.analysis.PipeQaTask import PipeQaTask\n" +
+                        "task = PipeQaTask()\n" +
+                        "config = task._makeArgumentParser().parse_args(ARGS).config"),
+    ]
+
+probe = """
+import sys, time
+ARGS = %r
+t0 = time.time()
+%s
+t = time.time() - t0
+print t, " ".join([m for m in %r if sys.modules.has_key(m)])
+"""
+
+
+def timeCase(code, args, n):
+    times = []
+    loaded = ""
+    for i in range(n):
+        src = probe % (args, code, heavyModules)
+        p = subprocess.Popen([sys.executable, "-c", src], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        out, err = p.communicate()
+        if p.returncode != 0:
+            return None, err.strip().split("\n")[-1]
+        fields = out.strip().split("\n")[-1].split(None, 1)
+        times.append(float(fields[0]))
+        loaded = fields[1] if len(fields) > 1 else ""
+    return times, loaded
+
+
+def main(n, config):
+
+    args = ["dummyDataset"]
+    if config:
+        args += ["--config"] + config
+
+    print "%-16s %8s %8s  %s" % ("case", "best[s]", "med[s]", "heavy modules loaded")
+    for label, code in cases:
+        times, loaded = timeCase(code, args, n)
+        if times is None:
+            print "%-16s %8s %8s  failed: %s" % (label, "-", "-", loaded)
+            continue
+        print "%-16s %8.3f %8.3f  %s" % (label, min(times), numpy.median(times), loaded)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--nTrial", type=int, default=5, help="Number of trials per case")
+    parser.add_argument("--config", nargs="*", default=[],
+                        help="config overrides passed to pipeQa, e.g. doPhotCompareQa=False")
+    args = parser.parse_args()
+    main(args.nTrial, args.config)
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+#
+# Measure the peak memory (and time) of pairing the reference ids matched in two
+# visits, as VisitToVisitPhotQaTask.plotCcd does, with IdJoin.joinAll() and with
+# the numpy.equal.outer() matrix it replaced.
+#
+# Each case is run in a fresh python process, and the growth in its peak rss is
+# reported.  The outer-product method needs N*M bytes, so it's only run up to --outerMax.
+#
+#   examples/pairMemory.py [-s 5000 20000 50000] [--outerMax 20000]
+#
+
+import sys
+import argparse
+import subprocess
+
+
+setup = """
+import resource, time, numpy
+import lsst.testing.pipeQA.analysis.IdJoin as idJoin
+numpy.random.seed(1)
+n = %d
+# ids as stored in the RaftCcdVectors: floats, mostly shared between the two visits
+idA = numpy.random.permutation(2*n)[:n].astype(float)
+idB = numpy.random.permutation(2*n)[:n].astype(float)
+rss0 = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+t0 = time.time()
+"""
+
+cases = [
+    ("joinAll",     "sliceA, sliceB = idJoin.joinAll(idA, idB)"),
+    ("equal.outer", "sliceA, sliceB = numpy.where(numpy.equal.outer(idA, idB) == True)"),
+    ]
+
+probe = """
+%s
+%s
+t = time.time() - t0
+print t, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss0, len(sliceA)
+"""
+
+
+def runCase(code, n):
+    p = subprocess.Popen([sys.executable, "-c", probe % (setup % (n), code)],
+                         stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    out, err = p.communicate()
+    if p.returncode != 0:
+        return None, err.strip().split("\n")[-1]
+    t, drss, npair = out.strip().split("\n")[-1].split()
+    return float(t), int(drss), int(npair)
+
+
+def main(sizes, outerMax):
+
+    print "%-12s %8s %8s %12s %10s" % ("method", "N", "pairs", "peak[MB]", "time[s]")
+    for n in sizes:
+        for name, code in cases:
+            if name == "equal.outer" and n > outerMax:
+                print "%-12s %8d %8s %12s %10s   (skipped, needs ~%.0f MB)" % (name, n, "-", "-", "-", n*n/1.0e6)
+                continue
+            result = runCase(code, n)
+            if result[0] is None:
+                print "%-12s %8d failed: %s" % (name, n, result[1])
+                continue
+            t, drss, npair = result
+            print "%-12s %8d %8d %12.1f %10.4f" % (name, n, npair, drss/1024.0, t)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-s", "--sizes", type=int, nargs="+", default=[5000, 20000, 50000],
+                        help="Number of matches in each visit (default=%(default)s)")
+    parser.add_argument("-o", "--outerMax", type=int, default=20000,
+                        help="Largest size to try with numpy.equal.outer (default=%(default)s)")
+    args = parser.parse_args()
+    main(args.sizes, args.outerMax)
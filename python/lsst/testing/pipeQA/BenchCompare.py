@@ -0,0 +1,161 @@
+#
+# LSST Data Management System
+# Copyright 2008, 2009, 2010 LSST Corporation.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+#
+
+"""Compare two pipeQa benchmark files (written with --benchFile) and find regressions.
+
+A benchmark file holds, for each ccd, metrics such as:
+  task.<test>.test, task.<test>.plot   seconds in each task phase
+  load.<what>                          seconds loading (from printStartLoad/printStopLoad)
+  throughput.<what>                    rows loaded per second
+  rss.peak                             peak rss seen while running the ccd [kB]
+  ccd.total                            seconds for the whole ccd
+
+Each metric is compared ccd by ccd: the change is the median log ratio of new/old,
+and its noise is estimated from the scatter of those ratios.  A metric regresses
+if it got worse by more than both the relative tolerance and nSigma times its noise,
+and by more than an absolute floor (so millisecond phases don't trip the gate).
+"""
+
+import os
+import json
+import math
+import numpy
+
+
+# absolute changes smaller than these are never significant
+absFloors = {
+    'task'       : 0.05,     # s
+    'load'       : 0.05,     # s
+    'ccd'        : 0.1,      # s
+    'rss'        : 10240.0,  # kB
+    'throughput' : 0.0,
+    }
+
+
+def writeBench(filename, ccds, meta=None):
+    """Write a benchmark file (atomically, it's rewritten as a run progresses).
+
+    @param ccds  dict of ccd dataId string: {metric: value}
+    @param meta  dict of information about the run
+    """
+    tmp = filename + ".tmp"
+    fp = open(tmp, 'w')
+    json.dump({'meta': meta or {}, 'ccds': ccds}, fp, indent=1, sort_keys=True)
+    fp.close()
+    os.rename(tmp, filename)
+
+
+def readBench(filename):
+    """Read the per-ccd metrics from a benchmark file."""
+    fp = open(filename)
+    bench = json.load(fp)
+    fp.close()
+    return bench['ccds']
+
+
+def higherIsBetter(metric):
+    return metric.startswith("throughput.")
+
+
+def compareMetric(metric, old, new, relTol=0.1, nSigma=3.0):
+    """Compare one metric between two runs.
+
+    @param old, new  dicts of ccd: value
+    @return dict with the medians, the change and its noise (as log ratios), and the verdict
+    """
+
+    ccds = [k for k in old.keys() if k in new and old[k] > 0 and new[k] > 0]
+    if len(ccds) > 0:
+        # paired: the same ccds in both runs
+        oldV = numpy.array([old[k] for k in ccds], dtype=float)
+        newV = numpy.array([new[k] for k in ccds], dtype=float)
+        logRatio = numpy.log(newV/oldV)
+        change = numpy.median(logRatio)
+        mad = numpy.median(numpy.abs(logRatio - change))
+        noise = 1.4826*mad/math.sqrt(len(ccds))
+    else:
+        oldV = numpy.array([v for v in old.values() if v > 0], dtype=float)
+        newV = numpy.array([v for v in new.values() if v > 0], dtype=float)
+        if len(oldV) == 0 or len(newV) == 0:
+            return None
+        change = math.log(numpy.median(newV)/numpy.median(oldV))
+        noise = 0.0
+        for v in (oldV, newV):
+            lv = numpy.log(v)
+            noise += (1.4826*numpy.median(numpy.abs(lv - numpy.median(lv))))**2/len(v)
+        noise = math.sqrt(noise)
+
+    oldMed, newMed = numpy.median(oldV), numpy.median(newV)
+    worse = -change if higherIsBetter(metric) else change
+    threshold = max(math.log(1.0 + relTol), nSigma*noise)
+    floor = absFloors.get(metric.split(".")[0], 0.0)
+    significant = abs(worse) > threshold and abs(newMed - oldMed) > floor
+
+    status = "ok"
+    if significant:
+        status = "REGRESSED" if worse > 0 else "improved"
+    return {
+        'metric'    : metric,
+        'n'         : len(ccds) if len(ccds) > 0 else min(len(oldV), len(newV)),
+        'old'       : oldMed,
+        'new'       : newMed,
+        'change'    : math.exp(change) - 1.0,
+        'threshold' : math.exp(threshold) - 1.0,
+        'status'    : status,
+        }
+
+
+def compareBench(oldCcds, newCcds, relTol=0.1, nSigma=3.0):
+    """Compare all the metrics in two benchmarks.
+
+    @param oldCcds, newCcds  dicts of ccd: {metric: value}, as from readBench()
+    @return list of the results from compareMetric(), sorted by metric
+    """
+
+    def byMetric(ccds):
+        metrics = {}
+        for ccd, values in ccds.items():
+            for metric, value in values.items():
+                if value is not None:
+                    metrics.setdefault(metric, {})[ccd] = value
+        return metrics
+
+    oldM, newM = byMetric(oldCcds), byMetric(newCcds)
+    results = []
+    for metric in sorted(set(oldM.keys()) & set(newM.keys())):
+        result = compareMetric(metric, oldM[metric], newM[metric], relTol, nSigma)
+        if result is not None:
+            results.append(result)
+    return results
+
+
+def formatResults(results, showAll=False):
+    lines = ["%-50s %5s %12s %12s %8s %8s  %s" %
+             ("metric", "n", "old", "new", "change", "thresh", "status")]
+    for r in results:
+        if showAll or r['status'] != "ok":
+            lines.append("%-50s %5d %12.4g %12.4g %+7.1f%% %7.1f%%  %s" %
+                         (r['metric'], r['n'], r['old'], r['new'], 100.0*r['change'],
+                          100.0*r['threshold'], r['status']))
+    nReg = len([r for r in results if r['status'] == "REGRESSED"])
+    lines.append("%d of %d metrics regressed" % (nReg, len(results)))
+    return "\n".join(lines)
@@ -59,6 +59,7 @@ import simRefObject as simRefObj
 import source       as pqaSource
 
 from QaData import QaData
+from Tracer import getTracer
 
 #######################################################################
 #
@@ -116,6 +117,7 @@ class ButlerQaData(QaData):
         #######################################
         # get butler
         self.butler = dafPersist.Butler(self.dataDir)
+        self.butler.get = getTracer().wrap(self.butler.get, "butler.get", "butler", nameArg=True)
 
         
         ####################################################
@@ -134,7 +136,14 @@ class ButlerQaData(QaData):
     def reduceAvailableDataTupleList(self, dataIdRegexDict):
         """Reduce availableDataTupleList by keeping only dataIds that match the input regex."""
         self.dataTuples = self._regexMatchDataIds(dataIdRegexDict, self.availableDataTuples)
-        
+
+    def refresh(self):
+        """Requery the registry, and retry any calexps which were missing last time."""
+        self.availableDataTuples = self.butler.queryMetadata(self.cameraInfo.rawName, self.dataIdNames,
+                                                             format=self.dataIdNames)
+        self.dataTuples = self.availableDataTuples
+        self.alreadyTriedCalexp = set()
+
     def initCache(self):
 
         QaData.initCache(self)
@@ -24,6 +24,7 @@ import os
 import lsst.pex.policy as pexPolicy
 import time
 from lsst.pex.logging import Trace
+from Tracer import getTracer
 
 class DatabaseIdentity:
     """
@@ -114,6 +115,7 @@ class LsstSimDbInterface(DatabaseInterface):
         results = self.cursor.fetchall()
         t1 = time.time()
         Trace("lsst.testing.pipeQA.LsstSimDbInterface", 2, "Time for SQL query: %.2f s" % (t1-t0))
+        getTracer().complete("sql", "sql", t0, t1, sql=sql)
         
         return results
 
@@ -91,8 +91,7 @@ class DbQaData(QaData):
         @param cameraInfo A cameraInfo object describing the camera for these data
         """
         QaData.__init__(self, database, rerun, cameraInfo, qaDataUtils, **kwargs)
-        self.dbId        = DatabaseIdentity(self.label)
-        self.dbInterface = LsstSimDbInterface(self.dbId)
+        self.dbInterface = self.makeDbInterface()
 
         self.refStr = {'obj' : ('Obj', 'object'), 'src' : ('Src', 'source') }
 
@@ -177,6 +176,12 @@ class DbQaData(QaData):
                 self.dbAliases[k] = k
 
 
+
+    def makeDbInterface(self):
+        """Connect to the database named by our label."""
+        self.dbId = DatabaseIdentity(self.label)
+        return LsstSimDbInterface(self.dbId)
+
                 
     def initCache(self):
 
@@ -1077,6 +1082,36 @@ class DbQaData(QaData):
         
         return copy.copy(self.brokenDataIdList)
 
+
+    def estimateSourceCounts(self, dataIdRegex):
+        """Count the sources in each sensor matching dataIdRegex, without loading them.
+
+        @param dataIdRegex dataId dict of regular expressions for data to be counted
+        """
+
+        sceNames = [
+            [x[0], "sce."+x[1]]
+            for x in self.cameraInfo.dataIdDbNames.items() if not re.search("snap", x[0])
+            ]
+
+        sql  = 'select '+", ".join(zip(*sceNames)[1])+', count(*)'
+        sql += '  from '+self.sTable+' as s, '+self.sceTable+' as sce'
+        sql += '  where (s.'+self.sceId+' = sce.'+self.sceId+')'
+        for keyNames in sceNames:
+            key, sqlName = keyNames
+            if dataIdRegex.has_key(key):
+                sql += '    and '+self._sqlLikeEqual(sqlName, dataIdRegex[key])
+        sql += '  group by '+", ".join(zip(*sceNames)[1])
+
+        results = self.dbInterface.execute(sql)
+
+        counts = {}
+        for r in results:
+            thisDataId = dict(zip(zip(*sceNames)[0], r[:-1]))
+            counts[self._dataIdToString(thisDataId, defineFully=True)] = r[-1]
+        return counts
+
+
     def getSummaryDataBySensor(self, dataIdRegex):
         """Get a dict of dict objects which contain specific summary data.
         
@@ -25,6 +25,7 @@ import psycopg2
 import lsst.pex.policy as pexPolicy
 import time
 from lsst.pex.logging import Trace
+from Tracer import getTracer
 
 class DatabaseIdentity:
     """
@@ -111,6 +112,7 @@ class DbInterface(DatabaseInterface):
         results = self.cursor.fetchall()
         t1 = time.time()
         Trace("lsst.testing.pipeQA.HscDbInterface", 2, "Time for SQL query: %.2f s" % (t1-t0))
+        getTracer().complete("sql", "sql", t0, t1, sql=sql)
         return results
 
     
@@ -0,0 +1,203 @@
+#
+# LSST Data Management System
+# Copyright 2008, 2009, 2010 LSST Corporation.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsstcorp.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+#
+
+import sys, types
+import gc
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+def typeName(obj):
+    t = type(obj)
+    if t is types.InstanceType:
+        t = obj.__class__
+    module = getattr(t, '__module__', None)
+    if module and module != '__builtin__':
+        return module + "." + t.__name__
+    return t.__name__
+
+
+def countObjects():
+    """Count the objects the garbage collector knows about, by type.
+
+    @return dict of type name: [count, bytes]
+    """
+    gc.collect()
+    counts = {}
+    for obj in gc.get_objects():
+        entry = counts.setdefault(typeName(obj), [0, 0])
+        entry[0] += 1
+        try:
+            entry[1] += sys.getsizeof(obj)
+        except Exception:
+            pass
+    return counts
+
+
+# we don't follow references out of these; they're shared, not owned
+stopTypes = (types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType,
+             types.ClassType, type)
+
+def retainedObjects(obj, exclude=()):
+    """Count the objects reachable from obj's attributes (ie. what it's holding on to).
+
+    @param obj      The object (eg. a QaAnalysisTask)
+    @param exclude  Objects not to count or follow (eg. the QaData, the log, the config)
+    """
+    seen = set([id(obj)] + [id(x) for x in exclude])
+    todo = [getattr(obj, '__dict__', {})]
+    n = 0
+    while todo:
+        o = todo.pop()
+        if id(o) in seen or isinstance(o, stopTypes):
+            continue
+        seen.add(id(o))
+        n += 1
+        todo += gc.get_referents(o)
+    return n
+
+
+def isGrowing(values):
+    """Has a series grown at every step (after the first, which includes warm-up)?"""
+    if len(values) < 3:
+        return False
+    values = values[1:]
+    steps = [b - a for a, b in zip(values[:-1], values[1:])]
+    return min(steps) >= 0 and values[-1] > values[0]
+
+
+class MemoryMonitor(object):
+    """Snapshot python heap statistics as pipeQa works through its ccds, to find leaks.
+
+    After each ccd we record the rss, the number of objects (by type) known to the
+    garbage collector and, if tracemalloc is available, the allocations by line.
+    After each task's free() we count what the task still holds on to.
+    """
+
+    def __init__(self, nTop=20):
+        """
+        @param nTop  Number of types, tasks and allocation sites to list in the report
+        """
+        self.nTop = nTop
+        self.labels = []
+        self.rss = []
+        self.counts = []
+        self.retained = {}    # task name: [number of objects after each free()]
+
+        self.mallocStart = None
+        if tracemalloc is not None:
+            tracemalloc.start()
+            self.mallocStart = tracemalloc.take_snapshot()
+
+
+    def taskFreed(self, task, exclude=()):
+        """Record what a task still holds after its free() method.
+
+        @param task     The QaAnalysisTask
+        @param exclude  Shared objects not to count (eg. the QaData)
+        """
+        n = retainedObjects(task, exclude)
+        self.retained.setdefault(str(task), []).append(n)
+
+
+    def snapshot(self, label, rss=None):
+        """Record the heap after a ccd has been processed and its caches cleared.
+
+        @param label  Label for this snapshot (eg. the dataId)
+        @param rss    The rss of the process (kB), if known
+        """
+        self.labels.append(label)
+        self.rss.append(rss)
+        self.counts.append(countObjects())
+
+
+    def totals(self):
+        return [sum([c[0] for c in counts.values()]) for counts in self.counts]
+
+
+    def growingTypes(self):
+        """Get the types whose count grew at every snapshot, with their total growth, biggest first."""
+        growing = []
+        if len(self.counts) == 0:
+            return growing
+        for name in self.counts[-1].keys():
+            series = [counts.get(name, [0, 0])[0] for counts in self.counts]
+            if isGrowing(series):
+                last = self.counts[-1][name]
+                first = self.counts[1].get(name, [0, 0])
+                growing.append((name, last[0] - first[0], last[1] - first[1]))
+        return sorted(growing, key=lambda g: -g[1])
+
+
+    def leakiestTasks(self):
+        """Get the tasks, by the number of objects they gained between their first and last free()."""
+        growth = []
+        for name, series in self.retained.items():
+            growth.append((name, series[-1] - series[0], series[-1], isGrowing(series)))
+        return sorted(growth, key=lambda g: -g[1])
+
+
+    def writeReport(self, filename):
+        """Write a text report of the growth seen so far."""
+
+        lines = []
+        totals = self.totals()
+
+        lines.append("# per-ccd heap snapshots (after clearCache)")
+        lines.append("%-40s %12s %12s" % ("dataId", "rss[kB]", "nObjects"))
+        for label, rss, total in zip(self.labels, self.rss, totals):
+            lines.append("%-40s %12s %12d" % (label, str(rss), total))
+        lines.append("")
+
+        rss = [r for r in self.rss if r is not None]
+        lines.append("rss growing monotonically:      %s" % (isGrowing(rss)))
+        lines.append("objects growing monotonically:  %s" % (isGrowing(totals)))
+        lines.append("")
+
+        lines.append("# types growing at every ccd (count and bytes gained since the second ccd)")
+        for name, dn, dbytes in self.growingTypes()[:self.nTop]:
+            lines.append("%-50s %+10d %+12d" % (name, dn, dbytes))
+        lines.append("")
+
+        lines.append("# objects still held by each task after free() (gained since first ccd, last)")
+        tasks = self.leakiestTasks()
+        for name, dn, n, growing in tasks[:self.nTop]:
+            lines.append("%-50s %+10d %10d %s" % (name, dn, n, "growing" if growing else ""))
+        if len(tasks) > 0 and tasks[0][1] > 0:
+            lines.append("")
+            lines.append("task leaving the most behind after free(): %s" % (tasks[0][0]))
+        lines.append("")
+
+        if self.mallocStart is not None:
+            lines.append("# top allocations since start (tracemalloc)")
+            stats = tracemalloc.take_snapshot().compare_to(self.mallocStart, 'lineno')
+            for stat in stats[:self.nTop]:
+                lines.append(str(stat))
+        else:
+            lines.append("# tracemalloc not available; see the types above for what's accumulating")
+
+        fp = open(filename, 'w')
+        fp.write("\n".join(lines) + "\n")
+        fp.close()
@@ -24,6 +24,7 @@ import sys, os, re, copy, time
 import numpy
 
 import source as pqaSource
+from Tracer import getTracer
 
 import lsst.pex.logging as pexLog
 
@@ -65,6 +66,7 @@ class QaData(object):
         self.loadDepth = 0
         self.lastPrint = None
         self.t0 = []
+        self.loadMessages = []
 
         self.brokenDataIdList = []
 
@@ -120,13 +122,136 @@ class QaData(object):
         self.k_nchild  = catObj.keyDict['deblend_nchild']
             
 
+    # flags which mark a source as bad, unless a task asks for others (see getFlagMask())
+    defaultFlags = ("intc", "satc", "edg", "nchild")
+    # flags which are counts, rather than booleans
+    countFlags = ("nchild",)
+
     def isFlagged(self, src):
+        """Is a single source flagged bad (by the default flags)?  See getFlagMask() for whole catalogs."""
         intcen = src.getI(self.k_intc)
         satcen = src.getI(self.k_satc)
         edge   = src.getI(self.k_edg)
         nchild = src.getI(self.k_nchild) > 0
         return  intcen or satcen or edge or nchild
-        
+
+    def getColumn(self, sources, key):
+        """Get one field of a catalog, or of a list of records (eg. from a matchList), as a numpy array.
+
+        @param sources  a SourceCatalog, or a list of source records
+        @param key      the key of the field, eg. self.k_Psf
+        """
+        # contiguous catalogs give us the column directly; catalogs built with addNew()
+        # needn't be contiguous, and lists of records have no isContiguous() (or get())
+        isContiguous = getattr(sources, "isContiguous", None)
+        if isContiguous is not None and isContiguous():
+            return numpy.array(sources.get(key))
+        return numpy.array([s.get(key) for s in sources])
+
+    def getFlagMask(self, sources, flags=None, cacheKey=None):
+        """Get a boolean array, True for each source with any of the given flags set.
+
+        @param sources   a SourceCatalog, or a list of source records
+        @param flags     names of the flags (the keys without their k_, eg. ["intc", "edg"]);
+                         default is self.defaultFlags
+        @param cacheKey  if given, keep the mask (until clearCache()) under this key and the flags,
+                         eg. (ccd dataId string, "matched"); see _sameSources() for when it's reused
+        """
+        if flags is None:
+            flags = self.defaultFlags
+        flags = tuple(flags)
+
+        if cacheKey is not None:
+            cached = self.flagMaskCache.get((cacheKey, flags))
+            if cached is not None and self._sameSources(cached[0], sources):
+                return cached[1]
+
+        mask = numpy.zeros(len(sources), dtype=bool)
+        for flag in flags:
+            column = self.getNamedColumn(sources, flag, cacheKey)
+            if flag in self.countFlags:
+                mask |= column > 0
+            else:
+                mask |= column != 0
+
+        if cacheKey is not None:
+            self.flagMaskCache[(cacheKey, flags)] = (sources, mask)
+        return mask
+
+    def _sameSources(self, cached, sources):
+        """Are sources the ones a cached mask or column was made from?
+
+        Lists of records (eg. the sources of a matchList, which each task builds for itself)
+        must hold the very same records.  Catalogs are copied when they're handed out, so
+        for those the length has to do.
+        """
+        if len(cached) != len(sources):
+            return False
+        if isinstance(cached, list) or isinstance(sources, list):
+            if not (isinstance(cached, list) and isinstance(sources, list)):
+                return False
+            for c, s in zip(cached, sources):
+                if c is not s:
+                    return False
+        return True
+
+    def isFlaggedArray(self, sources):
+        """Vectorized isFlagged(): a boolean array with True for each flagged source."""
+        return self.getFlagMask(sources)
+
+    def _getDerived(self, sources, name, compute, cacheKey):
+        """Get compute(), kept (until clearCache()) under (cacheKey, name) if cacheKey is given."""
+        if cacheKey is not None:
+            cached = self.derivedCache.get((cacheKey, name))
+            if cached is not None and self._sameSources(cached[0], sources):
+                return cached[1]
+        column = compute()
+        if cacheKey is not None:
+            self.derivedCache[(cacheKey, name)] = (sources, column)
+        return column
+
+    def getNamedColumn(self, sources, name, cacheKey=None):
+        """Get the column of key k_<name> (eg. "Psf", "rPsf", "ext") as a numpy array.
+
+        The derived columns below all take a cacheKey, which identifies the sources (eg. (ccd
+        dataId string, "matched")), so that each column is computed once per ccd, however many
+        tasks ask for it.  The keys of reference sources start with "r", so the sources and
+        reference sources of a matchList can share a cacheKey.
+
+        @param sources   a SourceCatalog, or a list of source records
+        @param name      the key's name, without its k_
+        @param cacheKey  if given, keep the column under this key (until clearCache())
+        """
+        return self._getDerived(sources, name,
+                                lambda: self.getColumn(sources, getattr(self, "k_" + name)), cacheKey)
+
+    def getMagColumn(self, sources, name, cacheKey=None):
+        """Get -2.5*log10(flux) of the flux k_<name> (eg. "Psf", or "rPsf" for reference sources)."""
+        def compute():
+            flux = self.getNamedColumn(sources, name, cacheKey)
+            with numpy.errstate(invalid='ignore', divide='ignore'):
+                return -2.5*numpy.log10(flux)
+        return self._getDerived(sources, ("mag", name), compute, cacheKey)
+
+    def getMagErrColumn(self, sources, name, cacheKey=None):
+        """Get the magnitude errors, 2.5/ln(10)*fluxErr/flux, of the flux k_<name> (its error is k_<name>E)."""
+        def compute():
+            flux = self.getNamedColumn(sources, name, cacheKey)
+            fluxErr = self.getNamedColumn(sources, name + "E", cacheKey)
+            with numpy.errstate(invalid='ignore', divide='ignore'):
+                return 2.5 / numpy.log(10.0) * fluxErr / flux
+        return self._getDerived(sources, ("magErr", name), compute, cacheKey)
+
+    def getStarMask(self, sources, cacheKey=None):
+        """Get a boolean array, True for each source which isn't extended (k_ext == 0)."""
+        return self._getDerived(sources, "star",
+                                lambda: self.getNamedColumn(sources, "ext", cacheKey) == 0, cacheKey)
+
+    def getUncalibratedFluxColumn(self, sources, name, fmag0, cacheKey=None):
+        """Get the flux k_<name> in counts, ie. times fmag0 (fluxes are divided by fmag0 when they're loaded)."""
+        return self._getDerived(sources, ("uncalibrated", name, fmag0),
+                                lambda: self.getNamedColumn(sources, name, cacheKey)*fmag0, cacheKey)
+
     def printStartLoad(self, message):
 
         self.loadStr = ""
@@ -139,14 +264,24 @@ class QaData(object):
         self.loadDepth += 1
         t0 = time.time()
         self.t0.append(t0)
+        self.loadMessages.append(message)
         self.log.log(self.log.INFO, self.loadStr)
 
-        
+
+    def printMidLoad(self, message):
+        self.log.log(self.log.INFO, " "*4*self.loadDepth + message)
+
+
     def printStopLoad(self, message=""):
         t0 = self.t0[-1]
         self.t0 = self.t0[:-1]
         t_final = time.time()
         t_elapsed = t_final - t0
+        startMessage = self.loadMessages.pop()
+        # name the span by what was loaded, not which dataId it was for
+        spanName = re.sub("\s*for:.*$", "", startMessage).split(": ")[-1].strip()
+        getTracer().complete(spanName, "load", t0, t_final, message=startMessage)
+        self.loadTimes[spanName] = self.loadTimes.get(spanName, 0.0) + t_elapsed
         done =  message + " ... done (%.2fs)." % t_elapsed
         self.loadStr = ""
         if self.loadDepth > 1:
@@ -190,8 +325,15 @@ class QaData(object):
         self.filterCache = {}
         self.calibCache = {}
         self.sqlCache = {"match": {}, "src": {}}
+
+        # boolean masks of flagged sources (and the sources), by (catalog, flags); see getFlagMask()
+        self.flagMaskCache = {}
+        # columns and quantities derived from them (mags, star masks, ...), with their sources, by (catalog, name)
+        self.derivedCache = {}
         
         self.performCache = {}
+        # time spent in each kind of load (by printStartLoad message)
+        self.loadTimes = {}
         
         # store the explicit dataId (ie. no regexes) for each key used in a cache
         self.dataIdLookup = {}
@@ -215,6 +357,8 @@ class QaData(object):
             "calib"          : self.calibCache,  
             "dataIdLookup"   : self.dataIdLookup,
             "sql"            : self.sqlCache,
+            "flagMask"       : self.flagMaskCache,
+            "derived"        : self.derivedCache,
             }
 
 
@@ -258,6 +402,13 @@ class QaData(object):
                     del cache[key]
         self.initCache()
 
+    def refresh(self):
+        """Pick up data which has appeared since we were constructed.
+
+        Queries are rerun after clearCache(), so there's nothing to do by default.
+        """
+        pass
+
     def printCache(self):
         for name, cache in self.__dict__.items():
             if re.search("^_", name):
@@ -493,7 +644,81 @@ class QaData(object):
             visits[visit] = True
         return visits.keys()
 
-    
+
+    def estimateSourceCounts(self, dataIdRegex):
+        """Cheaply count the sources in each sensor matching dataIdRegex, without loading them.
+
+        Only loaders which can fetch several sensors in a single query should provide this,
+        as batchDataId() uses it to decide when to do so.
+
+        @param dataIdRegex dataId dict of regular expressions for data to be counted
+        @return dict of (fully defined) dataId strings and source counts, or None if unknown
+        """
+        return None
+
+
+    def batchDataId(self, dataIdRegex, memBudget, bytesPerSource=2000):
+        """Break a dataId into batches of sensors, each small enough to load within a memory budget.
+
+        A batch is the whole dataId if it fits, otherwise one per raft (for cameras with rafts)
+        if they all fit, otherwise one per sensor.  Without source counts (see
+        estimateSourceCounts), every sensor is its own batch.
+
+        @param dataIdRegex    dataId dict (typically a single visit) to be broken
+        @param memBudget      memory (bytes) allowed for the data loaded for one batch
+        @param bytesPerSource estimated memory per source, including its match and reference object
+
+        @return list of [batchDataId, list of the sensor dataIds in the batch]
+        """
+
+        sensorDataIds = self.breakDataId(dataIdRegex, 'ccd')
+        batches = [[dataId, [dataId]] for dataId in sensorDataIds]
+
+        counts = None
+        if len(sensorDataIds) > 1:
+            counts = self.estimateSourceCounts(dataIdRegex)
+
+        if counts is not None:
+
+            def batchSize(members):
+                keys = [self._dataIdToString(dataId, defineFully=True) for dataId in members]
+                return bytesPerSource*sum([counts.get(key, 0) for key in keys])
+
+            candidates = [ [[dataIdRegex, sensorDataIds]] ]
+            if 'raft' in self.dataIdNames:
+                byRaft = {}
+                for dataId in sensorDataIds:
+                    byRaft.setdefault(str(dataId['raft']), []).append(dataId)
+                raftBatches = []
+                for raft in sorted(byRaft.keys()):
+                    raftDataId = copy.copy(dataIdRegex)
+                    raftDataId['raft'] = raft
+                    raftBatches.append([raftDataId, byRaft[raft]])
+                candidates.append(raftBatches)
+
+            for candidate in candidates:
+                if max([batchSize(members) for batchDataId, members in candidate]) <= memBudget:
+                    batches = candidate
+                    break
+
+        # the tasks make their summary figures on the last sensor
+        self.brokenDataIdList = [dataId for batchDataId, members in batches for dataId in members]
+        return batches
+
+
+    def loadBatch(self, batchDataId):
+        """Load the calexps, sources and matches of a batch of sensors, each with a single query.
+
+        The tasks are then run on each sensor of the batch with its own dataId,
+        and are served from the caches (until clearCache()).
+
+        @param batchDataId dataId dict of regular expressions for the batch, as given by batchDataId()
+        """
+        self.loadCalexp(batchDataId)
+        self.getSourceSetBySensor(batchDataId)
+        self.getMatchListBySensor(batchDataId)
+
+
     #########################################################
     # pure virtual methods
         
@@ -30,7 +30,6 @@ import lsst.afw.image   as afwImage
 import lsst.afw.coord   as afwCoord
 import lsst.pex.logging  as pexLog
 import lsst.pex.policy  as pexPolicy
-import lsst.meas.astrom as measAstrom
 import lsst.meas.algorithms.utils as maUtils
 
 class QaDataUtils(object):
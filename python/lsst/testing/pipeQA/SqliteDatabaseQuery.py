@@ -0,0 +1,343 @@
+#
+# LSST Data Management System
+# Copyright 2008, 2009, 2010 LSST Corporation.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+#
+
+import os, re
+import math
+import time
+import datetime
+import sqlite3
+from lsst.pex.logging import Trace
+from Tracer import getTracer
+
+
+#######################################################################
+# spherical polygon helpers standing in for the scisql UDFs
+#######################################################################
+
+def _radecToVec(ra, dec):
+    """Convert ra,dec (degrees) to a unit vector."""
+    ra, dec = math.radians(ra), math.radians(dec)
+    cosDec = math.cos(dec)
+    return (cosDec*math.cos(ra), cosDec*math.sin(ra), math.sin(dec))
+
+def _cross(a, b):
+    return (a[1]*b[2] - a[2]*b[1], a[2]*b[0] - a[0]*b[2], a[0]*b[1] - a[1]*b[0])
+
+def _dot(a, b):
+    return a[0]*b[0] + a[1]*b[1] + a[2]*b[2]
+
+
+def s2CPolyToBin(*radec):
+    """Encode the vertices of a convex spherical polygon (ra1, dec1, ra2, dec2, ...).
+
+    This plays the role of scisql_s2CPolyToBin(); the encoding is a plain
+    comma-separated string so it can be stored in an sqlite variable.
+    """
+    if len(radec) < 6 or len(radec) % 2:
+        raise ValueError("A polygon needs at least 3 ra,dec vertex pairs (got %d values)" % (len(radec)))
+    return ",".join([repr(float(x)) for x in radec])
+
+
+def s2CPolyFromBin(poly):
+    """Decode a polygon string into a list of (ra, dec) vertices."""
+    values = [float(x) for x in str(poly).split(",")]
+    return zip(values[0::2], values[1::2])
+
+
+_edgeCache = {}
+def _polyEdgeNormals(poly):
+    """Get the (cached) edge normals of a polygon, oriented to point inward."""
+    if poly in _edgeCache:
+        return _edgeCache[poly]
+
+    verts = [_radecToVec(ra, dec) for ra, dec in s2CPolyFromBin(poly)]
+    center = [sum(v[i] for v in verts) for i in range(3)]
+    normals = []
+    for i in range(len(verts)):
+        n = _cross(verts[i], verts[(i+1) % len(verts)])
+        if _dot(n, center) < 0.0:
+            n = (-n[0], -n[1], -n[2])
+        normals.append(n)
+
+    if len(_edgeCache) > 64:
+        _edgeCache.clear()
+    _edgeCache[poly] = normals
+    return normals
+
+
+def s2PtInCPoly(ra, dec, poly):
+    """Return 1 if ra,dec lies inside the convex polygon, 0 otherwise (cf. scisql_s2PtInCPoly())."""
+    if ra is None or dec is None or poly is None:
+        return 0
+    p = _radecToVec(ra, dec)
+    for n in _polyEdgeNormals(poly):
+        if _dot(n, p) < 0.0:
+            return 0
+    return 1
+
+
+def s2CPolyBbox(poly, pad=1.0/3600.0):
+    """Get an ra,dec bounding box for a polygon.
+
+    @param poly  A polygon string from s2CPolyToBin()
+    @param pad   Padding (degrees) to allow for the curvature of great-circle edges.
+
+    @return (raRanges, decRange) where raRanges is a list of (lo, hi) in [0, 360)
+            (two ranges if the polygon straddles ra=0).
+    """
+    verts = s2CPolyFromBin(poly)
+    ras  = [ra % 360.0 for ra, dec in verts]
+    decs = [dec for ra, dec in verts]
+
+    decSpan = max(decs) - min(decs)
+    pad    += 0.01*decSpan
+    decLo, decHi = max(min(decs) - pad, -90.0), min(max(decs) + pad, 90.0)
+
+    # a pole inside the polygon means all ra values are allowed
+    for pole in (90.0, -90.0):
+        if s2PtInCPoly(0.0, pole, poly):
+            if pole > 0:
+                decHi = 90.0
+            else:
+                decLo = -90.0
+            return [(0.0, 360.0)], (decLo, decHi)
+
+    # pad ra by the same angle on the sky
+    cosDec = max(math.cos(math.radians(max(abs(decLo), abs(decHi)))), 1.0e-6)
+    raPad = pad/cosDec
+
+    ras = sorted(ras)
+    # find the largest gap between vertices ... the polygon lies on the other side of it
+    gaps = [(ras[(i+1) % len(ras)] - ras[i]) % 360.0 for i in range(len(ras))]
+    iGap = gaps.index(max(gaps))
+    raLo, raHi = ras[(iGap+1) % len(ras)], ras[iGap]
+
+    if raLo <= raHi:
+        return [(max(raLo - raPad, 0.0), min(raHi + raPad, 360.0))], (decLo, decHi)
+    else:
+        return [(raLo - raPad, 360.0), (0.0, raHi + raPad)], (decLo, decHi)
+
+
+
+class DatabaseIdentity:
+    """
+    Locate an sqlite file standing in for a database.  The label may be a path
+    to the file, or the name of a file (optionally without a .sqlite3 or .db suffix)
+    in one of the TESTBED_PATH directories.
+    """
+    def __init__(self, sqliteDb):
+        self.sqliteDb   = sqliteDb
+        self.loadId()
+
+    def loadId(self):
+        candidates = [self.sqliteDb]
+        if os.environ.has_key('TESTBED_PATH'):
+            for path_elem in os.getenv("TESTBED_PATH").split(":"):
+                for suffix in ("", ".sqlite3", ".sqlite", ".db"):
+                    candidates.append(os.path.join(path_elem, self.sqliteDb + suffix))
+
+        found = [c for c in candidates if os.path.isfile(c)]
+        if len(found) == 0:
+            raise Exception("Unable to find sqlite database '%s' (tried: %s)" %
+                            (self.sqliteDb, ", ".join(candidates)))
+        self.sqliteFile = found[0]
+
+
+# Base class
+class DatabaseInterface():
+    def __init__(self):
+        pass
+
+
+class SqliteDbInterface(DatabaseInterface):
+    """A local stand-in for LsstSimDbInterface.
+
+    The queries written for MySQL+scisql are rewritten on the fly:
+      - 'show columns from X'                    -> PRAGMA table_info(X)
+      - 'select ... into @var'                   -> the result is kept as a session variable
+      - 'call scisql...'                         -> a no-op
+      - 'inner join scisql.Region ...' and index hints are dropped
+      - scisql_s2PtInCPoly(a.ra, a.decl, @poly) gets an R-tree bounding-box prefilter
+    """
+
+    # tables given an ra/decl R-tree on connect
+    spatialTables = ("RefObject", "Source")
+
+    def __init__(self, dbId):
+        """
+        @param dbId  A DatabaseIdentity object containing the sqlite filename
+        """
+        self.dbId = dbId
+        DatabaseInterface.__init__(self)
+
+        self.variables = {}
+        self.connect()
+
+
+    def connect(self):
+        sqlite3.register_converter("DATETIME", sqlite3.converters['TIMESTAMP'])
+        self.db     = sqlite3.connect(self.dbId.sqliteFile, detect_types=sqlite3.PARSE_DECLTYPES)
+        self.db.text_factory = str
+        self.db.create_function("scisql_s2CPolyToBin", -1, s2CPolyToBin)
+        self.db.create_function("scisql_s2PtInCPoly", 3, s2PtInCPoly)
+        self.cursor = self.db.cursor()
+
+        self.rtrees = {}
+        for table in self.spatialTables:
+            self.ensureSpatialIndex(table)
+
+
+    def ensureSpatialIndex(self, table):
+        """Build an R-tree on (ra, decl) for table, unless it already exists.
+
+        @param table Name of the table to index.
+        """
+        rtree = table + "_rtree"
+        existing = [r[0] for r in self.cursor.execute("select name from sqlite_master").fetchall()]
+        if rtree in existing:
+            self.rtrees[table] = rtree
+            return
+        if table not in existing:
+            return
+
+        columns = [r[1] for r in self.cursor.execute("PRAGMA table_info(%s)" % (table)).fetchall()]
+        if not ('ra' in columns and 'decl' in columns):
+            return
+
+        t0 = time.time()
+        try:
+            self.cursor.execute("create virtual table %s using rtree(id, minRa, maxRa, minDecl, maxDecl)" %
+                                (rtree))
+            self.cursor.execute("insert into %s select rowid, ra, ra, decl, decl from %s" % (rtree, table) +
+                                " where ra is not null and decl is not null")
+            self.db.commit()
+        except sqlite3.OperationalError, e:
+            # eg. a read-only file ... we'll just do without the prefilter
+            Trace("lsst.testing.pipeQA.SqliteDbInterface", 1,
+                  "Unable to create R-tree for %s: %s" % (table, str(e)))
+            self.db.rollback()
+            return
+        t1 = time.time()
+        Trace("lsst.testing.pipeQA.SqliteDbInterface", 2, "Time to build %s: %.2f s" % (rtree, t1-t0))
+        self.rtrees[table] = rtree
+
+
+    def _tableForAlias(self, sql, alias):
+        m = re.search(r"(?:\w+\.)?(\w+)\s+as\s+%s\b" % (alias), sql, re.IGNORECASE)
+        if m:
+            return m.group(1)
+        return alias
+
+
+    def _addSpatialPrefilter(self, sql):
+        """Put an R-tree bounding box test in front of each scisql_s2PtInCPoly() call."""
+
+        def prefilter(m):
+            alias, var = m.group(1), m.group(3)
+            poly = self.variables.get(var, None)
+            call = "scisql_s2PtInCPoly(%s.ra, %s.decl, @%s) = 1" % (alias, alias, var)
+
+            rtree = self.rtrees.get(self._tableForAlias(sql, alias), None)
+            if poly is None or rtree is None:
+                return call
+
+            raRanges, (decLo, decHi) = s2CPolyBbox(poly)
+            raWhere = " or ".join(["(maxRa >= %r and minRa <= %r)" % (lo, hi) for lo, hi in raRanges])
+            box  = "select id from %s where (%s)" % (rtree, raWhere)
+            box += " and maxDecl >= %r and minDecl <= %r" % (decLo, decHi)
+            return "(%s.rowid in (%s) and %s)" % (alias, box, call)
+
+        return re.sub(r"scisql_s2PtInCPoly\(\s*(\w+)\.ra\s*,\s*(\w+)\.decl\s*,\s*@(\w+)\s*\)\s*=\s*1",
+                      prefilter, sql, flags=re.IGNORECASE)
+
+
+    def _substituteVariables(self, sql):
+        def value(m):
+            v = self.variables.get(m.group(1), None)
+            if v is None:
+                return "NULL"
+            if isinstance(v, (int, long, float)):
+                return repr(v)
+            return "'" + str(v).replace("'", "''") + "'"
+        return re.sub(r"@(\w+)", value, sql)
+
+
+    def translate(self, sql):
+        """Rewrite a MySQL+scisql statement for sqlite.
+
+        @param sql Command to be translated.
+
+        @return (sql, variable) where variable is the name of an 'into @variable' target, or None.
+        """
+
+        m = re.search(r"^\s*show\s+columns\s+from\s+(\w+)\s*;?\s*$", sql, re.IGNORECASE)
+        if m:
+            return "PRAGMA table_info(%s)" % (m.group(1)), None
+
+        if re.search(r"^\s*call\s+", sql, re.IGNORECASE):
+            return None, None
+
+        variable = None
+        m = re.search(r"^(.*?)\s+into\s+@(\w+)\s*;?\s*$", sql, re.IGNORECASE | re.DOTALL)
+        if m:
+            sql, variable = m.group(1), m.group(2)
+
+        sql = re.sub(r"inner\s+join\s+scisql\.Region\s+as\s+\w+\s+on\s+\([^)]*\)", " ", sql,
+                     flags=re.IGNORECASE)
+        sql = re.sub(r"use\s+index(\s+for\s+join)?\s*\([^)]*\)", " ", sql, flags=re.IGNORECASE)
+        sql = self._addSpatialPrefilter(sql)
+        sql = self._substituteVariables(sql)
+        return sql, variable
+
+
+    def execute(self, sql):
+        """Execute an sql command
+
+        @param sql Command to be executed.
+        """
+        Trace("lsst.testing.pipeQA.SqliteDbInterface", 3, "Executing: %s" % (sql))
+        t0 = time.time()
+
+        sqlLite, variable = self.translate(sql)
+        if sqlLite is None:
+            return []
+
+        try:
+            self.cursor.execute(sqlLite)
+        except Exception, e:
+            print sqlLite
+            raise
+        results = self.cursor.fetchall()
+
+        if re.search(r"^PRAGMA table_info", sqlLite):
+            # put the column name first, as 'show columns' does
+            results = [tuple(r[1:]) for r in results]
+
+        if variable is not None:
+            self.variables[variable] = results[0][0] if len(results) > 0 else None
+            results = []
+
+        t1 = time.time()
+        Trace("lsst.testing.pipeQA.SqliteDbInterface", 2, "Time for SQL query: %.2f s" % (t1-t0))
+        getTracer().complete("sql", "sql", t0, t1, sql=sql)
+
+        return results
@@ -0,0 +1,56 @@
+#
+# LSST Data Management System
+# Copyright 2008, 2009, 2010 LSST Corporation.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+#
+
+from SqliteDatabaseQuery import SqliteDbInterface, DatabaseIdentity
+from DbQaData            import DbQaData
+
+
+#########################################################################
+#
+#
+#
+#########################################################################
+class SqliteDbQaData(DbQaData):
+    """A DbQaData served from a local sqlite file.
+
+    The file must hold the Science_Ccd_Exposure, Source, Ref*Match and RefObject
+    tables with the same schema as the MySQL databases.  The scisql polygon
+    functions are provided by SqliteDbInterface.
+    """
+
+    def __init__(self, database, rerun, cameraInfo, **kwargs):
+        """
+        @param database The sqlite file (or its name in a TESTBED_PATH directory)
+        @param rerun The data rerun to use
+        @param cameraInfo A cameraInfo object describing the camera for these data
+        """
+        DbQaData.__init__(self, database, rerun, cameraInfo, **kwargs)
+
+
+    def makeDbInterface(self):
+        """Open the sqlite file named by our label."""
+        self.dbId = DatabaseIdentity(self.label)
+        return SqliteDbInterface(self.dbId)
+
+    def getDataName(self):
+        """Get a string representation of ourself."""
+        return self.dbId.sqliteFile+" rerun="+str(self.rerun)
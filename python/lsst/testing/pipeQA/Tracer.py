@@ -0,0 +1,161 @@
+#
+# LSST Data Management System
+# Copyright 2008, 2009, 2010 LSST Corporation.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+#
+
+import os, re, glob
+import time
+import json
+import thread
+
+
+class Tracer(object):
+    """Record timed spans (loads, sql queries, butler gets, task phases, figures) for a run.
+
+    Spans are kept as Chrome trace-event 'complete' events, and can be written as
+    Chrome trace json (load in chrome://tracing) or as folded stacks for flamegraph.pl.
+    Nothing is recorded unless the tracer is enabled, so the hooks cost almost
+    nothing in a normal run.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.events = []
+
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+
+
+    def reset(self):
+        """Forget everything recorded so far (eg. in a newly forked worker)."""
+        self.events = []
+
+
+    def complete(self, name, cat, t0, t1, **args):
+        """Record a span which ran from t0 to t1 (as returned by time.time()).
+
+        @param name  Name of the span (keep it generic, the details go in args)
+        @param cat   Category: load, sql, butler, task, figure, ccd, ...
+        @param args  Extra information to show with the span
+        """
+        if not self.enabled:
+            return
+        event = {
+            'name' : name,
+            'cat'  : cat,
+            'ph'   : 'X',
+            'ts'   : t0*1.0e6,
+            'dur'  : (t1 - t0)*1.0e6,
+            'pid'  : os.getpid(),
+            'tid'  : thread.get_ident(),
+            }
+        if args:
+            event['args'] = dict([(k, str(v)) for k, v in args.items()])
+        self.events.append(event)
+
+
+    def wrap(self, func, name, cat, nameArg=False):
+        """Return func, wrapped to record a span each time it's called.
+
+        @param nameArg  Append the first argument to the span name (eg. the butler dataset type)
+        """
+        if not self.enabled:
+            return func
+        def traced(*args, **kwargs):
+            spanName = name
+            if nameArg and len(args) > 0:
+                spanName += " " + str(args[0])
+            t0 = time.time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.complete(spanName, cat, t0, time.time(), args=args, kwargs=kwargs)
+        return traced
+
+
+    def saveEvents(self, filename):
+        """Write our events (eg. from a worker process) for a later absorb()."""
+        fp = open(filename, 'w')
+        json.dump(self.events, fp)
+        fp.close()
+
+
+    def absorb(self, pattern):
+        """Add the events saved by other processes in files matching pattern, and remove the files."""
+        for filename in sorted(glob.glob(pattern)):
+            fp = open(filename)
+            self.events += json.load(fp)
+            fp.close()
+            os.unlink(filename)
+
+
+    def writeChromeTrace(self, filename):
+        """Write our events in Chrome's trace-event format."""
+        fp = open(filename, 'w')
+        json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms'}, fp)
+        fp.close()
+
+
+    def foldedStacks(self):
+        """Get the self-time (microseconds) of each stack of nested spans, keyed by 'pid;outer;...;inner'."""
+
+        stacks = {}
+        threads = {}
+        for event in self.events:
+            threads.setdefault((event['pid'], event['tid']), []).append(event)
+
+        for (pid, tid), events in threads.items():
+            # parents start first, or at the same time but last longer
+            events = sorted(events, key=lambda e: (e['ts'], -e['dur']))
+            open_ = []   # [end, path, selfTime] of the enclosing spans
+
+            def close(span):
+                stacks[span[1]] = stacks.get(span[1], 0.0) + max(span[2], 0.0)
+
+            for event in events:
+                while open_ and open_[-1][0] <= event['ts']:
+                    close(open_.pop())
+                name = re.sub("[;\s]+", "_", event['name'])
+                if open_:
+                    open_[-1][2] -= event['dur']
+                    path = open_[-1][1] + ";" + name
+                else:
+                    path = "pid%d" % (pid) + ";" + name
+                open_.append([event['ts'] + event['dur'], path, event['dur']])
+            while open_:
+                close(open_.pop())
+
+        return stacks
+
+
+    def writeFoldedStacks(self, filename):
+        """Write folded stacks (as read by flamegraph.pl), with self-times in microseconds."""
+        fp = open(filename, 'w')
+        for path, t in sorted(self.foldedStacks().items()):
+            fp.write("%s %d\n" % (path, int(t)))
+        fp.close()
+
+
+# the tracer for this process
+tracer = Tracer()
+
+def getTracer():
+    return tracer
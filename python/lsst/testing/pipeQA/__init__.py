@@ -26,8 +26,8 @@ from CameraInfo   import *
 
 # the QaData 
 from QaData       import *
-from ButlerQaData import *
 from makeQaData   import *
+# ... the loaders (ButlerQaData, DbQaData, etc) are imported by makeQaData when needed
 
 from DatabaseQuery import *
 
@@ -32,6 +32,7 @@ import lsst.pex.config              as pexConfig
 import lsst.pipe.base               as pipeBase
 
 from   .QaAnalysisTask              import QaAnalysisTask
+from   .QaAnalysisConfig            import AstrometricErrorQaConfig
 import lsst.testing.pipeQA.figures  as qaFig
 import lsst.testing.pipeQA.TestCode as testCode
 import lsst.testing.pipeQA.figures.QaFigureUtils as qaFigUtil
@@ -42,14 +43,6 @@ import QaPlotUtils                  as qaPlotUtil
 
 
 
-class AstrometricErrorQaConfig(pexConfig.Config):
-    cameras = pexConfig.ListField(dtype = str,
-                                  doc = "Cameras to run AstrometricErrorQaTask",
-                                  default = ("lsstSim", "hsc", "suprimecam", "cfht", "sdss", "coadd"))
-    maxErr  = pexConfig.Field(dtype = float,
-                              doc = "Maximum astrometric error (in arcseconds)",
-                              default = 0.09)
-
 class AstrometricErrorQaTask(QaAnalysisTask):
     ConfigClass = AstrometricErrorQaConfig
     _DefaultName = "astrometricErrorQa"
@@ -82,6 +75,36 @@ class AstrometricErrorQaTask(QaAnalysisTask):
         del self.medErrArcsec
         del self.medThetaRad
 
+    def _getOffsetColumns(self, data, matchList, cacheKey=None):
+        """Get the offsets (radians) from the reference positions, and the pixel positions, of unflagged matches.
+
+        All the matches on a ccd are done at once, with the same arithmetic as was done match
+        by match, so the results are identical.
+
+        @param matchList  list of [sref, s, dist]
+        @param cacheKey   key for the ccd's columns in data's cache (see QaData.getNamedColumn)
+        @return dict of arrays: dRa, dDec, x, y
+        """
+        srefs = [m[0] for m in matchList]
+        ss    = [m[1] for m in matchList]
+        
+        ra     = numpy.radians(data.getNamedColumn(ss, "Ra", cacheKey))
+        dec    = numpy.radians(data.getNamedColumn(ss, "Dec", cacheKey))
+        raRef  = numpy.radians(data.getNamedColumn(srefs, "rRa", cacheKey))
+        decRef = numpy.radians(data.getNamedColumn(srefs, "rDec", cacheKey))
+
+        # offsets on the tangent plane at the reference position
+        dDec = decRef - dec
+        dRa  = (raRef - ra)*numpy.abs(numpy.cos(decRef))
+
+        good = ~data.getFlagMask(ss, self.config.badFlags, cacheKey)
+        return {
+            'dRa'  : dRa[good],
+            'dDec' : dDec[good],
+            'x'    : data.getNamedColumn(ss, "x", cacheKey)[good],
+            'y'    : data.getNamedColumn(ss, "y", cacheKey)[good],
+            }
+
     def test(self, data, dataId):
 
         # get data
@@ -105,23 +128,9 @@ class AstrometricErrorQaTask(QaAnalysisTask):
             filter = self.filter[key].getName()
 
             matchList = self.matchListDictSrc[key]['matched']
-            for m in matchList:
-                sref, s, dist = m
-                ra, dec, raRef, decRef = \
-                    [numpy.radians(x) for x in [s.getD(data.k_Ra), s.getD(data.k_Dec),
-                                                sref.getD(data.k_rRa), sref.getD(data.k_rDec)]]
-                
-
-                
-                dDec = decRef - dec
-                dRa  = (raRef - ra)*abs(numpy.cos(decRef))
-                
-                if not data.isFlagged(s):
-                    self.dRa.append(raft, ccd, dRa)
-                    self.dDec.append(raft, ccd, dDec)
-                    self.x.append(raft, ccd, s.getD(data.k_x))
-                    self.y.append(raft, ccd, s.getD(data.k_y))
-                    
+            offsets = self._getOffsetColumns(data, matchList, cacheKey=(key, 'matched'))
+            for name in ('dRa', 'dDec', 'x', 'y'):
+                getattr(self, name).extend(raft, ccd, offsets[name])
                     
         testSet = self.getTestSet(data, dataId)
         testSet.addMetadata({"Description": self.description})
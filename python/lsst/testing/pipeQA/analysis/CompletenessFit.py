@@ -0,0 +1,224 @@
+#
+# LSST Data Management System
+# Copyright 2008, 2009, 2010 LSST Corporation.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+#
+
+
+"""Completeness curves and photometric depths for many ccds at once.
+
+The per-ccd magnitude lists are binned into one (nCcd, nBin) array of histograms,
+and then every ccd's depth (the magnitude where completeness drops below 0.5) is
+found together, either by interpolating between bins, or by fitting the model
+
+    completeness(m) = 0.5 - arctan(A*m + B)/pi
+
+with a batched Levenberg-Marquardt fit, whose 50% point is simply m = -B/A.
+"""
+
+import numpy
+
+
+def stackedHistogram(valueLists, bins):
+    """Histogram each of a list of arrays, with the same bins (as numpy.histogram does).
+
+    @param valueLists  list of arrays (eg. one per ccd)
+    @param bins        bin edges; the last bin includes its upper edge
+    @return integer array of counts, shape (len(valueLists), len(bins) - 1)
+    """
+    bins = numpy.asarray(bins, dtype=float)
+    nBin = len(bins) - 1
+    nRow = len(valueLists)
+    if nRow == 0:
+        return numpy.zeros((0, nBin), dtype=int)
+
+    lengths = [len(v) for v in valueLists]
+    values = numpy.concatenate([numpy.asarray(v, dtype=float) for v in valueLists] + [numpy.array([])])
+    rows = numpy.repeat(numpy.arange(nRow), lengths)
+
+    ibin = numpy.searchsorted(bins, values, side='right') - 1
+    ibin[values == bins[-1]] = nBin - 1
+    inBin = (ibin >= 0) & (ibin < nBin)
+    counts = numpy.bincount(rows[inBin]*nBin + ibin[inBin], minlength=nRow*nBin)
+    return counts.reshape(nRow, nBin)
+
+
+def _compress(mask, *arrays):
+    """Move each row's entries where mask is True to the front of the row (in order).
+
+    @return the row lengths, and padded (nRow, nCol + 1) copies of the arrays (padding is NaN)
+    """
+    nRow, nCol = mask.shape
+    lengths = mask.sum(axis=1)
+    rows, cols = numpy.where(mask)
+    pos = numpy.cumsum(mask, axis=1)[rows, cols] - 1
+    out = []
+    for a in arrays:
+        c = numpy.empty((nRow, nCol + 1))
+        c.fill(numpy.NaN)
+        c[rows, pos] = a[rows, cols]
+        out.append(c)
+    return lengths, out
+
+
+def interpolatedDepths(histFound, histAll, bins):
+    """Find where each completeness curve first drops to 0.5 (walking in from the faint end).
+
+    Bins without any objects are skipped, and a completeness of 0 is assumed one bin
+    beyond the faintest occupied bin.  The depth is interpolated between the two bins
+    either side of 0.5; it's 0.0 where there's no such crossing.
+
+    @param histFound  (nCcd, nBin) histograms of the detected objects
+    @param histAll    (nCcd, nBin) histograms of all the objects
+    @param bins       bin edges
+    @return array of depths, one per ccd
+    """
+    bins = numpy.asarray(bins, dtype=float)
+    histFound = numpy.asarray(histFound, dtype=float)
+    histAll = numpy.asarray(histAll, dtype=float)
+    nRow, nBin = histAll.shape
+    depths = numpy.zeros(nRow)
+    if nRow == 0:
+        return depths
+
+    magbins = numpy.tile(0.5*(bins[1:] + bins[:-1]), (nRow, 1))
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        ratio = histFound/histAll
+    lengths, (x, y) = _compress(histAll != 0, magbins, ratio)
+
+    # the point past the faintest bin
+    have = numpy.where(lengths > 0)[0]
+    x[have, lengths[have]] = x[have, lengths[have] - 1] + (bins[1] - bins[0])
+    y[have, lengths[have]] = 0.0
+
+    # crossings between points i-1 and i, for 2 <= i <= last point; the faintest wins
+    i = numpy.arange(2, nBin + 1)
+    with numpy.errstate(invalid='ignore'):
+        cross = (y[:, i] <= 0.5) & (y[:, i-1] > 0.5) & (i[numpy.newaxis, :] <= lengths[:, numpy.newaxis])
+    found = cross.any(axis=1)
+    rows = numpy.where(found)[0]
+    last = i[nBin - 2 - numpy.argmax(cross[rows, ::-1], axis=1)]
+    x0, x1 = x[rows, last - 1], x[rows, last]
+    y0, y1 = y[rows, last - 1], y[rows, last]
+    depths[rows] = (0.5 - y0) / (y1 - y0) * (x1 - x0) + x0
+    return depths
+
+
+def arctanModel(x, A, B):
+    return 0.5 - numpy.arctan(A*x + B)/numpy.pi
+
+
+def fitArctan(x, y, dy, A0, B0, nIter=50, tol=1.0e-8):
+    """Fit completeness = 0.5 - arctan(A*x + B)/pi to many curves at once (Levenberg-Marquardt).
+
+    @param x, y, dy  (nCurve, nPoint) arrays; points where any is NaN (or dy <= 0) are ignored
+    @param A0, B0    starting values (one per curve)
+    @param nIter     maximum number of iterations
+    @param tol       stop once every curve's chi^2 changes by less than this fraction
+
+    @return arrays A, B, chi2 (one per curve); curves with fewer than 2 points get NaN
+    """
+    x, y, dy = [numpy.asarray(v, dtype=float) for v in (x, y, dy)]
+    with numpy.errstate(invalid='ignore'):
+        use = numpy.isfinite(x) & numpy.isfinite(y) & numpy.isfinite(dy) & (dy > 0)
+    x, y = numpy.where(use, x, 0.0), numpy.where(use, y, 0.0)
+    w = numpy.where(use, 1.0/numpy.where(use, dy, 1.0)**2, 0.0)
+
+    A = numpy.array(A0, dtype=float)*numpy.ones(len(x))
+    B = numpy.array(B0, dtype=float)*numpy.ones(len(x))
+    lam = 1.0e-3*numpy.ones(len(x))
+
+    def chi2(A, B):
+        r = y - arctanModel(x, A[:, numpy.newaxis], B[:, numpy.newaxis])
+        return (w*r*r).sum(axis=1)
+
+    c2 = chi2(A, B)
+    for it in range(nIter):
+        u = A[:, numpy.newaxis]*x + B[:, numpy.newaxis]
+        r = y - (0.5 - numpy.arctan(u)/numpy.pi)
+        # analytic derivatives of the model
+        dB = -1.0/(numpy.pi*(1.0 + u*u))
+        dA = dB*x
+
+        # 2x2 normal equations for each curve, damped, solved in closed form
+        haa, hab, hbb = (w*dA*dA).sum(axis=1), (w*dA*dB).sum(axis=1), (w*dB*dB).sum(axis=1)
+        ga, gb = (w*dA*r).sum(axis=1), (w*dB*r).sum(axis=1)
+        haa, hbb = haa*(1.0 + lam), hbb*(1.0 + lam)
+        with numpy.errstate(invalid='ignore', divide='ignore'):
+            det = haa*hbb - hab*hab
+            stepA = (hbb*ga - hab*gb)/det
+            stepB = (haa*gb - hab*ga)/det
+        ok = numpy.isfinite(stepA) & numpy.isfinite(stepB)
+        stepA, stepB = numpy.where(ok, stepA, 0.0), numpy.where(ok, stepB, 0.0)
+
+        newA, newB = A + stepA, B + stepB
+        newC2 = chi2(newA, newB)
+        better = newC2 < c2
+        converged = numpy.abs(c2 - newC2) <= tol*numpy.maximum(c2, 1.0e-30)
+
+        A = numpy.where(better, newA, A)
+        B = numpy.where(better, newB, B)
+        lam = numpy.where(better, lam*0.1, lam*10.0)
+        c2 = numpy.where(better, newC2, c2)
+        if numpy.all(converged | ~ok):
+            break
+
+    bad = use.sum(axis=1) < 2
+    A[bad], B[bad], c2[bad] = numpy.NaN, numpy.NaN, numpy.NaN
+    return A, B, c2
+
+
+def fittedDepths(histFound, histAll, bins, guess=None):
+    """Fit the arctan model to each completeness curve, and get its 50% point.
+
+    Each bin's completeness has a binomial error, computed with (found + 0.5)/(all + 1)
+    so bins where all or none of the objects were found still constrain the fit.
+
+    @param histFound  (nCcd, nBin) histograms of the detected objects
+    @param histAll    (nCcd, nBin) histograms of all the objects
+    @param bins       bin edges
+    @param guess      starting depths (eg. from interpolatedDepths()); 0 or NaN for none
+
+    @return arrays depth, A, B (one per ccd); depth is NaN where the fit failed
+    """
+    bins = numpy.asarray(bins, dtype=float)
+    histFound = numpy.asarray(histFound, dtype=float)
+    histAll = numpy.asarray(histAll, dtype=float)
+    nRow, nBin = histAll.shape
+
+    magbins = numpy.tile(0.5*(bins[1:] + bins[:-1]), (nRow, 1))
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        y = histFound/histAll
+        p = (histFound + 0.5)/(histAll + 1.0)
+        dy = numpy.sqrt(p*(1.0 - p)/histAll)
+    have = histAll > 0
+    x = numpy.where(have, magbins, numpy.NaN)
+
+    if guess is None:
+        guess = numpy.zeros(nRow)
+    guess = numpy.asarray(guess, dtype=float)
+    middle = 0.5*(bins[0] + bins[-1])
+    guess = numpy.where(numpy.isfinite(guess) & (guess > bins[0]) & (guess < bins[-1]), guess, middle)
+
+    # a curve falling from ~0.9 to ~0.1 over 2 magnitudes
+    A0 = 3.0*numpy.ones(nRow)
+    A, B, c2 = fitArctan(x, y, dy, A0, -A0*guess)
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        depth = numpy.where(A > 0, -B/A, numpy.NaN)
+    return depth, A, B
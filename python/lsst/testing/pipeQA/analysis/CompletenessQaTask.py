@@ -28,30 +28,16 @@ import lsst.pex.config                           as pexConfig
 import lsst.pipe.base                            as pipeBase
 
 from   .QaAnalysisTask                           import QaAnalysisTask
+from   .QaAnalysisConfig                         import CompletenessQaConfig
 import lsst.testing.pipeQA.TestCode              as testCode
 import lsst.testing.pipeQA.figures               as qaFig
 import lsst.testing.pipeQA.figures.QaFigureUtils as qaFigUtils
 import RaftCcdData                               as raftCcdData
 
 import QaPlotUtils                               as qaPlotUtil
+import CompletenessFit                           as completenessFit
 
 
-# Until we can make it more robust
-hasMinuit = False
-try:
-    import minuit2
-except:
-    hasMinuit = False
-    
-
-class CompletenessQaConfig(pexConfig.Config):
-    cameras        = pexConfig.ListField(dtype=str,
-                                         doc="Cameras to run CompletenessQaTask",
-                                         default=("lsstSim", "cfht", "sdss", "coadd"))
-    completeMinMag = pexConfig.Field(dtype=float, doc="Minimum photometric depth", default = 20.0)
-    completeMaxMag = pexConfig.Field(dtype=float, doc="Maximum reasonable photometric depth", default = 25.0)
-
-    
 class CompletenessQaTask(QaAnalysisTask):
     ConfigClass  = CompletenessQaConfig
     _DefaultName = "completenessQa"
@@ -91,89 +77,38 @@ class CompletenessQaTask(QaAnalysisTask):
         del self.blendedGalaxy
         del self.undetectedGalaxy
         del self.depth
-        if hasMinuit:
-            del self.fit
+        del self.fit
         del self.faintest
 
-    def limitingMag(self, raftId, ccdId):
-        if hasMinuit:
-            try:
-                return self.limitingMagMinuit(raftId, ccdId)
-            except:
-                pass
-
-        matchedStar     = num.array(self.matchedStar.get(raftId, ccdId))
-        blendedStar     = num.array(self.blendedStar.get(raftId, ccdId))
-        undetectedStar  = num.array(self.undetectedStar.get(raftId, ccdId))
-
-        allStars        = num.concatenate((matchedStar, blendedStar, undetectedStar))
-        foundStars      = num.concatenate((matchedStar, blendedStar))
-        histAll         = num.histogram(allStars, bins=self.bins)
-        histFound       = num.histogram(foundStars, bins=self.bins)
-
-        magbins = 0.5 * (histAll[1][1:] + histAll[1][:-1])
-        w       = num.where(histAll[0] != 0)
-        x       = magbins[w]
-        n       = 1.0 * histFound[0][w]
-        d       = 1.0 * histAll[0][w]
-        y       = n / d
-
-        binsize = self.bins[1] - self.bins[0]
-        x = num.append(x, x[-1] + binsize)
-        y = num.append(y, 0.0)
-
-        for i in num.arange(len(y) - 1, 1, -1):
-            if y[i] <= 0.5 and y[i-1] > 0.5:
-                return (0.5 - y[i-1]) / (y[i] - y[i-1]) * (x[i] - x[i-1]) + x[i-1]
-        return 0.0
-        
-    def limitingMagMinuit(self, raftId, ccdId):
-        # Model is of the form:
-        # 0.5 + -1.0 / num.pi * num.arctan(A * x + B)
-        
-        import minuit2
-        matchStarList   = self.matchStarSrc.get(raftId, ccdId)
-        unmatchStarList = self.unmatchCatStar.get(raftId, ccdId)
-        
-        histStarSrc     = num.histogram(matchStarList, bins = self.bins)
-        maxSrcIdx       = num.argsort(histStarSrc[0])[-1]
-        histUnmatchStar = num.histogram(unmatchStarList, bins = self.bins)
-
-        magbins   = 0.5 * (histStarSrc[1][1:] + histStarSrc[1][:-1])
-        histRatio = num.zeros(len(histStarSrc[0]))
-
-        w     = num.where((histStarSrc[0] + histUnmatchStar[0]) != 0)
-        x     = magbins[w]
-
-        # approximate
-        d     = 1.0 * histStarSrc[0][w]
-        u     = 1.0 * histUnmatchStar[0][w]
-        dd    = num.sqrt(d)
-        n     = d + u
-        y     = d / n
-        dy    = dd / n
-
-        idx = num.where(dy != 0)
-        x   = x[idx]
-        y   = y[idx]
-        dy  = dy[idx]
-              
-        def fcn(A, B):
-            model  = 0.5 + -1.0 / num.pi * num.arctan(A * x + B)
-            chi    = (model - y) / dy
-            return num.sum(chi**2)
-        
-        m = minuit2.Minuit2(fcn)
-        m.values['A'] = 1
-        m.values['B'] = -10
-        m.migrad()
+    def limitingMags(self, ccdKeys):
+        """Get the magnitude where star completeness drops below 0.5, for many ccds at once.
 
-        mx = num.arange(min(x), max(x), 0.1)
-        my = 0.5 + -1.0 / num.pi * num.arctan(m.values['A'] * mx + m.values['B'])
-        mindx = num.argsort((num.abs(my-0.5)))[0]
+        The depths are interpolated between the bins either side of 0.5, unless
+        config.depthMethod is 'fit': then the arctan model is fit to every ccd's
+        completeness curve (see CompletenessFit), and its parameters kept in self.fit.
 
-        self.fit.set(raftId, ccdId, [m.values['A'], m.values['B']])
-        return mx[mindx]
+        @param ccdKeys  list of [raftId, ccdId]
+        @return array of depths (0.0 where the completeness never crosses 0.5)
+        """
+
+        found, total = [], []
+        for raftId, ccdId in ccdKeys:
+            matchedStar     = num.array(self.matchedStar.get(raftId, ccdId))
+            blendedStar     = num.array(self.blendedStar.get(raftId, ccdId))
+            undetectedStar  = num.array(self.undetectedStar.get(raftId, ccdId))
+            found.append(num.concatenate((matchedStar, blendedStar)))
+            total.append(num.concatenate((matchedStar, blendedStar, undetectedStar)))
+
+        histFound = completenessFit.stackedHistogram(found, self.bins)
+        histAll   = completenessFit.stackedHistogram(total, self.bins)
+
+        depths = completenessFit.interpolatedDepths(histFound, histAll, self.bins)
+        if self.config.depthMethod == "fit":
+            depthFit, A, B = completenessFit.fittedDepths(histFound, histAll, self.bins, guess=depths)
+            for (raftId, ccdId), a, b in zip(ccdKeys, A, B):
+                self.fit.set(raftId, ccdId, [a, b])
+            depths = num.where(num.isfinite(depthFit), depthFit, depths)
+        return depths
 
     def test(self, data, dataId, fluxType = "psf"):
 
@@ -193,10 +128,9 @@ class CompletenessQaTask(QaAnalysisTask):
         self.blendedGalaxy    = raftCcdData.RaftCcdVector(self.detector)
         self.undetectedGalaxy = raftCcdData.RaftCcdVector(self.detector)
         self.depth            = raftCcdData.RaftCcdData(self.detector)
+        self.fit              = raftCcdData.RaftCcdData(self.detector, initValue=[0.0, 0.0]) 
 
-        if hasMinuit:
-            self.fit = raftCcdData.RaftCcdData(self.detector, initValue=[0.0, 0.0]) 
-
+        ccdKeys = []
 
         self.faintest = 0.0
         for key in self.detector.keys():
@@ -207,40 +141,31 @@ class CompletenessQaTask(QaAnalysisTask):
             if self.matchListDictSrc.has_key(key):
                 # Detections
                 matchSet = [
-                    [self.matchListDictSrc[key]['matched'], self.matchedStar, self.matchedGalaxy],
-                    [self.matchListDictSrc[key]['blended'], self.blendedStar, self.blendedGalaxy]
+                    ['matched', self.matchedStar, self.matchedGalaxy],
+                    ['blended', self.blendedStar, self.blendedGalaxy]
                     ]
+                fluxName = "Psf" if fluxType == "psf" else "Ap"
                 for mset in matchSet:
-                    mdict, starvec, galvec = mset
-                    
-                    stars    = []
-                    galaxies = []
-                    for m in mdict:
-                        sref, s, dist = m
-                        if fluxType == "psf":
-                            fref  = sref.getD(data.k_rPsf)
-                            f     = s.getD(data.k_Psf)
-                            ferr  = s.get(data.k_PsfE)
-                        else:
-                            fref  = sref.getD(data.k_rPsf)
-                            f     = s.getD(data.k_Ap)
-                            ferr  = s.getD(data.k_ApE)
-
-
-                        if (fref > 0.0 and f > 0.0):
-                            # Use known catalog mag
-                            mrefmag  = -2.5*num.log10(fref)
-                            if num.isfinite(mrefmag):
-                                if mrefmag > self.faintest:
-                                    self.faintest == mrefmag
-                                    
-                                if s.get(data.k_ext) > 0.0:
-                                    galaxies.append(mrefmag)
-                                else:
-                                    stars.append(mrefmag)
-
-                    starvec.set(raftId, ccdId, num.array(stars))
-                    galvec.set(raftId, ccdId, num.array(galaxies))
+                    matchType, starvec, galvec = mset
+                    mdict = self.matchListDictSrc[key][matchType]
+                    cacheKey = (key, matchType)
+
+                    srefs = [m[0] for m in mdict]
+                    ss    = [m[1] for m in mdict]
+                    fref  = data.getNamedColumn(srefs, "rPsf", cacheKey)
+                    f     = data.getNamedColumn(ss, fluxName, cacheKey)
+                    good  = (fref > 0.0) & (f > 0.0)
+
+                    # Use known catalog mag
+                    mrefmag = data.getMagColumn(srefs, "rPsf", cacheKey)[good]
+                    galaxy  = (data.getNamedColumn(ss, "ext", cacheKey) > 0.0)[good]
+                    finite  = num.isfinite(mrefmag)
+                    # (the faintest mag was never updated from the matched sources)
+                    stars    = mrefmag[finite & ~galaxy]
+                    galaxies = mrefmag[finite & galaxy]
+
+                    starvec.set(raftId, ccdId, stars)
+                    galvec.set(raftId, ccdId, galaxies)
     
                 # Non-detections
                 undetectedStars = []
@@ -258,29 +183,25 @@ class CompletenessQaTask(QaAnalysisTask):
                 self.undetectedGalaxy.set(raftId, ccdId, num.array(undetectedGalaxies))
                     
                 # Orphans
-                orphans = []
-                for orphan in self.matchListDictSrc[key]['orphan']:
-                    if self.fluxType == "psf":
-                        f = orphan.getD(data.k_Psf)
-                    else:
-                        f = orphan.getD(data.k_Ap)
-                    if f > 0.0:
-                        orphmag = -2.5*num.log10(f)
-                        orphans.append(orphmag)
-                        if orphmag > self.faintest:
-                            self.faintest = orphmag
-                self.orphan.set(raftId, ccdId, num.array(orphans))
-
-                ############ Calculate limiting mag
-                
-                maxDepth = self.limitingMag(raftId, ccdId)
-                self.depth.set(raftId, ccdId, maxDepth)
-                
-                areaLabel = data.cameraInfo.getDetectorName(raftId, ccdId)
-                label = "photometric depth "
-                comment = "magnitude where star completeness drops below 0.5"
-                test = testCode.Test(label, maxDepth, self.limits, comment, areaLabel=areaLabel)
-                testSet.addTest(test)
+                orphan = self.matchListDictSrc[key]['orphan']
+                f = data.getNamedColumn(orphan, fluxName, (key, 'orphan'))
+                orphans = data.getMagColumn(orphan, fluxName, (key, 'orphan'))[f > 0.0]
+                if len(orphans) > 0:
+                    self.faintest = max(self.faintest, orphans.max())
+                self.orphan.set(raftId, ccdId, orphans)
+                ccdKeys.append([raftId, ccdId])
+
+        ############ Calculate limiting mags, for all the ccds at once
+
+        depths = self.limitingMags(ccdKeys)
+        for (raftId, ccdId), maxDepth in zip(ccdKeys, depths):
+            self.depth.set(raftId, ccdId, maxDepth)
+
+            areaLabel = data.cameraInfo.getDetectorName(raftId, ccdId)
+            label = "photometric depth "
+            comment = "magnitude where star completeness drops below 0.5"
+            test = testCode.Test(label, maxDepth, self.limits, comment, areaLabel=areaLabel)
+            testSet.addTest(test)
                 
     def plot(self, data, dataId, showUndefined = False):
         
@@ -30,24 +30,17 @@ import lsst.pipe.base               as pipeBase
 import lsst.afw.cameraGeom          as camGeom
 
 from   .QaAnalysisTask              import QaAnalysisTask
+from   .QaAnalysisConfig            import EmptySectorQaConfig
 import lsst.testing.pipeQA.TestCode as testCode
 import lsst.testing.pipeQA.figures  as qaFig
 import RaftCcdData                  as raftCcdData
 import QaAnalysisUtils              as qaAnaUtil
 import QaPlotUtils                  as qaPlotUtil
+import Occupancy                    as occupancy
 
 
 
 
-class EmptySectorQaConfig(pexConfig.Config):
-    cameras    = pexConfig.ListField(dtype = str,
-                                     doc = "Cameras to run EmptySectorQaTask",
-                                     default = ("lsstSim", "hsc", "suprimecam", "cfht", "sdss", "coadd"))
-    maxMissing = pexConfig.Field(dtype = int, doc = "Maximum number of missing CCDs", default = 1)
-    nx         = pexConfig.Field(dtype = int, doc = "Mesh size in x", default = 4)
-    ny         = pexConfig.Field(dtype = int, doc = "Mesh size in y", default = 4)
-
-
 edgeChips = {
     #'hsc' : set([0, 3, 9, 101, 29, 77, 103, 95, 99, 96, 90, 102, 70, 22, 100, 4]),
     'hsc' : set(['1_53', '1_56', '1_47', '1_35', '1_03', '1_27', '1_31', '0_42', '0_53', '0_56', '0_47',
@@ -96,6 +89,8 @@ class EmptySectorQaTask(QaAnalysisTask):
 
         del self.emptySectors
         del self.emptySectorsMat
+        del self.sectorCounts
+        del self.sectorCountsMat
         
     def test(self, data, dataId):
 
@@ -129,12 +124,12 @@ class EmptySectorQaTask(QaAnalysisTask):
             self.size.set(raft, ccd, size)
             filter = self.filter[key].getName()
             
-            for s in ss:
-                if not data.isFlagged(s):
-                    self.x.append(raft, ccd, s.getD(data.k_x))
-                    self.y.append(raft, ccd, s.getD(data.k_y))
-                    self.ra.append(raft, ccd, s.getD(data.k_Ra))
-                    self.dec.append(raft, ccd, s.getD(data.k_Dec))
+            cacheKey = (key, 'src')
+            good = ~data.getFlagMask(ss, self.config.badFlags, cacheKey)
+            self.x.extend(raft, ccd, data.getNamedColumn(ss, "x", cacheKey)[good])
+            self.y.extend(raft, ccd, data.getNamedColumn(ss, "y", cacheKey)[good])
+            self.ra.extend(raft, ccd, data.getNamedColumn(ss, "Ra", cacheKey)[good])
+            self.dec.extend(raft, ccd, data.getNamedColumn(ss, "Dec", cacheKey)[good])
             if self.matchListDictSrc.has_key(key):
                 for m in self.matchListDictSrc[key]['matched']:
                     sref, s, dist = m
@@ -155,6 +150,8 @@ class EmptySectorQaTask(QaAnalysisTask):
         # analyse each sensor and put the values in a raftccd container
         self.emptySectors    = raftCcdData.RaftCcdData(self.detector, initValue=self.nx*self.ny)
         self.emptySectorsMat = raftCcdData.RaftCcdData(self.detector, initValue=self.nx*self.ny)
+        self.sectorCounts    = raftCcdData.RaftCcdData(self.detector)
+        self.sectorCountsMat = raftCcdData.RaftCcdData(self.detector)
         
         for raft, ccd in self.emptySectors.raftCcdKeys():
             x, y       = self.x.get(raft, ccd), self.y.get(raft, ccd)
@@ -166,20 +163,13 @@ class EmptySectorQaTask(QaAnalysisTask):
                 xlo, ylo, xhi, yhi = x.min(), y.min(), x.max(), y.max()
                 xwid, ywid = xhi-xlo, yhi-ylo
                 
-            def countEmptySectors(x, y):
-                counts = numpy.zeros([self.nx, self.ny])
-                for i in range(len(x)):
-                    # nan check
-                    if x[i] == x[i] and y[i] == y[i]:
-                        xi, yi = int(self.nx*x[i]/xwid), int(self.ny*y[i]/ywid)
-                        if xi >= 0 and xi < self.nx and yi >= 0 and yi < self.ny:
-                            counts[xi,yi] += 1
-                whereEmpty = numpy.where(counts.flatten() == 0)[0]
-                nEmpty = len(whereEmpty)
-                return nEmpty
-
-            nEmpty = countEmptySectors(x - xlo, y - ylo)
-            nEmptyMat = countEmptySectors(xmat - xlo, ymat - ylo)
+            counts    = occupancy.occupancy(x - xlo, y - ylo, self.nx, self.ny, xwid, ywid)
+            countsMat = occupancy.occupancy(xmat - xlo, ymat - ylo, self.nx, self.ny, xwid, ywid)
+            self.sectorCounts.set(raft, ccd, counts)
+            self.sectorCountsMat.set(raft, ccd, countsMat)
+
+            nEmpty    = occupancy.countEmpty(counts)
+            nEmptyMat = occupancy.countEmpty(countsMat)
             self.emptySectors.set(raft, ccd, nEmpty)
             self.emptySectorsMat.set(raft, ccd, nEmptyMat)
             
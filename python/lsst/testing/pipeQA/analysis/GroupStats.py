@@ -0,0 +1,143 @@
+#
+# LSST Data Management System
+# Copyright 2008, 2009, 2010 LSST Corporation.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+#
+
+"""Statistics for many groups (rafts, ccds, magnitude bins) of a flat array at once.
+
+The values follow afwMath.makeStatistics() with a default StatisticsControl:
+ - NaNs are ignored, and 'n' counts the remaining points (infinities are kept, as in afw)
+ - the median and quartiles interpolate linearly between the sorted values
+ - iqrange is q75 - q25, and 0.741*iqrange estimates the stdev
+ - meanclip/stdevclip keep points with |x - center| <= 3 x stdev: the first
+   iteration is about the median with 0.741*iqrange as the stdev, and the
+   next two about the clipped mean, with the clipped stdev
+ - stdev (and stdevclip) are sample stdevs (divided by n-1)
+Groups without any points get NaN.
+"""
+
+import numpy
+
+IQ_TO_STDEV = 0.741301109252802
+
+
+def groupIndex(labels):
+    """Turn arbitrary group labels into indices 0..nGroup-1.
+
+    @param labels  a label for each value (eg. ccd names, or (raft, ccd) strings)
+    @return unique labels (sorted), and the index of each value's label in them
+    """
+    unique, index = numpy.unique(numpy.asarray(labels), return_inverse=True)
+    return unique, index
+
+
+def _quantile(sortedValues, offsets, counts, fraction):
+    """Linearly interpolated quantile of each group of sorted values."""
+    out = numpy.empty(len(counts))
+    out.fill(numpy.NaN)
+    have = counts > 0
+    idx = fraction*(counts[have] - 1)
+    lo = numpy.floor(idx).astype(int)
+    hi = numpy.minimum(lo + 1, counts[have] - 1)
+    vlo = sortedValues[offsets[have] + lo]
+    vhi = sortedValues[offsets[have] + hi]
+    with numpy.errstate(invalid='ignore'):
+        # (an exact index doesn't look at the next value, which may be infinite)
+        out[have] = numpy.where(idx == lo, vlo, vlo + (idx - lo)*(vhi - vlo))
+    return out
+
+
+def _meanVar(values, groups, nGroup, use):
+    """Number of points, mean, and sample variance of each group, for values where use is True."""
+    w = use.astype(float)
+    n = numpy.bincount(groups, weights=w, minlength=nGroup)
+    sx = numpy.bincount(groups, weights=numpy.where(use, values, 0.0), minlength=nGroup)
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        mean = sx/n
+        dx = numpy.where(use, values - mean[groups], 0.0)
+        var = numpy.bincount(groups, weights=dx*dx, minlength=nGroup)/(n - 1)
+    var[n < 2] = numpy.NaN
+    return n, mean, var
+
+
+def groupStatistics(values, groups, nGroup=None, nSigmaClip=3.0, nIter=3):
+    """Compute afwMath-style statistics for each group.
+
+    @param values      flat array of values
+    @param groups      integer group index (0..nGroup-1) of each value (see groupIndex())
+    @param nGroup      number of groups (groups without values get NaN); default is max(groups)+1
+    @param nSigmaClip  clipping limit, in stdevs, for meanclip and stdevclip
+    @param nIter       number of clipping iterations
+
+    @return dict of arrays (one entry per group): npoint, mean, stdev, median, iqrange,
+            meanclip, stdevclip
+    """
+
+    values = numpy.asarray(values, dtype=float)
+    groups = numpy.asarray(groups, dtype=int)
+    if nGroup is None:
+        nGroup = groups.max() + 1 if len(groups) > 0 else 0
+
+    notNan = ~numpy.isnan(values)
+    values, groups = values[notNan], groups[notNan]
+
+    # sort by group, then by value, to get medians and quartiles by indexing
+    order = numpy.lexsort((values, groups))
+    sortedValues = values[order]
+    counts = numpy.bincount(groups, minlength=nGroup)
+    offsets = numpy.concatenate([[0], numpy.cumsum(counts)[:-1]]).astype(int)
+
+    median = _quantile(sortedValues, offsets, counts, 0.5)
+    iqrange = _quantile(sortedValues, offsets, counts, 0.75) - _quantile(sortedValues, offsets, counts, 0.25)
+
+    everything = numpy.ones(len(values), dtype=bool)
+    n, mean, var = _meanVar(values, groups, nGroup, everything)
+
+    # clipping: first about the median with the iqr, then about the clipped mean
+    center = median
+    hwidth = nSigmaClip*IQ_TO_STDEV*iqrange
+    meanclip = mean
+    varclip = var
+    for i in range(nIter):
+        if i > 0:
+            center = meanclip
+            hwidth = numpy.where(nclip > 1, nSigmaClip*numpy.sqrt(varclip), hwidth)
+        use = numpy.abs(values - center[groups]) <= hwidth[groups]
+        nclip, meanclip, varclip = _meanVar(values, groups, nGroup, use)
+
+    return {
+        'npoint'    : counts,
+        'mean'      : mean,
+        'stdev'     : numpy.sqrt(var),
+        'median'    : median,
+        'iqrange'   : iqrange,
+        'meanclip'  : meanclip,
+        'stdevclip' : numpy.sqrt(varclip),
+        }
+
+
+def statistics(values, nSigmaClip=3.0, nIter=3):
+    """Compute afwMath-style statistics for a single array.
+
+    @return dict of values, as for groupStatistics()
+    """
+    values = numpy.asarray(values, dtype=float)
+    stats = groupStatistics(values, numpy.zeros(len(values), dtype=int), 1, nSigmaClip, nIter)
+    return dict([(k, v[0]) for k, v in stats.items()])
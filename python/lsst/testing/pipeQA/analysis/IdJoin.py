@@ -0,0 +1,89 @@
+#
+# LSST Data Management System
+# Copyright 2008, 2009, 2010 LSST Corporation.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+#
+
+
+"""Join two lists of ids (eg. the reference object ids matched in two visits) by sorting.
+
+These replace looping over the common ids with numpy.where(ids == id), and pairing
+with numpy.equal.outer(idsA, idsB), which cost O(N*M) time (and memory, for the latter).
+Here we cost O((N + M) log(N + M)) time and O(N + M + number of pairs) memory.
+"""
+
+import numpy
+
+
+def _sortedRanges(idsA, idsB):
+    """Sort idsB, and find the range of sorted idsB equal to each of idsA.
+
+    @return the order which sorts idsB, and the start and number of matches in it for each of idsA
+    """
+    # a stable sort keeps equal ids in their original order
+    orderB = numpy.argsort(idsB, kind='mergesort')
+    sortedB = idsB[orderB]
+    lo = numpy.searchsorted(sortedB, idsA, side='left')
+    hi = numpy.searchsorted(sortedB, idsA, side='right')
+    n = hi - lo
+    if idsA.dtype.kind == 'f':
+        # NaN never equals anything, though it sorts (with any other NaNs) to the end
+        n[numpy.isnan(idsA)] = 0
+    return orderB, lo, n
+
+
+def countIds(ids, inIds):
+    """Count the number of times each of ids appears in inIds."""
+    ids, inIds = numpy.asarray(ids), numpy.asarray(inIds)
+    orderB, lo, n = _sortedRanges(ids, inIds)
+    return n
+
+
+def joinUnique(idsA, idsB):
+    """Pair up ids which appear exactly once in each list (the one-to-one rule).
+
+    @param idsA, idsB  arrays of ids
+    @return indexA, indexB: idsA[indexA] == idsB[indexB], in increasing order of indexA
+    """
+    idsA, idsB = numpy.asarray(idsA), numpy.asarray(idsB)
+    orderB, lo, n = _sortedRanges(idsA, idsB)
+    keep = (n == 1) & (countIds(idsA, idsA) == 1)
+    indexA = numpy.where(keep)[0]
+    indexB = orderB[lo[keep]]
+    return indexA, indexB
+
+
+
+def joinAll(idsA, idsB):
+    """Get every pair of equal ids (a many-to-many join).
+
+    The pairs are the same, and in the same order, as from
+    numpy.where(numpy.equal.outer(idsA, idsB)), without the N x M matrix.
+
+    @param idsA, idsB  arrays of ids
+    @return indexA, indexB: idsA[indexA] == idsB[indexB]
+    """
+    idsA, idsB = numpy.asarray(idsA), numpy.asarray(idsB)
+    orderB, lo, n = _sortedRanges(idsA, idsB)
+    indexA = numpy.repeat(numpy.arange(len(idsA)), n)
+    # position of each pair within its idsA's range of sorted idsB
+    start = numpy.repeat(numpy.cumsum(n) - n, n)
+    within = numpy.arange(len(indexA)) - start
+    indexB = orderB[numpy.repeat(lo, n) + within]
+    return indexA, indexB
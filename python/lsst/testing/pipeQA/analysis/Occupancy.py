@@ -0,0 +1,73 @@
+#
+# LSST Data Management System
+# Copyright 2008, 2009, 2010 LSST Corporation.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+#
+
+
+"""Occupancy maps: the number of points in each sector of an nx x ny grid over a ccd.
+
+Points are assigned to sectors as int(nx*x/xwid), int(ny*y/ywid) (truncating
+towards zero, as the original loop in EmptySectorQaTask did), NaNs are ignored,
+and points falling outside the grid aren't counted.
+"""
+
+import numpy
+
+
+def sectorIndex(x, y, nx, ny, xwid, ywid):
+    """Get the flat (ix*ny + iy) sector index of each point.
+
+    @param x, y        pixel coordinates, relative to the ccd origin
+    @param nx, ny      grid size
+    @param xwid, ywid  ccd size in pixels
+
+    @return flat indices, and a boolean array which is True for points on the grid
+    """
+    x = numpy.asarray(x, dtype=float)
+    y = numpy.asarray(y, dtype=float)
+
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        fx = nx*x/xwid
+        fy = ny*y/ywid
+        # compare before truncating so huge values (and infs) don't overflow the ints
+        onGrid = (fx > -1) & (fx < nx) & (fy > -1) & (fy < ny)
+    xi = numpy.zeros(len(x), dtype=int)
+    yi = numpy.zeros(len(y), dtype=int)
+    xi[onGrid] = fx[onGrid].astype(int)
+    yi[onGrid] = fy[onGrid].astype(int)
+    return xi*ny + yi, onGrid
+
+
+def occupancy(x, y, nx, ny, xwid, ywid):
+    """Count the points in each sector of an nx x ny grid.
+
+    @param x, y        pixel coordinates, relative to the ccd origin
+    @param nx, ny      grid size
+    @param xwid, ywid  ccd size in pixels
+
+    @return integer array of counts, shape (nx, ny), indexed [ix, iy]
+    """
+    index, onGrid = sectorIndex(x, y, nx, ny, xwid, ywid)
+    return numpy.bincount(index[onGrid], minlength=nx*ny).reshape(nx, ny)
+
+
+def countEmpty(counts):
+    """The number of sectors in an occupancy map without any points."""
+    return int((numpy.asarray(counts) == 0).sum())
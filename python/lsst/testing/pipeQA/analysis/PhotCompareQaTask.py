@@ -30,6 +30,7 @@ import lsst.pex.config              as pexConfig
 import lsst.pipe.base               as pipeBase
 
 from   .QaAnalysisTask              import QaAnalysisTask
+from   .QaAnalysisConfig            import PhotCompareQaConfig
 import lsst.testing.pipeQA.figures  as qaFig
 import lsst.testing.pipeQA.TestCode as testCode
 import lsst.testing.pipeQA.figures.QaFigureUtils as qaFigUtils
@@ -39,58 +40,6 @@ import QaPlotUtils                  as qaPlotUtil
 
 
 
-class PhotCompareQaConfig(pexConfig.Config):
-    
-    cameras     = pexConfig.ListField(dtype = str, doc = "Cameras to run PhotCompareQaTask",
-                                      default = ("lsstSim", "hsc", "suprimecam", "cfht", "sdss", "coadd"))
-    magCut      = pexConfig.Field(dtype = float, doc = "Faintest magnitude for establishing photometric RMS",
-                                  default = 20.0)
-    deltaMin    = pexConfig.Field(dtype = float, doc = "Min allowed delta", default = -0.02)
-    deltaMax    = pexConfig.Field(dtype = float, doc = "Max allowed delta", default =  0.02)
-    rmsMax      = pexConfig.Field(dtype = float, doc = "Max allowed photometric RMS on bright end",
-                                  default = 0.02)
-    derrMax     = pexConfig.Field(dtype = float, doc = "Max allowed error bar underestimate on bright end",
-                                  default = 0.02)
-    slopeMinSigma = pexConfig.Field(dtype = float,
-                                    doc = "Min (positive valued) std.devs. of slope below slope=0",
-                                    default = 8.0)
-    slopeMaxSigma = pexConfig.Field(dtype = float,
-                                    doc = "Maximum std.dev. of slope above slope=0", default = 8.0)
-
-    compareTypes  = pexConfig.ListField(dtype = str,
-                                        doc = "Photometric Error: qaAnalysis.PhotCompareQaAnalysis", 
-                                        default = ("psf cat", "psf ap",
-                                                   "ap cat", "psf mod"))
-    
-# allowed = {
-#    "psf cat"  : "Compare Psf magnitudes to catalog magnitudes",
-#    "psf ap"   : "Compare Psf and aperture magnitudes",
-#    "psf mod"  : "Compare Psf and model magnitudes",
-#    "ap cat"   : "Compare Psf and model magnitudes",
-#    "psf inst" : "Compare PSF and instrument magnitudes",
-#    "inst cat" : "Compare Inst (Gaussian) and catalog magnitudes",
-#    "mod cat"  : "Compare model and catalog magnitudes",
-#    "mod inst" : "Separate stars/gxys for model and inst (Gaussian) magnitudes"
-# }
-#
-
-    starGalaxyToggle = pexConfig.ListField(dtype = str, doc = "Make separate figures for stars and galaxies.",
-                                           default = ("mod cat", "inst cat", "ap cat", "psf cat"))
-    
-# allowed = {
-#    "psf cat"  : "Separate stars/gxys for Psf magnitudes to catalog magnitudes",
-#    "psf ap"   : "Separate stars/gxys for Psf and aperture magnitudes",
-#    "psf mod"  : "Separate stars/gxys for Psf and model magnitudes",
-#    "ap cat"   : "Separate stars/gxys for Psf and model magnitudes",
-#    "psf inst" : "Separate stars/gxys for PSF and instrument magnitudes",
-#    "inst cat" : "Separate stars/gxys for Inst (Gaussian) and catalog magnitudes",
-#    "mod cat"  : "Separate stars/gxys for model and catalog magnitudes",
-#    "mod inst" : "Separate stars/gxys for model and inst (Gaussian) magnitudes"
-# }
-#
-
-    
-
 class PhotCompareQaTask(QaAnalysisTask):
     
     ConfigClass = PhotCompareQaConfig
@@ -188,6 +137,61 @@ class PhotCompareQaTask(QaAnalysisTask):
         elif mType=="inst":
             return s.getD(data.k_InstE)
 
+    def _getFluxName(self, mType):
+        """The name (see QaData.getNamedColumn()) of the flux for mType; cat fluxes are on the reference sources."""
+        return {"psf": "Psf", "ap": "Ap", "mod": "Mod", "inst": "Inst", "cat": "rPsf"}[mType]
+
+    def _getMagColumns(self, data, ss, srefs, catalog=False, cacheKey=None):
+        """Get the magnitudes, differences, errors, positions and star/galaxy class of good sources.
+
+        The arithmetic is done in the same order as it was done source by source, so the
+        results are identical.
+
+        @param ss       the sources (a catalog, or list of records)
+        @param srefs    the corresponding reference sources (ss itself if we're not using a catalog)
+        @param catalog  whether these are catalog matches (which had their errors computed differently)
+        @param cacheKey key for the ccd's columns in data's cache (see QaData.getNamedColumn)
+
+        @return dict of arrays: derr, diff, mag, x, y, star
+        """
+
+        columns = []
+        for mType in (self.magType1, self.magType2):
+            name = self._getFluxName(mType)
+            sources = srefs if mType == "cat" else ss
+            columns.append((data.getNamedColumn(sources, name, cacheKey),
+                            data.getNamedColumn(sources, name + "E", cacheKey),
+                            data.getMagColumn(sources, name, cacheKey),
+                            data.getMagErrColumn(sources, name, cacheKey) if catalog else None))
+        (f1, df1, m1, dm1), (f2, df2, m2, dm2) = columns
+
+        with numpy.errstate(invalid='ignore'):
+            good = (f1 > 0.0) & (f2 > 0.0) & ~data.getFlagMask(ss, self.config.badFlags, cacheKey)
+        f1, f2, df1, df2, m1, m2 = f1[good], f2[good], df1[good], df2[good], m1[good], m2[good]
+
+        if catalog:
+            dm1, dm2 = dm1[good], dm2[good]
+        else:
+            dm1 = 2.5*df1 / (f1*numpy.log(10.0))
+            dm2 = 2.5*df2 / (f2*numpy.log(10.0))
+
+        finite = numpy.isfinite(m1) & numpy.isfinite(m2)
+        star = data.getStarMask(ss, cacheKey)[good][finite]
+
+        # numpy.power() calls pow() as the scalar code did; arrays**2 multiply, which can differ in the last bit
+        return {
+            'derr' : numpy.sqrt(numpy.power(dm1[finite], 2.0) + numpy.power(dm2[finite], 2.0)),
+            'diff' : m1[finite] - m2[finite],
+            'mag'  : m1[finite],
+            'x'    : data.getNamedColumn(ss, "x", cacheKey)[good][finite],
+            'y'    : data.getNamedColumn(ss, "y", cacheKey)[good][finite],
+            'star' : star.astype(int),
+            }
+
+    def _appendColumns(self, raft, ccd, columns):
+        for name in ('derr', 'diff', 'mag', 'x', 'y', 'star'):
+            getattr(self, name).extend(raft, ccd, columns[name])
+
     def free(self):
         del self.x
         del self.y
@@ -233,31 +237,10 @@ class PhotCompareQaTask(QaAnalysisTask):
                 filter = self.filter[key].getName()
 
                 matchList = self.matchListDictSrc[key]['matched']
-
-                for m in matchList:
-                    sref, s, dist = m
-                    
-                    f1  = self._getFlux(data, self.magType1, s, sref)
-                    f2  = self._getFlux(data, self.magType2, s, sref)
-                    df1 = self._getFluxErr(data, self.magType1, s, sref)
-                    df2 = self._getFluxErr(data, self.magType2, s, sref)
-
-                    if (f1 > 0.0 and f2 > 0.0  and not data.isFlagged(s)):
-                        m1  = -2.5*numpy.log10(f1)
-                        m2  = -2.5*numpy.log10(f2)
-                        dm1 = 2.5 / numpy.log(10.0) * df1 / f1
-                        dm2 = 2.5 / numpy.log(10.0) * df2 / f2
-
-                        #if m1 < 20.0:
-                        #    print m1, m2, dm1, dm2
-                        star = 0 if s.getD(data.k_ext) else 1
-                        if numpy.isfinite(m1) and numpy.isfinite(m2):
-                            self.derr.append(raft, ccd, numpy.sqrt(dm1**2 + dm2**2))
-                            self.diff.append(raft, ccd, m1 - m2)
-                            self.mag.append(raft, ccd, m1)
-                            self.x.append(raft, ccd, s.getD(data.k_x))
-                            self.y.append(raft, ccd, s.getD(data.k_y))
-                            self.star.append(raft, ccd, star)
+                srefs = [m[0] for m in matchList]
+                ss    = [m[1] for m in matchList]
+                self._appendColumns(raft, ccd, self._getMagColumns(data, ss, srefs, catalog=True,
+                                                                   cacheKey=(key, 'matched')))
 
         # if we're not asked for catalog fluxes, we can just use a sourceSet
         else:
@@ -268,31 +251,7 @@ class PhotCompareQaTask(QaAnalysisTask):
                 
                 filter = self.filter[key].getName()
 
-                for s in ss:
-                    f1 = self._getFlux(data, self.magType1, s, s)
-                    f2 = self._getFlux(data, self.magType2, s, s)
-                    df1 = self._getFluxErr(data, self.magType1, s, s)
-                    df2 = self._getFluxErr(data, self.magType2, s, s)
-                    
-                    if ((f1 > 0.0 and f2 > 0.0) and not data.isFlagged(s)):
-
-                        m1 = -2.5*numpy.log10(f1)
-                        m2 = -2.5*numpy.log10(f2)
-                        dm1 = 2.5*df1 / (f1*numpy.log(10.0))
-                        dm2 = 2.5*df2 / (f2*numpy.log(10.0))
-                        #if m1 < 20.0:
-                        #    print m1, m2, dm1, dm2, numpy.sqrt(dm1**2+dm2**2)
-                        extend = s.getD(data.k_ext)
-
-                        star = 0 if extend else 1
-
-                        if numpy.isfinite(m1) and numpy.isfinite(m2):
-                            self.derr.append(raft, ccd, numpy.sqrt(dm1**2 + dm2**2))
-                            self.diff.append(raft, ccd, m1 - m2)
-                            self.mag.append(raft, ccd, m1)
-                            self.x.append(raft, ccd, s.getD(data.k_x))
-                            self.y.append(raft, ccd, s.getD(data.k_y))
-                            self.star.append(raft, ccd, star)
+                self._appendColumns(raft, ccd, self._getMagColumns(data, ss, ss, cacheKey=(key, 'src')))
                             
         testSet = self.getTestSet(data, dataId, label=self.testLabel)
 
@@ -310,15 +269,34 @@ class PhotCompareQaTask(QaAnalysisTask):
         allMags = numpy.array([])
         allDiffs = numpy.array([])
 
-        for raft,  ccd in self.mag.raftCcdKeys():
+        # get trendlines for the stars (group 2i) and galaxies (2i+1) of every ccd at once
+        keys = self.mag.raftCcdKeys()
+        selections = []
+        fitMags, fitDiffs, fitGroups = [], [], []
+        for i, (raft, ccd) in enumerate(keys):
             dmag0 = self.diff.get(raft, ccd)
             mag0 = self.mag.get(raft, ccd)
-            derr0 = self.derr.get(raft, ccd)
             star = self.star.get(raft, ccd)
             
             wGxy = numpy.where((mag0 > 10) & (mag0 < self.magCut) &
                                (star == 0) & (numpy.abs(dmag0) < 1.0))[0]
             w = numpy.where((mag0 > 10) & (mag0 < self.magCut) & (star > 0))[0]
+            selections.append((w, wGxy))
+
+            for j, wj in enumerate((w, wGxy)):
+                fitMags.append(mag0[wj])
+                fitDiffs.append(dmag0[wj])
+                fitGroups.append(numpy.zeros(len(wj), dtype=int) + 2*i + j)
+        fits = qaAnaUtil.robustPolyFitGroups(numpy.concatenate([numpy.array([])] + fitMags),
+                                             numpy.concatenate([numpy.array([])] + fitDiffs),
+                                             numpy.concatenate([numpy.array([], dtype=int)] + fitGroups),
+                                             1, nGroup=2*len(keys))
+
+        for i, (raft, ccd) in enumerate(keys):
+            dmag0 = self.diff.get(raft, ccd)
+            mag0 = self.mag.get(raft, ccd)
+            derr0 = self.derr.get(raft, ccd)
+            w, wGxy = selections[i]
 
             mag = mag0[w]
             dmag = dmag0[w]
@@ -351,10 +329,10 @@ class PhotCompareQaTask(QaAnalysisTask):
                 # get trendlines for stars/galaxies
                 # for alldata, use trendline for stars
                 if len(dmag) > 1:
-                    lineFit[0] = qaAnaUtil.robustPolyFit(mag, dmag, 1)
+                    lineFit[0] = tuple(fits[2*i])
                     lineCoeffs[0] = lineFit[0][0], lineFit[0][2]
                 if len(wGxy) > 1:
-                    lineFit[1] = qaAnaUtil.robustPolyFit(mag0[wGxy], dmag0[wGxy], 1)
+                    lineFit[1] = tuple(fits[2*i + 1])
                     lineCoeffs[1] = lineFit[1][0], lineFit[1][2]
                 lineFit[2] = lineFit[0]
                 lineCoeffs[2] = lineCoeffs[0]
@@ -26,6 +26,8 @@ import copy
 import datetime
 import argparse
 import traceback
+import multiprocessing
+import Queue
 import numpy
 
 import lsst.pex.config         as pexConfig
@@ -33,19 +35,37 @@ import lsst.pipe.base          as pipeBase
 import lsst.testing.pipeQA     as pipeQA
 
 from lsst.pex.logging          import Trace
-from .ZeropointFitQaTask       import ZeropointFitQaTask
-from .EmptySectorQaTask        import EmptySectorQaTask
-from .AstrometricErrorQaTask   import AstrometricErrorQaTask
-from .PhotCompareQaTask        import PhotCompareQaTask
-from .PsfShapeQaTask           import PsfShapeQaTask
-from .CompletenessQaTask       import CompletenessQaTask
-from .VignettingQaTask         import VignettingQaTask
-from .VisitToVisitPhotQaTask   import VisitToVisitPhotQaTask
-from .VisitToVisitAstromQaTask import VisitToVisitAstromQaTask
+from lsst.testing.pipeQA.Tracer import getTracer
+from lsst.testing.pipeQA.MemoryMonitor import MemoryMonitor
+import lsst.testing.pipeQA.BenchCompare as benchCompare
+from .                         import QaAnalysisConfig as qaAnaConfig
+from .                         import ShardUtils as shardUtil
 
-from .SummaryQaTask            import SummaryQaTask
 
+class LazyTaskTarget(object):
+    """A ConfigurableField target which imports its task module only when the task is made.
 
+    Importing a QaAnalysisTask pulls in the figures and matplotlib, so we only
+    pay for the tasks which are actually run.
+    """
+
+    def __init__(self, taskName):
+        """
+        @param taskName Name of the task class (and its module in lsst.testing.pipeQA.analysis)
+                        Its config, eg. FooQaConfig for FooQaTask, must be in QaAnalysisConfig.
+        """
+        self.__name__    = taskName
+        self.__module__  = "lsst.testing.pipeQA.analysis." + taskName
+        self.ConfigClass = getattr(qaAnaConfig, re.sub("Task$", "Config", taskName))
+
+    def getTaskClass(self):
+        module = __import__(self.__module__, fromlist=[self.__name__])
+        return getattr(module, self.__name__)
+
+    def __call__(self, *args, **kwargs):
+        return self.getTaskClass()(*args, **kwargs)
+
+    
 class PipeQaConfig(pexConfig.Config):
     
     doZptFitQa      = pexConfig.Field(dtype = bool,
@@ -75,26 +95,26 @@ class PipeQaConfig(pexConfig.Config):
                                       default = True)
 
     
-    zptFitQa        = pexConfig.ConfigurableField(target = ZeropointFitQaTask,
+    zptFitQa        = pexConfig.ConfigurableField(target = LazyTaskTarget("ZeropointFitQaTask"),
                                                   doc = "Quality of zeropoint fit")
-    emptySectorQa   = pexConfig.ConfigurableField(target = EmptySectorQaTask,
+    emptySectorQa   = pexConfig.ConfigurableField(target = LazyTaskTarget("EmptySectorQaTask"),
                                                   doc = "Look for missing matches")
-    astromQa        = pexConfig.ConfigurableField(target = AstrometricErrorQaTask,
+    astromQa        = pexConfig.ConfigurableField(target = LazyTaskTarget("AstrometricErrorQaTask"),
                                                   doc = "Quality of astrometric fit")
-    photCompareQa   = pexConfig.ConfigurableField(target = PhotCompareQaTask,
+    photCompareQa   = pexConfig.ConfigurableField(target = LazyTaskTarget("PhotCompareQaTask"),
                                                   doc = "Quality of photometry")
-    psfShapeQa      = pexConfig.ConfigurableField(target = PsfShapeQaTask,
+    psfShapeQa      = pexConfig.ConfigurableField(target = LazyTaskTarget("PsfShapeQaTask"),
                                                   doc = "Shape of Psf")
-    completeQa      = pexConfig.ConfigurableField(target = CompletenessQaTask,
+    completeQa      = pexConfig.ConfigurableField(target = LazyTaskTarget("CompletenessQaTask"),
                                                   doc = "Completeness of detection")
-    vignettingQa    = pexConfig.ConfigurableField(target = VignettingQaTask,
+    vignettingQa    = pexConfig.ConfigurableField(target = LazyTaskTarget("VignettingQaTask"),
                                                   doc = "Look for residual vignetting features")
-    vvPhotQa        = pexConfig.ConfigurableField(target = VisitToVisitPhotQaTask,
+    vvPhotQa        = pexConfig.ConfigurableField(target = LazyTaskTarget("VisitToVisitPhotQaTask"),
                                                   doc = "Visit to visit photometry")
-    vvAstromQa      = pexConfig.ConfigurableField(target = VisitToVisitAstromQaTask,
+    vvAstromQa      = pexConfig.ConfigurableField(target = LazyTaskTarget("VisitToVisitAstromQaTask"),
                                                   doc = "Visit to visit astrometry")
 
-    summaryQa       = pexConfig.ConfigurableField(target = SummaryQaTask,
+    summaryQa       = pexConfig.ConfigurableField(target = LazyTaskTarget("SummaryQaTask"),
                                                   doc = "Include Summary QA information")
 
     shapeAlgorithm = pexConfig.ChoiceField(
@@ -119,6 +139,12 @@ class PipeQaTask(pipeBase.Task):
     
     def __init__(self, **kwargs):
         pipeBase.Task.__init__(self, **kwargs)
+        self.traceBase = None
+        self.memMonitor = None
+        self.memReport = None
+        self.benchFile = None
+        self.benchCcds = {}
+        self.benchRss = 0
         
     def _makeArgumentParser(self):
         parser = argparse.ArgumentParser(usage=__doc__,
@@ -131,7 +157,7 @@ class PipeQaTask(pipeBase.Task):
                             help="Specify ccd as regex (default=%(default)s)")
         parser.add_argument("-d", "--dataSource", default="db",
                             help="Specify the source of data to load",
-                            choices=('butler', 'db'))
+                            choices=('butler', 'db', 'sqlite'))
         parser.add_argument("-e", "--exceptExit", default=False, action='store_true',
                             help="Don't capture exceptions, fail and exit (default=%(default)s)")
         parser.add_argument("-F", "--useForced", default=False, action='store_true',
@@ -168,6 +194,49 @@ class PipeQaTask(pipeBase.Task):
         
         parser.add_argument("--noWwwCache", default=False, action="store_true",
                             help="Disable caching of pass/fail (needed to run in parallel) (default=%(default)s)")
+        parser.add_argument("--trace", default=None, metavar="BASE",
+                            help="Record timed spans for loads, sql, butler gets, task phases and figures, and "+
+                            "write them to BASE.json (chrome://tracing) and BASE.folded (flamegraph.pl)")
+        parser.add_argument("--memReport", default=None,
+                            help="Snapshot the python heap after each ccd, and after each task's free(), "+
+                            "and write a report of what's growing to this file (slow; for finding leaks)")
+        parser.add_argument("--benchFile", default=None,
+                            help="Write per-ccd task phase times, load times and throughput, and peak rss "+
+                            "to this json file, for comparison with bin/pipeQaBenchCompare.py")
+        parser.add_argument("-j", "--nProc", default=1, type=int,
+                            help="Run CCDs in this many parallel processes, most expensive first; "+
+                            "needs --noWwwCache (default=%(default)s)")
+        parser.add_argument("--costFile", default=None,
+                            help="With --nProc, json file of per-CCD run times from earlier runs, used to "+
+                            "estimate costs (source counts are used otherwise), and updated by this run")
+        parser.add_argument("--batchMem", default=None, type=float,
+                            help="Load as many CCDs at once (a visit, or a raft) as fit in this many MB, "+
+                            "then analyse them one by one.  Needs a loader which can count "+
+                            "sources (db, sqlite) (default=%(default)s)")
+
+        # daemon mode
+        parser.add_argument("--watch", default=False, action="store_true",
+                            help="Keep running, and process new CCDs as they appear (default=%(default)s)")
+        parser.add_argument("--watchInterval", default=10.0, type=float,
+                            help="Seconds between polls for new data in --watch mode (default=%(default)s)")
+        parser.add_argument("--watchSettle", default=120.0, type=float,
+                            help="Seconds without a new CCD before a visit's summary figures are "+
+                            "refreshed in --watch mode (default=%(default)s)")
+        parser.add_argument("--watchTimeout", default=None, type=float,
+                            help="Exit --watch mode after this many idle seconds (default=never)")
+
+        # sharding
+        parser.add_argument("--shard", default=None,
+                            help="Run only shard i of N (given as i/N) of the (visit,ccd) units. "+
+                            "Requires -S none (default=%(default)s)")
+        parser.add_argument("--shardCost", default=None,
+                            help="Balance shards by cost: a json file of dataId:cost, or a shard directory "+
+                            "from a previous run (whose run times are used).  Default is to balance by count.")
+        parser.add_argument("--shardDir", default=None,
+                            help="Directory for shard completion records "+
+                            "(default=pipeQaShards_$WWW_RERUN)")
+        parser.add_argument("--shardVerify", default=None, type=int,
+                            help="Before running, check that all N shards have completed (default=%(default)s)")
 
         # and add in ability to override config
         config = self.ConfigClass()
@@ -201,6 +270,8 @@ class PipeQaTask(pipeBase.Task):
     def runSubtask(self, subtask, data, thisDataId, visit, test, testset, exceptExit):
     
         subtaskName = subtask.__name__
+        subtask = getTracer().wrap(subtask, test + "." + subtaskName, "task")
+        t0 = time.time()
 
         if exceptExit:
 
@@ -236,9 +307,454 @@ class PipeQaTask(pipeBase.Task):
                 testset.addTest(label, 1, [0, 0], "QA exception thrown (%s)" % (str(thisDataId)),
                                 backtrace="".join(s))
 
+        data.cachePerformance(thisDataId, test, subtaskName, time.time() - t0)
+        if self.benchFile is not None:
+            self.benchRss = max(self.benchRss, self._getMemUsageThisPid())
+
 
                 
             
+    def makeTaskList(self, data, dataset, wwwCache, summaryProcessing, lazyPlot,
+                     matchDset=None, matchVisits=None):
+        """Make the subtasks requested in our config which can run on this camera.
+
+        @param data              a QaData object
+        @param dataset           the dataset being run (default comparison for visit-to-visit)
+        @param wwwCache          cache pass/fail in the www sqlite files
+        @param summaryProcessing 'delay', 'none', or 'summOnly'
+        @param lazyPlot          'none', 'sensor', or 'all'
+        @param matchDset         comparison dataset for visit-to-visit
+        @param matchVisits       comparison visits for visit-to-visit
+        """
+        
+        taskList = []
+        # Simple ones
+        for doTask, taskStr in ( (self.config.doZptFitQa,      "zptFitQa"),
+                                 (self.config.doEmptySectorQa, "emptySectorQa"),
+                                 (self.config.doAstromQa,      "astromQa"),
+                                 (self.config.doPsfShapeQa,    "psfShapeQa"),
+                                 (self.config.doCompleteQa,    "completeQa"),
+                                 (self.config.doVignettingQa,  "vignettingQa"),
+                                 (self.config.doSummaryQa,     "summaryQa") ):
+            
+            if doTask and (data.cameraInfo.name in eval("self.config.%s.cameras" % (taskStr))):
+                stask = self.makeSubtask(taskStr, useCache=True, wwwCache=wwwCache,
+                                         summaryProcessing=summaryProcessing, lazyPlot=lazyPlot)
+                taskList.append(stask)
+
+                
+        # Multiple permutations
+        if self.config.doPhotCompareQa and (data.cameraInfo.name in self.config.photCompareQa.cameras):
+            for types in self.config.photCompareQa.compareTypes:
+                mag1, mag2 = types.split()
+                starGxyToggle = types in self.config.photCompareQa.starGalaxyToggle
+                stask = self.makeSubtask("photCompareQa", magType1=mag1, magType2=mag2,
+                                         starGalaxyToggle=starGxyToggle, useCache=True, wwwCache=wwwCache,
+                                         summaryProcessing=summaryProcessing, lazyPlot=lazyPlot)
+                taskList.append(stask)
+
+
+        # Additional dependencies needed
+        if self.config.doVisitQa:
+            if matchDset == None and matchVisits == None:
+                # we can't do it!
+                self.log.log(self.log.FATAL, "Unable to run visit to visit Qa; "+
+                             "please request a comparison visit or database")
+                sys.exit(1)
+
+            elif matchDset == None:
+                matchDset = dataset
+
+            elif matchVisits == None:
+                matchVisits = []
+
+            if data.cameraInfo.name in self.config.vvPhotQa.cameras:
+                for mType in self.config.vvPhotQa.magTypes:
+                    stask = self.makeSubtask("vvPhotQa", matchDset=matchDset, matchVisits=matchVisits,
+                                             mType=mType, useCache=True, wwwCache=wwwCache,
+                                             summaryProcessing=summaryProcessing, lazyPlot=lazyPlot)
+                    taskList.append(stask)
+
+            if data.cameraInfo.name in self.config.vvAstromQa.cameras:
+                stask = self.makeSubtask("vvAstromQa", matchDset = matchDset, matchVisits = matchVisits, 
+                                         useCache=True, wwwCache=wwwCache, summaryProcessing=summaryProcessing,
+                                         lazyPlot=lazyPlot)
+                taskList.append(stask)
+
+        return taskList
+
+
+    def runDataId(self, data, thisDataId, visit, taskList, testRegex, summaryProcessing,
+                  wwwCache, exceptExit, keepCache=False):
+        """Run the test(), plot(), and free() methods of each task on a single (verified) dataId.
+
+        @param data              a QaData object
+        @param thisDataId        the dataId (one ccd) to run
+        @param visit             the visit thisDataId belongs to
+        @param taskList          the subtasks to run
+        @param testRegex         regex selecting which subtasks to run
+        @param summaryProcessing 'delay', 'none', or 'summOnly'
+        @param wwwCache          cache pass/fail in the www sqlite files
+        @param exceptExit        don't capture exceptions
+        @param keepCache         don't clear the cache afterwards (the rest of its batch is still to run)
+        """
+
+        t0 = time.time()
+        
+        raftName, ccdName = data.cameraInfo.getRaftAndSensorNames(thisDataId)
+        ccdName = data.cameraInfo.getDetectorName(raftName, ccdName)
+        testset = pipeQA.TestSet(group="", label="QA-failures", wwwCache=wwwCache, sqliteSuffix=ccdName)
+
+        for task in taskList:
+
+            test = str(task)
+            if not re.search(testRegex, test):
+                continue
+
+            date = datetime.datetime.now().strftime("%a %Y-%m-%d %H:%M:%S")
+            visitLog = str(visit) + " ccd:" + str(thisDataId['ccd'])
+            self.log.log(self.log.INFO, "Running " + test + "  visit:" + visitLog + "  ("+date+")")
+
+
+            # try the test() method
+            if summaryProcessing in ['delay', 'none']:
+                self.runSubtask(task.test, data, thisDataId, visit, test, testset, exceptExit)
+
+            # try the plot() method
+            self.runSubtask(task.plot, data, thisDataId, visit, test, testset, exceptExit)
+
+            # try the free() method
+            # test() method only ran for 'delay' and 'none'.  Only then is there stuff to free
+            if summaryProcessing in ['delay', 'none']:
+                self.runSubtask(task.free, data, thisDataId, visit, test, testset, exceptExit)
+                if self.memMonitor is not None:
+                    self.memMonitor.taskFreed(task, exclude=(data, self, task.log, task.config))
+
+
+        if self.benchFile is not None:
+            key = data._dataIdToString(thisDataId, defineFully=True)
+            self.benchCcds[key] = self.benchmarkCcd(data, thisDataId, time.time() - t0)
+            benchCompare.writeBench(self.benchFile, self.benchCcds)
+            
+        # we're now done this dataId ... can clear the cache            
+        if not keepCache:
+            data.clearCache()
+
+        if self.memMonitor is not None:
+            self.memMonitor.snapshot(data._dataIdToString(thisDataId, defineFully=True),
+                                     self._getMemUsageThisPid())
+            self.memMonitor.writeReport(self.memReport)
+
+        getTracer().complete("ccd", "ccd", t0, time.time(), dataId=thisDataId)
+
+
+    def runBatch(self, data, batchDataId, members, visit, taskList, testRegex, summaryProcessing,
+                 wwwCache, exceptExit):
+        """Load a batch of ccds at once, and run the tasks on each of them in turn.
+
+        @param data              a QaData object
+        @param batchDataId       the dataId (with regexes) covering the batch, as given by batchDataId()
+        @param members           the ccd dataIds in the batch
+        @param visit             the visit the batch belongs to
+        @param taskList          the subtasks to run
+        @param testRegex         regex selecting which subtasks to run
+        @param summaryProcessing 'delay' or 'none'
+        @param wwwCache          cache pass/fail in the www sqlite files
+        @param exceptExit        don't capture exceptions
+        """
+
+        self.log.log(self.log.INFO, "Loading %d ccds of visit %s" % (len(members), str(visit)))
+        data.loadBatch(batchDataId)
+
+        for thisDataId in members:
+            if not data.verify(thisDataId):
+                self.log.log(self.log.WARN, "Missing dataId="+str(thisDataId))
+                continue
+            self.runDataId(data, thisDataId, visit, taskList, testRegex, summaryProcessing,
+                           wwwCache, exceptExit, keepCache=True)
+
+        # we're now done this batch ... can clear the cache
+        data.clearCache()
+
+
+    def benchmarkCcd(self, data, thisDataId, elapsed):
+        """Collect the performance metrics for a dataId which has just been run (before clearCache()).
+
+        @param data        a QaData object
+        @param thisDataId  the dataId which was run
+        @param elapsed     the time taken for the whole dataId
+        """
+        
+        metrics = {}
+        perform = data.performCache.get(data._dataIdToString(thisDataId, defineFully=True), {})
+        for test, labels in perform.items():
+            if test == 'total':
+                continue
+            for label, value in labels.items():
+                metrics["task.%s.%s" % (test, label)] = value
+
+        for name, t in data.loadTimes.items():
+            metrics["load." + name] = t
+
+        # rows/s for the main loaders
+        for name, cache in (("SourceSets", data.sourceSetCache), ("MatchList", data.matchListCache)):
+            nRow = sum([len(v) for v in cache.values() if hasattr(v, "__len__")])
+            t = sum([t for load, t in data.loadTimes.items() if load.startswith("Loading " + name)])
+            if nRow > 0 and t > 0.0:
+                metrics["throughput." + name] = nRow/t
+            
+        metrics["rss.peak"] = self.benchRss
+        metrics["ccd.total"] = elapsed
+        self.benchRss = 0
+        return metrics
+
+        
+    def summarizeVisit(self, data, dataIdVisit, doneKeys, summTaskList, testRegex, wwwCache, exceptExit):
+        """Make the summary figures for a visit from the per-CCD results already on disk.
+
+        @param data         a QaData object
+        @param dataIdVisit  the dataId of the visit
+        @param doneKeys     the set of dataId strings for CCDs which have been processed
+        @param summTaskList subtasks constructed with summaryProcessing='summOnly'
+        """
+        
+        visit = dataIdVisit['visit']
+        done = [d for d in data.breakDataId(dataIdVisit, 'ccd')
+                if data._dataIdToString(d, defineFully=True) in doneKeys]
+        if len(done) == 0:
+            return
+
+        # the tasks make their summary figures when called with the final dataId
+        data.brokenDataIdList = done
+        lastDataId = done[-1]
+        if not data.verify(lastDataId):
+            self.log.log(self.log.WARN, "Unable to summarize visit %s, missing dataId=%s" %
+                         (str(visit), str(lastDataId)))
+            return
+
+        self.log.log(self.log.INFO, "Summarizing visit %s (%d ccds)" % (str(visit), len(done)))
+        self.runDataId(data, lastDataId, visit, summTaskList, testRegex, 'summOnly', wwwCache, exceptExit)
+
+        ts = pipeQA.TestSet(group="", label="QA-failures", wwwCache=wwwCache, sqliteSuffix="")
+        ts.accrete()
+        ts.updateCounts()
+
+        
+    def runWorker(self, makeData, makeTasks, unitQueue, resultQueue, testRegex, wwwCache, exceptExit):
+        """Run units from unitQueue until we get None, reporting each one's run time on resultQueue.
+
+        @param makeData    function returning a new QaData (each worker needs its own connection)
+        @param makeTasks   function(data) returning the subtasks to run
+        """
+
+        # we were forked with a copy of the parent's spans
+        getTracer().reset()
+        
+        data = makeData()
+        taskList = makeTasks(data)
+
+        while True:
+            unit = unitQueue.get()
+            if unit is None:
+                break
+            visit, thisDataId = unit
+            key = data._dataIdToString(thisDataId, defineFully=True)
+
+            if not data.verify(thisDataId):
+                self.log.log(self.log.WARN, "Missing dataId="+str(thisDataId))
+                resultQueue.put((key, None))
+                continue
+
+            t0 = time.time()
+            self.runDataId(data, thisDataId, visit, taskList, testRegex, 'none', wwwCache, exceptExit)
+            resultQueue.put((key, time.time() - t0))
+
+        if getTracer().enabled:
+            getTracer().saveEvents(self.traceBase + ".worker%d" % (os.getpid()))
+
+            
+    def runParallel(self, data, dataId, visits, nProc, makeData, makeTasks, testRegex, wwwCache, exceptExit,
+                    history=None):
+        """Run the (visit, ccd) units in nProc worker processes, most expensive first.
+
+        Workers take the next unit from a shared queue as they finish the last, so a
+        worker stuck on a dense ccd doesn't hold up the others' work; starting with the
+        most expensive units leaves only cheap ones to fill in at the end of the run.
+
+        @param data          a QaData object (used to find the units and estimate their costs)
+        @param dataId        the dataId (with regexes) to run
+        @param visits        the visits to run
+        @param nProc         number of worker processes
+        @param makeData      function returning a new QaData
+        @param makeTasks     function(data) returning the subtasks to run
+        @param history       dict of ccd dataId string:seconds from earlier runs
+
+        @return dict of dataId string:seconds for the units run (None for missing data)
+        """
+
+        units = {}
+        visitDataIds = []
+        for visit in visits:
+            dataIdVisit = copy.copy(dataId)
+            dataIdVisit['visit'] = visit
+            visitDataIds.append(dataIdVisit)
+            for thisDataId in data.breakDataId(dataIdVisit, 'ccd'):
+                units[data._dataIdToString(thisDataId, defineFully=True)] = (visit, thisDataId)
+
+        # prefer the times from earlier runs (if they cover any of these ccds), else the number of sources
+        costs = None
+        if history and len(set(history.keys()) & set(units.keys())) > 0:
+            costs = history
+            self.log.log(self.log.INFO, "Estimating ccd costs from earlier run times")
+        else:
+            counts = {}
+            for dataIdVisit in visitDataIds:
+                visitCounts = data.estimateSourceCounts(dataIdVisit)
+                if visitCounts:
+                    counts.update(visitCounts)
+            if len(counts) > 0:
+                costs = counts
+                self.log.log(self.log.INFO, "Estimating ccd costs from source counts")
+
+        order = shardUtil.orderByCost(units.keys(), costs)
+        
+        unitQueue   = multiprocessing.Queue()
+        resultQueue = multiprocessing.Queue()
+        for key in order:
+            unitQueue.put(units[key])
+        for i in range(nProc):
+            unitQueue.put(None)
+
+        self.log.log(self.log.INFO, "Running %d ccds in %d processes" % (len(order), nProc))
+        procs = []
+        for i in range(nProc):
+            p = multiprocessing.Process(target=self.runWorker,
+                                        args=(makeData, makeTasks, unitQueue, resultQueue,
+                                              testRegex, wwwCache, exceptExit))
+            p.start()
+            procs.append(p)
+
+        # collect results until everything's back, or the workers have all gone
+        times = {}
+        while len(times) < len(order):
+            try:
+                key, t = resultQueue.get(True, 1.0)
+                times[key] = t
+            except Queue.Empty:
+                if not [p for p in procs if p.is_alive()]:
+                    break
+        for p in procs:
+            p.join()
+        if getTracer().enabled:
+            getTracer().absorb(self.traceBase + ".worker*")
+        # ... and anything sent just before they exited
+        while True:
+            try:
+                key, t = resultQueue.get_nowait()
+                times[key] = t
+            except Queue.Empty:
+                break
+
+        notRun = sorted(set(order) - set(times.keys()))
+        if len(notRun) > 0:
+            self.log.log(self.log.WARN, "%d ccds were not run: %s" % (len(notRun), ", ".join(notRun)))
+            if exceptExit:
+                sys.exit(1)
+                
+        return times
+
+        
+    def watch(self, data, dataId, visitList, taskList, summTaskList, testRegex, wwwCache, exceptExit,
+              interval=10.0, settle=120.0, timeout=None):
+        """Poll the data for newly completed CCDs and run the tasks on them as they appear.
+
+        The QaData, camera, and tasks are kept for the life of the process, so each
+        new CCD costs only its own loading and analysis.
+
+        @param data         a QaData object
+        @param dataId       the dataId (with regexes) to watch
+        @param visitList    explicit visits to restrict to (empty for all)
+        @param taskList     subtasks constructed with summaryProcessing='none'
+        @param summTaskList subtasks constructed with summaryProcessing='summOnly' (empty for no summaries)
+        @param interval     seconds between polls
+        @param settle       seconds without a new CCD before a visit's summary is refreshed
+        @param timeout      exit after this many idle seconds (None to run forever)
+        """
+
+        doneKeys    = set()
+        lastNew     = {}     # visit -> time the most recent ccd was processed
+        summarized  = {}     # visit -> time of the most recent summary
+        lastActive  = time.time()
+
+        self.log.log(self.log.INFO, "Watching for new data (poll every %.1fs)" % (interval))
+        
+        try:
+            while True:
+
+                # forget what we failed to load last time, and pick up newly registered data
+                data.clearCache()
+                data.refresh()
+
+                nNew = 0
+                visits = data.getVisits(dataId)
+                if len(visitList) > 0:
+                    visits = [v for v in visits if v in visitList]
+
+                for visit in visits:
+                    dataIdVisit = copy.copy(dataId)
+                    dataIdVisit['visit'] = visit
+
+                    for thisDataId in data.breakDataId(dataIdVisit, 'ccd'):
+                        key = data._dataIdToString(thisDataId, defineFully=True)
+                        if key in doneKeys:
+                            continue
+                        if not data.verify(thisDataId):
+                            continue
+
+                        self.runDataId(data, thisDataId, visit, taskList, testRegex, 'none',
+                                       wwwCache, exceptExit)
+                        doneKeys.add(key)
+                        lastNew[visit] = time.time()
+                        nNew += 1
+
+                now = time.time()
+                if nNew > 0:
+                    lastActive = now
+                exiting = (timeout is not None) and (now - lastActive > timeout)
+
+                # refresh the summary of any visit which has gone quiet since it was last summarized
+                for visit, tNew in sorted(lastNew.items()):
+                    quiet = exiting or (now - tNew >= settle)
+                    if len(summTaskList) > 0 and quiet and summarized.get(visit, 0.0) < tNew:
+                        dataIdVisit = copy.copy(dataId)
+                        dataIdVisit['visit'] = visit
+                        self.summarizeVisit(data, dataIdVisit, doneKeys, summTaskList, testRegex,
+                                            wwwCache, exceptExit)
+                        data.clearCache()
+                        summarized[visit] = time.time()
+
+                if exiting:
+                    self.log.log(self.log.INFO, "No new data for %.1fs, exiting." % (now - lastActive))
+                    break
+
+                if nNew == 0:
+                    time.sleep(interval)
+
+        except KeyboardInterrupt:
+            self.log.log(self.log.INFO, "Interrupted, exiting watch.")
+
+            
+    def writeTrace(self):
+        """Write the spans recorded with --trace BASE to BASE.json and BASE.folded."""
+        if self.traceBase is None:
+            return
+        tracer = getTracer()
+        tracer.writeChromeTrace(self.traceBase + ".json")
+        tracer.writeFoldedStacks(self.traceBase + ".folded")
+        self.log.log(self.log.INFO, "Wrote %d trace spans to %s.json and %s.folded" %
+                     (len(tracer.events), self.traceBase, self.traceBase))
+
+        
     @pipeBase.timeMethod
     def parseAndRun(self, args):
         self.log.log(self.log.INFO, "PipeQA Start")
@@ -271,6 +787,14 @@ class PipeQaTask(pipeBase.Task):
         lazyPlot     = parsedCmd.lazyPlot
         verbosity    = parsedCmd.verbosity
 
+        self.traceBase = parsedCmd.trace
+        getTracer().enable(self.traceBase is not None)
+
+        self.benchFile = parsedCmd.benchFile
+        self.memReport = parsedCmd.memReport
+        if self.memReport is not None:
+            self.memMonitor = MemoryMonitor()
+
         summOpts = ["delay", "none", "summOnly"]
         if not summaryProcessing in summOpts:
             raise ValueError("summaryProcessing must be: "+", ".join(summOpts))
@@ -282,9 +806,6 @@ class PipeQaTask(pipeBase.Task):
         # finally, the dataset to run!
         dataset      = parsedCmd.dataset
 
-        # this is outdated.  we always want it true now
-        keep = True
-        
         # Is this deprecated?
         Trace.setVerbosity('lsst.testing.pipeQA', int(verbosity))
         
@@ -293,10 +814,11 @@ class PipeQaTask(pipeBase.Task):
             visitList = dataIdInput['visit']
             dataIdInput['visit'] = ".*"
             
-        data = pipeQA.makeQaData(dataset, rerun=rerun, camera=camera,
-                                 shapeAlg = self.config.shapeAlgorithm,
-                                 retrievalType=retrievalType,
-                                 useForced=useForced, coaddTable=coaddTable, log=self.log)
+        makeData = lambda: pipeQA.makeQaData(dataset, rerun=rerun, camera=camera,
+                                             shapeAlg = self.config.shapeAlgorithm,
+                                             retrievalType=retrievalType,
+                                             useForced=useForced, coaddTable=coaddTable, log=self.log)
+        data = makeData()
     
         if data.cameraInfo.name == 'lsstSim' and  dataIdInput.has_key('ccd'):
             dataIdInput['sensor'] = dataIdInput['ccd']
@@ -318,61 +840,48 @@ class PipeQaTask(pipeBase.Task):
                 raise Exception("Key "+k+" not available for this dataset (camera="+data.cameraInfo.name+")")
     
             
-        taskList = []
-        # Simple ones
-        for doTask, taskStr in ( (self.config.doZptFitQa,      "zptFitQa"),
-                                 (self.config.doEmptySectorQa, "emptySectorQa"),
-                                 (self.config.doAstromQa,      "astromQa"),
-                                 (self.config.doPsfShapeQa,    "psfShapeQa"),
-                                 (self.config.doCompleteQa,    "completeQa"),
-                                 (self.config.doVignettingQa,  "vignettingQa"),
-                                 (self.config.doSummaryQa,     "summaryQa") ):
+        if parsedCmd.watch:
+            if summaryProcessing == 'summOnly':
+                raise ValueError("--watch can't be used with summaryProcessing=summOnly")
             
-            if doTask and (data.cameraInfo.name in eval("self.config.%s.cameras" % (taskStr))):
-                stask = self.makeSubtask(taskStr, useCache=keep, wwwCache=wwwCache,
-                                         summaryProcessing=summaryProcessing, lazyPlot=lazyPlot)
-                taskList.append(stask)
-
-                
-        # Multiple permutations
-        if self.config.doPhotCompareQa and (data.cameraInfo.name in self.config.photCompareQa.cameras):
-            for types in self.config.photCompareQa.compareTypes:
-                mag1, mag2 = types.split()
-                starGxyToggle = types in self.config.photCompareQa.starGalaxyToggle
-                stask = self.makeSubtask("photCompareQa", magType1=mag1, magType2=mag2,
-                                         starGalaxyToggle=starGxyToggle, useCache=keep, wwwCache=wwwCache,
-                                         summaryProcessing=summaryProcessing, lazyPlot=lazyPlot)
-                taskList.append(stask)
+            # ccds are run as they arrive, summaries are made when a visit goes quiet
+            taskList = self.makeTaskList(data, dataset, wwwCache, 'none', lazyPlot,
+                                         matchDset, matchVisits)
+            summTaskList = []
+            if summaryProcessing == 'delay':
+                summTaskList = self.makeTaskList(data, dataset, wwwCache, 'summOnly', lazyPlot,
+                                                 matchDset, matchVisits)
+            self.watch(data, dataId, visitList, taskList, summTaskList, testRegex, wwwCache, exceptExit,
+                       parsedCmd.watchInterval, parsedCmd.watchSettle, parsedCmd.watchTimeout)
 
-
-        # Additional dependencies needed
-        if self.config.doVisitQa:
-            if matchDset == None and matchVisits == None:
-                # we can't do it!
-                self.log.log(self.log.FATAL, "Unable to run visit to visit Qa; "+
-                             "please request a comparison visit or database")
+            self.writeTrace()
+            self.log.log(self.log.INFO, "PipeQA End")
+            return pipeBase.Struct()
+            
+        # the shards of a scattered run must all be done before we gather
+        shardDir = parsedCmd.shardDir
+        if shardDir is None:
+            shardDir = "pipeQaShards" + ("_" + os.path.basename(os.environ["WWW_RERUN"])
+                                         if os.environ.has_key("WWW_RERUN") else "")
+        if parsedCmd.shardVerify is not None:
+            problems = shardUtil.verifyShards(shardDir, parsedCmd.shardVerify)
+            if len(problems) > 0:
+                for problem in problems:
+                    self.log.log(self.log.FATAL, "Incomplete shard: " + problem)
                 sys.exit(1)
+            self.log.log(self.log.INFO, "All %d shards completed." % (parsedCmd.shardVerify))
 
-            elif matchDset == None:
-                matchDset = dataset
-
-            elif matchVisits == None:
-                matchVisits = []
-
-            if data.cameraInfo.name in self.config.vvPhotQa.cameras:
-                for mType in self.config.vvPhotQa.magTypes:
-                    stask = self.makeSubtask("vvPhotQa", matchDset=matchDset, matchVisits=matchVisits,
-                                             mType=mType, useCache=keep, wwwCache=wwwCache,
-                                             summaryProcessing=summaryProcessing, lazyPlot=lazyPlot)
-                    taskList.append(stask)
+        shard = None
+        if parsedCmd.shard is not None:
+            if summaryProcessing != 'none' or parsedCmd.watch:
+                raise ValueError("--shard must be run with summaryProcessing=none, "+
+                                 "then summarized with -S summOnly --shardVerify N")
+            shard = shardUtil.parseShard(parsedCmd.shard)
 
-            if data.cameraInfo.name in self.config.vvAstromQa.cameras:
-                stask = self.makeSubtask("vvAstromQa", matchDset = matchDset, matchVisits = matchVisits, 
-                                         useCache=keep, wwwCache=wwwCache, summaryProcessing=summaryProcessing,
-                                         lazyPlot=lazyPlot)
-                taskList.append(stask)
-                
-                
+        batchMem = parsedCmd.batchMem
+        if batchMem is not None and shard is not None:
+            raise ValueError("--batchMem can't be used with --shard")
+            
         # Split by visit, and handle specific requests
         visitsTmp = data.getVisits(dataId)
         visits = []
@@ -382,67 +891,129 @@ class PipeQaTask(pipeBase.Task):
                     visits.append(v)
         else:
             visits = visitsTmp
+
+        nProc = parsedCmd.nProc
+        if nProc > 1:
+            if shard is not None or batchMem is not None or summaryProcessing == 'summOnly':
+                raise ValueError("--nProc can't be used with --shard, --batchMem, or summaryProcessing=summOnly")
+            if wwwCache:
+                raise ValueError("--nProc needs --noWwwCache")
+            if self.benchFile is not None or self.memReport is not None:
+                raise ValueError("--benchFile and --memReport measure a single process; they can't be used with --nProc")
+
+            # the workers only run ccds, summaries are made here once they're all done
+            makeTasks = lambda d: self.makeTaskList(d, dataset, wwwCache, 'none', lazyPlot,
+                                                    matchDset, matchVisits)
+            history = None
+            if parsedCmd.costFile is not None and os.path.exists(parsedCmd.costFile):
+                history = shardUtil.loadCosts(parsedCmd.costFile)
+            
+            times = self.runParallel(data, dataId, visits, nProc, makeData, makeTasks,
+                                     testRegex, wwwCache, exceptExit, history)
+
+            if parsedCmd.costFile is not None:
+                costs = history or {}
+                for key, t in times.items():
+                    if t is not None:
+                        costs[key] = t
+                shardUtil.saveCosts(parsedCmd.costFile, costs)
+
+            if summaryProcessing == 'delay':
+                summTaskList = self.makeTaskList(data, dataset, wwwCache, 'summOnly', lazyPlot,
+                                                 matchDset, matchVisits)
+                doneKeys = set([key for key, t in times.items() if t is not None])
+                for visit in visits:
+                    dataIdVisit = copy.copy(dataId)
+                    dataIdVisit['visit'] = visit
+                    self.summarizeVisit(data, dataIdVisit, doneKeys, summTaskList, testRegex,
+                                        wwwCache, exceptExit)
+                    data.clearCache()
+
+            self.writeTrace()
+            self.log.log(self.log.INFO, "PipeQA End")
+            return pipeBase.Struct()
+            
+        taskList = self.makeTaskList(data, dataset, wwwCache, summaryProcessing, lazyPlot,
+                                     matchDset, matchVisits)
     
         
-
+        visitDataIds = []
         for visit in visits:
-            visit_t0 = time.time()
-    
             dataIdVisit = copy.copy(dataId)
             dataIdVisit['visit'] = visit
     
             # now break up the run into eg. rafts or ccds
             #  ... if we only run one raft or ccd at a time, we use less memory
+            #  ... a summary only run loads nothing per ccd, so it's never batched
+            if batchMem is not None and summaryProcessing != 'summOnly':
+                batches = data.batchDataId(dataIdVisit, batchMem*1024**2)
+                visitDataIds.append((visit, batches))
+                continue
+            
             brokenDownDataIdList = data.breakDataId(dataIdVisit, 'ccd')
 
             #if this is a summary only run, shortcircuit to the last ccd
             if summaryProcessing in ['summOnly']:
                 brokenDownDataIdList = [brokenDownDataIdList[-1]]
 
-            for thisDataId in brokenDownDataIdList:
+            visitDataIds.append((visit, [[d, [d]] for d in brokenDownDataIdList]))
+
+
+        # keep only our share of the (visit,ccd) units
+        if shard is not None:
+            iShard, nShard = shard
+            costs = None
+            if parsedCmd.shardCost is not None:
+                costs = shardUtil.loadCosts(parsedCmd.shardCost)
+            keys = [data._dataIdToString(d, defineFully=True) for v, dList in visitDataIds for d, m in dList]
+            assignment = shardUtil.assignShards(keys, nShard, costs)
+            visitDataIds = [(visit, [[d, m] for d, m in dList
+                                     if assignment[data._dataIdToString(d, defineFully=True)] == iShard])
+                            for visit, dList in visitDataIds]
+            shardKeys = [k for k in keys if assignment[k] == iShard]
+            self.log.log(self.log.INFO, "Running shard %d/%d: %d of %d units" %
+                         (iShard, nShard, len(shardKeys), len(keys)))
+            shardDone, shardMissing, shardTimes = set(), set(), {}
+            shardUtil.writeShardRecord(shardDir, iShard, nShard, shardKeys,
+                                       shardDone, shardMissing, shardTimes, False)
+            
+
+        for visit, brokenDownDataIdList in visitDataIds:
+
+            # the tasks make their summary figures when called with the final ccd
+            data.brokenDataIdList = [d for batchDataId, members in brokenDownDataIdList for d in members]
+
+            for batchDataId, members in brokenDownDataIdList:
+
+                # load a batch of ccds with one query each, then run the tasks on its ccds
+                #  ... which are served from the cache
+                if len(members) > 1:
+                    self.runBatch(data, batchDataId, members, visit, taskList, testRegex,
+                                  summaryProcessing, wwwCache, exceptExit)
+                    continue
+                thisDataId = members[0]
 
                 haveIt = data.verify(thisDataId)
                 if not haveIt:
                     self.log.log(self.log.WARN, "Missing dataId="+str(thisDataId))
+                    if shard is not None:
+                        shardMissing.add(data._dataIdToString(thisDataId, defineFully=True))
                     continue
-                
-                raftName, ccdName = data.cameraInfo.getRaftAndSensorNames(thisDataId)
-                ccdName = data.cameraInfo.getDetectorName(raftName, ccdName)
-                testset = pipeQA.TestSet(group="", label="QA-failures", wwwCache=wwwCache, sqliteSuffix=ccdName)
 
-                for task in taskList:
-    
-                    test = str(task)
-                    if not re.search(testRegex, test):
-                        continue
-    
-                    date = datetime.datetime.now().strftime("%a %Y-%m-%d %H:%M:%S")
-                    visitLog = str(visit) + " ccd:" + str(thisDataId['ccd'])
-                    self.log.log(self.log.INFO, "Running " + test + "  visit:" + visitLog + "  ("+date+")")
-    
-    
-                    # try the test() method
-                    if summaryProcessing in ['delay', 'none']:
-                        self.runSubtask(task.test, data, thisDataId, visit, test, testset, exceptExit)
+                t0 = time.time()
+                self.runDataId(data, thisDataId, visit, taskList, testRegex, summaryProcessing,
+                               wwwCache, exceptExit)
 
-                    # try the plot() method
-                    self.runSubtask(task.plot, data, thisDataId, visit, test, testset, exceptExit)
-
-                    # try the free() method
-                    # test() method only ran for 'delay' and 'none'.  Only then is there stuff to free
-                    if summaryProcessing in ['delay', 'none']:
-                        self.runSubtask(task.free, data, thisDataId, visit, test, testset, exceptExit)
-    
-                        
-                # we're now done this dataId ... can clear the cache            
-                data.clearCache()
-                raftName = ""
-                if thisDataId.has_key('raft'):
-                    raftName = str(thisDataId['raft'])+"-"
-                ccdName = ""
-                if thisDataId.has_key("ccd"):
-                    ccdName = str(thisDataId[data.ccdConvention])
+                if shard is not None:
+                    key = data._dataIdToString(thisDataId, defineFully=True)
+                    shardDone.add(key)
+                    shardTimes[key] = time.time() - t0
+                    shardUtil.writeShardRecord(shardDir, iShard, nShard, shardKeys,
+                                               shardDone, shardMissing, shardTimes, False)
 
+        if shard is not None:
+            shardUtil.writeShardRecord(shardDir, iShard, nShard, shardKeys,
+                                       shardDone, shardMissing, shardTimes, True)
                 
         if summaryProcessing in ['summOnly']:
             ts = pipeQA.TestSet(group="", label="QA-failures", wwwCache=wwwCache, sqliteSuffix="")
@@ -450,6 +1021,7 @@ class PipeQaTask(pipeBase.Task):
             ts.updateCounts()
 
 
+        self.writeTrace()
         self.log.log(self.log.INFO, "PipeQA End")
         return pipeBase.Struct()
 
@@ -30,6 +30,7 @@ import lsst.pex.config              as pexConfig
 import lsst.pipe.base               as pipeBase
 
 from   .QaAnalysisTask              import QaAnalysisTask
+from   .QaAnalysisConfig            import PsfShapeQaConfig
 import lsst.testing.pipeQA.figures  as qaFig
 import lsst.testing.pipeQA.TestCode as testCode
 import RaftCcdData                  as raftCcdData
@@ -38,13 +39,6 @@ import QaPlotUtils                  as qaPlotUtil
 
 
 
-class PsfShapeQaConfig(pexConfig.Config): 
-    cameras  = pexConfig.ListField(dtype = str, doc = "Cameras to run PsfShapeQaTask",
-                                   default = ("lsstSim", "hsc", "suprimecam", "cfht", "sdss", "coadd"))
-    ellipMax = pexConfig.Field(dtype = float, doc = "Maximum median ellipticity", default = 0.30)
-    fwhmMax  = pexConfig.Field(dtype = float, doc = "Maximum Psf Fwhm (arcsec)", default = 1.0)
-    
-    
 class PsfShapeQaTask(QaAnalysisTask):
     ConfigClass = PsfShapeQaConfig
     _DefaultName = "psfShapeQa"
@@ -78,6 +72,60 @@ class PsfShapeQaTask(QaAnalysisTask):
 
         del self.calexpDict
         
+    def _getShapeColumns(self, data, ss, cacheKey=None):
+        """Get the psf ellipticity, angle and fwhm (pixels) of the bright, unflagged stars on a ccd.
+
+        Everything is done with arrays, but with the same arithmetic as was done source by
+        source, so the results are identical.
+
+        @param ss        the sources of one ccd
+        @param cacheKey  key for the ccd's columns in data's cache (see QaData.getNamedColumn)
+        @return dict of arrays: ellip, theta, x, y, ra, dec, fwhm
+        """
+
+        sigmaToFwhm = 2.0*numpy.sqrt(2.0*numpy.log(2.0))
+
+        flux = data.getNamedColumn(ss, "Psf", cacheKey)
+        star = data.getStarMask(ss, cacheKey)
+        ixx  = data.getNamedColumn(ss, "ixx", cacheKey)
+        iyy  = data.getNamedColumn(ss, "iyy", cacheKey)
+        ixy  = data.getNamedColumn(ss, "ixy", cacheKey)
+
+        with numpy.errstate(invalid='ignore', divide='ignore'):
+
+            # only stars brighter than the median star are used
+            mags = data.getMagColumn(ss, "Psf", cacheKey)
+            w = (flux > 0) & numpy.isfinite(flux) & star
+            mag_med = numpy.median(mags[w]) if w.any() else numpy.NaN
+            mag = numpy.where(flux > 0, mags, 99.0)
+
+            # numpy.power() calls pow(), as x**2 did for scalars
+            tmp = 0.25*numpy.power(ixx - iyy, 2.0) + numpy.power(ixy, 2.0)
+            a2 = 0.5*(ixx + iyy) + numpy.sqrt(tmp)
+            b2 = 0.5*(ixx + iyy) - numpy.sqrt(tmp)
+            bad = (tmp < 0) | (a2 == 0) | (b2/a2 < 0)
+
+            ellip = 1.0 - numpy.sqrt(b2/a2)
+            theta = 0.5*numpy.arctan2(2.0*ixy, ixx - iyy)
+
+            # vectors have no direction, so default to pointing in +ve 'y'
+            # - failing to do this caused a stats bug when alignment is near pi/2
+            #   both +/- pi/2 arise but are essentially the same, ... and the mean is near zero
+            theta = numpy.where(theta < 0.0, theta + numpy.pi, theta)
+
+            good = (~bad & numpy.isfinite(ellip) & numpy.isfinite(theta) & star &
+                    (mag < mag_med) & ~data.getFlagMask(ss, self.config.badFlags, cacheKey))
+
+        return {
+            'ellip' : ellip[good],
+            'theta' : theta[good],
+            'x'     : data.getNamedColumn(ss, "x", cacheKey)[good],
+            'y'     : data.getNamedColumn(ss, "y", cacheKey)[good],
+            'ra'    : data.getNamedColumn(ss, "Ra", cacheKey)[good],
+            'dec'   : data.getNamedColumn(ss, "Dec", cacheKey)[good],
+            'fwhm'  : sigmaToFwhm*numpy.sqrt(0.5*(a2[good] + b2[good])),
+            }
+
     def test(self, data, dataId):
 
         # get data
@@ -97,7 +145,6 @@ class PsfShapeQaTask(QaAnalysisTask):
 
         # compute values of interest
         filter = None
-        sigmaToFwhm = 2.0*numpy.sqrt(2.0*numpy.log(2.0))
 
         fwhmByKey = {}
         for key, ss in self.ssDict.items():
@@ -110,56 +157,10 @@ class PsfShapeQaTask(QaAnalysisTask):
 
             fwhmByKey[key] = 0.0
 
-            mags = []
-            for s in ss:
-                flux = s.getD(data.k_Psf)
-                if flux > 0 and numpy.isfinite(flux) and not s.getD(data.k_ext):
-                    m = -2.5*numpy.log10(flux)
-                    mags.append(m)
-            mag_med = numpy.median(mags)
-
-            
-            fwhmTmp = []
-            for s in ss:
-                ixx = s.getD(data.k_ixx)
-                iyy = s.getD(data.k_iyy)
-                ixy = s.getD(data.k_ixy)
-
-                tmp = 0.25*(ixx-iyy)**2 + ixy**2
-                if tmp < 0:
-                    continue
-
-                a2 = 0.5*(ixx+iyy) + numpy.sqrt(tmp)
-                b2 = 0.5*(ixx+iyy) - numpy.sqrt(tmp)
-
-                if a2 == 0 or b2/a2 < 0:
-                    continue
-                
-                ellip = 1.0 - numpy.sqrt(b2/a2)
-                theta = 0.5*numpy.arctan2(2.0*ixy, ixx-iyy)
-
-                # vectors have no direction, so default to pointing in +ve 'y'
-                # - failing to do this caused a stats bug when alignment is near pi/2
-                #   both +/- pi/2 arise but are essentially the same, ... and the mean is near zero
-                if theta < 0.0:
-                    theta += numpy.pi
-                    
-                isStar = 0 if s.getD(data.k_ext) else 1
-
-                flux = s.getD(data.k_Psf)
-                mag = 99.0
-                if flux > 0:
-                    mag = -2.5*numpy.log10(s.getD(data.k_Psf))
-                if (numpy.isfinite(ellip) and numpy.isfinite(theta) and
-                    isStar and mag < mag_med and not data.isFlagged(s)):
-
-                    self.ellip.append(raft, ccd, ellip)
-                    self.theta.append(raft, ccd, theta)
-                    self.x.append(raft, ccd,   s.getD(data.k_x))
-                    self.y.append(raft, ccd,   s.getD(data.k_y))
-                    self.ra.append(raft, ccd,  s.getD(data.k_Ra))
-                    self.dec.append(raft, ccd, s.getD(data.k_Dec))
-                    fwhmTmp.append( sigmaToFwhm*numpy.sqrt(0.5*(a2 + b2)))
+            shapes = self._getShapeColumns(data, ss, cacheKey=(key, 'src'))
+            for name in ('ellip', 'theta', 'x', 'y', 'ra', 'dec'):
+                getattr(self, name).extend(raft, ccd, shapes[name])
+            fwhmTmp = shapes['fwhm']
 
             if len(fwhmTmp):
                 fwhmByKey[key] = numpy.mean(fwhmTmp)
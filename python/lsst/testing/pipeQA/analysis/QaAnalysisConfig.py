@@ -0,0 +1,176 @@
+#
+# LSST Data Management System
+# Copyright 2008, 2009, 2010 LSST Corporation.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+#
+
+import lsst.pex.config as pexConfig
+
+# The configs of the QaAnalysisTasks live here, apart from the tasks themselves, so
+# that PipeQaConfig can be built without importing every task (and matplotlib).
+
+class SourceFlagConfig(pexConfig.Config):
+    badFlags = pexConfig.ListField(dtype = str,
+                                   doc = "Source flags which exclude a source (see QaData.getFlagMask)",
+                                   default = ("intc", "satc", "edg", "nchild"))
+
+
+class ZeropointFitQaConfig(SourceFlagConfig):
+    cameras   = pexConfig.ListField(dtype = str,
+                                    doc = "Cameras to run ZeropointFitQa",
+                                    default = ("lsstSim", "cfht", "sdss", "coadd", "hsc"))
+    offsetMin = pexConfig.Field(dtype = float,
+                                doc = "Median offset of stars from zeropoint fit; minimum good value",
+                                default = -0.1)
+    offsetMax = pexConfig.Field(dtype = float,
+                                doc = "Median offset of stars from zeropoint fit; maximum good value",
+                                default = +0.1)
+
+
+class EmptySectorQaConfig(SourceFlagConfig):
+    cameras    = pexConfig.ListField(dtype = str,
+                                     doc = "Cameras to run EmptySectorQaTask",
+                                     default = ("lsstSim", "hsc", "suprimecam", "cfht", "sdss", "coadd"))
+    maxMissing = pexConfig.Field(dtype = int, doc = "Maximum number of missing CCDs", default = 1)
+    nx         = pexConfig.Field(dtype = int, doc = "Mesh size in x", default = 4)
+    ny         = pexConfig.Field(dtype = int, doc = "Mesh size in y", default = 4)
+
+
+class AstrometricErrorQaConfig(SourceFlagConfig):
+    cameras = pexConfig.ListField(dtype = str,
+                                  doc = "Cameras to run AstrometricErrorQaTask",
+                                  default = ("lsstSim", "hsc", "suprimecam", "cfht", "sdss", "coadd"))
+    maxErr  = pexConfig.Field(dtype = float,
+                              doc = "Maximum astrometric error (in arcseconds)",
+                              default = 0.09)
+
+
+class PhotCompareQaConfig(SourceFlagConfig):
+    
+    cameras     = pexConfig.ListField(dtype = str, doc = "Cameras to run PhotCompareQaTask",
+                                      default = ("lsstSim", "hsc", "suprimecam", "cfht", "sdss", "coadd"))
+    magCut      = pexConfig.Field(dtype = float, doc = "Faintest magnitude for establishing photometric RMS",
+                                  default = 20.0)
+    deltaMin    = pexConfig.Field(dtype = float, doc = "Min allowed delta", default = -0.02)
+    deltaMax    = pexConfig.Field(dtype = float, doc = "Max allowed delta", default =  0.02)
+    rmsMax      = pexConfig.Field(dtype = float, doc = "Max allowed photometric RMS on bright end",
+                                  default = 0.02)
+    derrMax     = pexConfig.Field(dtype = float, doc = "Max allowed error bar underestimate on bright end",
+                                  default = 0.02)
+    slopeMinSigma = pexConfig.Field(dtype = float,
+                                    doc = "Min (positive valued) std.devs. of slope below slope=0",
+                                    default = 8.0)
+    slopeMaxSigma = pexConfig.Field(dtype = float,
+                                    doc = "Maximum std.dev. of slope above slope=0", default = 8.0)
+
+    compareTypes  = pexConfig.ListField(dtype = str,
+                                        doc = "Photometric Error: qaAnalysis.PhotCompareQaAnalysis", 
+                                        default = ("psf cat", "psf ap",
+                                                   "ap cat", "psf mod"))
+    
+# allowed = {
+#    "psf cat"  : "Compare Psf magnitudes to catalog magnitudes",
+#    "psf ap"   : "Compare Psf and aperture magnitudes",
+#    "psf mod"  : "Compare Psf and model magnitudes",
+#    "ap cat"   : "Compare Psf and model magnitudes",
+#    "psf inst" : "Compare PSF and instrument magnitudes",
+#    "inst cat" : "Compare Inst (Gaussian) and catalog magnitudes",
+#    "mod cat"  : "Compare model and catalog magnitudes",
+#    "mod inst" : "Separate stars/gxys for model and inst (Gaussian) magnitudes"
+# }
+#
+
+    starGalaxyToggle = pexConfig.ListField(dtype = str, doc = "Make separate figures for stars and galaxies.",
+                                           default = ("mod cat", "inst cat", "ap cat", "psf cat"))
+    
+# allowed = {
+#    "psf cat"  : "Separate stars/gxys for Psf magnitudes to catalog magnitudes",
+#    "psf ap"   : "Separate stars/gxys for Psf and aperture magnitudes",
+#    "psf mod"  : "Separate stars/gxys for Psf and model magnitudes",
+#    "ap cat"   : "Separate stars/gxys for Psf and model magnitudes",
+#    "psf inst" : "Separate stars/gxys for PSF and instrument magnitudes",
+#    "inst cat" : "Separate stars/gxys for Inst (Gaussian) and catalog magnitudes",
+#    "mod cat"  : "Separate stars/gxys for model and catalog magnitudes",
+#    "mod inst" : "Separate stars/gxys for model and inst (Gaussian) magnitudes"
+# }
+#
+
+
+class PsfShapeQaConfig(SourceFlagConfig): 
+    cameras  = pexConfig.ListField(dtype = str, doc = "Cameras to run PsfShapeQaTask",
+                                   default = ("lsstSim", "hsc", "suprimecam", "cfht", "sdss", "coadd"))
+    ellipMax = pexConfig.Field(dtype = float, doc = "Maximum median ellipticity", default = 0.30)
+    fwhmMax  = pexConfig.Field(dtype = float, doc = "Maximum Psf Fwhm (arcsec)", default = 1.0)
+
+
+class CompletenessQaConfig(pexConfig.Config):
+    cameras        = pexConfig.ListField(dtype=str,
+                                         doc="Cameras to run CompletenessQaTask",
+                                         default=("lsstSim", "cfht", "sdss", "coadd"))
+    completeMinMag = pexConfig.Field(dtype=float, doc="Minimum photometric depth", default = 20.0)
+    completeMaxMag = pexConfig.Field(dtype=float, doc="Maximum reasonable photometric depth", default = 25.0)
+    depthMethod    = pexConfig.ChoiceField(dtype=str,
+                                           doc="How the depth is found from the completeness curve",
+                                           default="interpolate",
+                                           allowed={
+                                               "interpolate" : "Interpolate between the bins either side of 0.5",
+                                               "fit"         : "50% point of an arctan model fit to the curve",
+                                               })
+
+
+class VignettingQaConfig(SourceFlagConfig):
+    cameras   = pexConfig.ListField(dtype = str, doc = "Cameras to run VignettingQaTask",
+                                    default = ("lsstSim", "cfht", "suprimecam", "sdss", "coadd"))
+    maxMedian = pexConfig.Field(dtype = float, doc = "Maximum median magnitude offset", default = 0.08)
+    maxRms    = pexConfig.Field(dtype = float, doc = "Maximum magnitude offset RMS", default = 0.04)
+    maxMag    = pexConfig.Field(dtype = float,
+                                doc = "Maximum magnitude star to use in VignettingQa test (-1 for median)",
+                                default = -1.0)
+
+
+class VisitToVisitPhotQaConfig(pexConfig.Config):
+    cameras = pexConfig.ListField(dtype = str, doc = "Cameras to run PhotCompareQaTask", default = ("lsstSim", "hscSim", "suprimecam", "cfht"))
+    magTypes = pexConfig.ListField(dtype = str, doc = "Make separate figures for different magnitude types", default = ("ap", "psf", "inst", "mod"))
+    magCut = pexConfig.Field(dtype = float, doc = "Faintest magnitude for establishing photometric RMS", default = 20.0)
+    deltaMin = pexConfig.Field(dtype = float, doc = "Minimum allowed delta", default = -0.02)
+    deltaMax = pexConfig.Field(dtype = float, doc = "Maximum allowed delta", default =  0.02)
+    rmsMax = pexConfig.Field(dtype = float, doc = "Maximum allowed photometric RMS on bright end", default =  0.02)
+    streamVisits = pexConfig.Field(dtype = bool,
+                                   doc = "Keep only running statistics between visits (constant memory, but no figures)",
+                                   default = False)
+
+
+class VisitToVisitAstromQaConfig(AstrometricErrorQaConfig):
+    cameras = pexConfig.ListField(dtype = str, doc = "Cameras to run PhotCompareQaTask", default = ("lsstSim", "hscSim", "suprimecam", "cfht"))
+    matchBy     = pexConfig.ChoiceField(dtype = str,
+                                        doc = "How detections are paired between the visits",
+                                        default = "id",
+                                        allowed = {
+                                            "id"       : "Detections (1-to-1) matched to the same reference object",
+                                            "position" : "Mutually nearest detections within matchRadius",
+                                            })
+    matchRadius = pexConfig.Field(dtype = float,
+                                  doc = "Radius for matching detections between visits by position (arcsec)",
+                                  default = 1.0)
+
+
+class SummaryQaConfig(pexConfig.Config):
+    cameras = pexConfig.ListField(dtype = str,
+                                  doc = "Cameras to run SummaryQaTask",
+                                  default = ("suprimecam", "hsc"))
@@ -30,7 +30,7 @@ import lsst.pex.config as pexConfig
 import lsst.pipe.base as pipeBase
 
 import lsst.testing.pipeQA.TestCode as testCode
-import lsst.testing.pipeQA.figures as qaFig
+from lsst.testing.pipeQA.Tracer import getTracer
 
 
 class QaAnalysisConfig(pexConfig.Config):
@@ -151,7 +151,9 @@ class QaAnalysisTask(pipeBase.Task):
             tsId = group
 
         if noSuffix:
-            return testCode.TestSet(label, group=groupId, clean=self.clean, wwwCache=self.wwwCache, sqliteSuffix="")
+            ts = testCode.TestSet(label, group=groupId, clean=self.clean, wwwCache=self.wwwCache, sqliteSuffix="")
+            ts.addFigure = getTracer().wrap(ts.addFigure, "figure", "figure")
+            return ts
         else:
             sqliteSuffix = ccdName
 
@@ -159,6 +161,8 @@ class QaAnalysisTask(pipeBase.Task):
         if not self.testSets.has_key(tsId):
             self.testSets[tsId] = testCode.TestSet(label, group=groupId, clean=self.clean,
                                                    wwwCache=self.wwwCache, sqliteSuffix=sqliteSuffix)
+            # rendering and writing figures happens in addFigure
+            self.testSets[tsId].addFigure = getTracer().wrap(self.testSets[tsId].addFigure, "figure", "figure")
             
             self.testSets[tsId].addMetadata('dataset', data.getDataName())
             self.testSets[tsId].addMetadata(tsIdLabel, groupId)
@@ -145,6 +145,187 @@ def robustPolyFit(x, y, order, nbin=3, sigma=3.0, niter=1):
 
 
 
+def _groupMedians(values, keys, nKey):
+    """numpy.median() of the values with each key, for all keys at once (NaN for keys without values)."""
+    order = numpy.lexsort((values, keys))
+    v = values[order]
+    counts = numpy.bincount(keys, minlength=nKey)
+    offsets = _offsets(counts)
+
+    med = numpy.empty(nKey)
+    med.fill(numpy.NaN)
+    have = counts > 0
+    lo = offsets[have] + (counts[have] - 1)//2
+    hi = offsets[have] + counts[have]//2
+    # numpy.median averages the middle two values of an even number, and gives NaN if there's a NaN
+    m = numpy.where(lo == hi, v[lo], (v[lo] + v[hi])/2.0)
+    m[numpy.isnan(v[offsets[have] + counts[have] - 1])] = numpy.NaN
+    med[have] = m
+    return med
+
+
+def _segmentSums(a, offsets, counts):
+    """Sum each segment a[offset:offset+count] of a (0 if empty).
+
+    Each segment is summed by numpy, so the sums are exactly those of the segments alone.
+    """
+    out = numpy.zeros(len(counts))
+    for k in numpy.nonzero(counts)[0]:
+        out[k] = a[offsets[k]:offsets[k] + counts[k]].sum()
+    return out
+
+
+def _offsets(counts):
+    return numpy.concatenate([[0], numpy.cumsum(counts)[:-1]]).astype(int)
+
+
+def _rowSums(a, use):
+    """Sum each row of a 2D array over the entries where use is True."""
+    counts = use.sum(axis=1)
+    return _segmentSums(a[use], _offsets(counts), counts)
+
+
+def _rowMedians(a, use):
+    rows = numpy.repeat(numpy.arange(a.shape[0]), a.shape[1]).reshape(a.shape)
+    return _groupMedians(a[use], rows[use], a.shape[0])
+
+
+def _lineFitRows(x, y, dy, use):
+    """lineFit() (with errors) of each row of 2D arrays, for the entries where use is True.
+
+    @return intercept, its error, slope, its error: arrays with an entry per row
+    """
+    N = use.sum(axis=1)
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        var = dy**2
+        S   = _rowSums(1.0/var, use)
+        Sx  = _rowSums(x/var, use)
+        Sy  = _rowSums(y/var, use)
+        Sxx = _rowSums((x**2)/var, use)
+        Sxy = _rowSums((x*y)/var, use)
+        Delta = S*Sxx - numpy.power(Sx, 2.0)
+
+        # nearly degenerate rows are solved about the mean x
+        small = Delta < 1.0e-6
+        Stt = _rowSums((x - (Sx/S)[:,numpy.newaxis])**2, use)
+        Sty = _rowSums((x - (Sx/S)[:,numpy.newaxis])*y, use)
+
+        bb = numpy.where(small, (1.0/Stt)*Sty, (S*Sxy - Sx*Sy)/Delta)
+        aa = numpy.where(small, (Sy - Sx*((1.0/Stt)*Sty))/S, (Sxx*Sy - Sx*Sxy)/Delta)
+        var_aa = numpy.where(small, (1.0/S)*(1.0 + numpy.power(Sx, 2.0)/(S*Stt)), Sxx/Delta)
+        var_bb = numpy.where(small, (1.0/Stt), S/Delta)
+
+    rms_aa = numpy.sqrt(numpy.abs(var_aa))
+    rms_bb = numpy.sqrt(numpy.abs(var_bb))
+
+    few = N < 2
+    for v in (aa, rms_aa, bb, rms_bb):
+        v[few] = 0.0
+    return aa, rms_aa, bb, rms_bb
+
+
+def robustPolyFitGroups(x, y, groups, order, nbin=3, sigma=3.0, niter=1, nGroup=None):
+    """robustPolyFit() for many groups of points (eg. the stars and galaxies of each ccd) at once.
+
+    The bins, medians and errors of every group are found together (by sorting), and
+    the line fits of all the groups are solved together.  Each bin's and group's sums are
+    still taken by numpy, one at a time, so the results are identical to robustPolyFit()
+    on each group alone (with the group's points in the order they have here).
+
+    @param x, y    flat arrays of points
+    @param groups  integer group index (0..nGroup-1) of each point
+    @param order   order of the polynomial (as for robustPolyFit(), a line is fit)
+    @param nGroup  number of groups; default is max(groups)+1
+
+    @return array of shape (nGroup, 4): slope, its error, intercept, its error, for each
+            group (as robustPolyFit() returns them), or NaNs for groups without points
+    """
+
+    x = numpy.asarray(x, dtype=float)
+    y = numpy.asarray(y, dtype=float)
+    groups = numpy.asarray(groups, dtype=int)
+    if nGroup is None:
+        nGroup = groups.max() + 1 if len(groups) > 0 else 0
+
+    # bin each group, with the same edges as robustPolyFit(), and take medians in each bin
+    epsilon = 1.0e-6
+    nPoint = numpy.bincount(groups, minlength=nGroup)
+    have = nPoint > 0
+    byX = numpy.lexsort((x, groups))
+    last = numpy.cumsum(nPoint)[have] - 1
+    xmin = numpy.zeros(nGroup)
+    xmax = numpy.zeros(nGroup)
+    xmin[have] = x[byX][last - nPoint[have] + 1]
+    xmax[have] = x[byX][last]
+    xmin[have & numpy.isnan(xmax)] = numpy.NaN
+    xmin, xmax = xmin - epsilon, xmax + epsilon
+    step = (xmax - xmin)/(nbin)
+
+    bins = numpy.empty(len(x), dtype=int)
+    bins.fill(-1)
+    with numpy.errstate(invalid='ignore'):
+        for i in range(nbin):
+            lo, hi = xmin + i*step, xmin + (i+1)*step
+            bins[(x > lo[groups]) & (x <= hi[groups])] = i
+    inBin = bins >= 0
+    keys = groups[inBin]*nbin + bins[inBin]
+    nKey = nGroup*nbin
+
+    xMeds = _groupMedians(x[inBin], keys, nKey)
+    yMeds = _groupMedians(y[inBin], keys, nKey)
+
+    # numpy.std() of each bin, with the values in their original order
+    byKey = numpy.argsort(keys, kind='mergesort')
+    yBin = y[inBin][byKey]
+    counts = numpy.bincount(keys, minlength=nKey)
+    offsets = _offsets(counts)
+    yErrs = numpy.empty(nKey)
+    yErrs.fill(numpy.NaN)
+    for k in numpy.nonzero(counts)[0]:
+        yErrs[k] = numpy.std(yBin[offsets[k]:offsets[k] + counts[k]])/numpy.sqrt(counts[k])
+
+    # use these new coords to fit the line ... rows are groups, columns are bins
+    xNew  = xMeds.reshape(nGroup, nbin)
+    yNew  = yMeds.reshape(nGroup, nbin)
+    dyNew = yErrs.reshape(nGroup, nbin)
+    use   = counts.reshape(nGroup, nbin) > 0
+
+    # if there's only one point in a bin, dy=0 ... use the average error (see robustPolyFit())
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        w0    = use & (dyNew == 0)
+        wnot0 = use & (dyNew > 0)
+        nUse = use.sum(axis=1)
+        yMean = _rowSums(yNew, use)/nUse
+        yStd = numpy.sqrt(_rowSums((yNew - yMean[:,numpy.newaxis])**2, use)/nUse)
+        meanError = numpy.where(wnot0.any(axis=1), _rowSums(dyNew, wnot0)/wnot0.sum(axis=1), yStd)
+    meanError[meanError == 0.0] = 1.0
+    dyNew = numpy.where(w0, meanError[:,numpy.newaxis], dyNew)
+
+    for i in range(niter):
+
+        a, da, b, db = _lineFitRows(xNew, yNew, dyNew, use)
+
+        # numpy.polyval((a, b), xNew), as in robustPolyFit()
+        residuals = yNew - (a[:,numpy.newaxis]*xNew + b[:,numpy.newaxis])
+
+        with numpy.errstate(invalid='ignore', divide='ignore'):
+            n = use.sum(axis=1)
+            if i == 0:
+                mean = _rowMedians(residuals, use)
+            else:
+                mean = _rowSums(residuals, use)/n
+            std = numpy.sqrt(_rowSums((residuals - (_rowSums(residuals, use)/n)[:,numpy.newaxis])**2, use)/n)
+
+            if niter > 1:
+                use = use & ((numpy.abs(residuals - mean[:,numpy.newaxis])/std[:,numpy.newaxis]) < sigma)
+
+    fits = numpy.empty((nGroup, 4))
+    fits.fill(numpy.NaN)
+    fits[have] = numpy.array([b, db, a, da]).T[have]
+    return fits
+
+
+
 def dictToList(d, withDelete=False):
     out = numpy.array([])
     for k,v in d.items():
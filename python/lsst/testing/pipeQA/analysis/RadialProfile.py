@@ -0,0 +1,94 @@
+#
+# LSST Data Management System
+# Copyright 2008, 2009, 2010 LSST Corporation.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+#
+
+
+"""Radial profiles: residuals binned by distance from the center of the focal plane.
+
+Pixel coordinates on a ccd are taken to the focal plane with a per-ccd affine
+transform (an offset from CameraInfo.getBbox(), and a scale), so the radius of
+a whole catalog is a few array operations.  The per-bin statistics come from
+GroupStats, so they follow afwMath.makeStatistics().
+"""
+
+import numpy
+import GroupStats as groupStats
+
+
+def focalPlaneRadius(x, y, x0, y0, scale=1.0):
+    """Get the distance of each point from the center of the focal plane.
+
+    @param x, y    pixel coordinates on a ccd
+    @param x0, y0  focal plane position of the ccd's pixel origin (eg. from CameraInfo.getBbox())
+    @param scale   size of a ccd pixel in focal plane units
+
+    @return array of radii, in focal plane units
+    """
+    xfp = x0 + scale*numpy.asarray(x, dtype=float)
+    yfp = y0 + scale*numpy.asarray(y, dtype=float)
+    return numpy.sqrt(numpy.power(xfp, 2.0) + numpy.power(yfp, 2.0))
+
+
+def radialBins(radius, nBins, rMax=None):
+    """Get the bin edges, and the bin of each point, for nBins equal bins in radius from 0 to rMax.
+
+    @param radius  array of radii
+    @param nBins   number of bins
+    @param rMax    outer edge of the last bin (default: the largest finite radius)
+
+    @return edges (nBins+1), the bin of each point, and a boolean array True for points in a bin
+    """
+    radius = numpy.asarray(radius, dtype=float)
+    if rMax is None:
+        finite = radius[numpy.isfinite(radius)]
+        rMax = finite.max() if len(finite) > 0 else 1.0
+    if rMax <= 0.0:
+        rMax = 1.0
+    edges = numpy.linspace(0.0, rMax, nBins + 1)
+
+    with numpy.errstate(invalid='ignore'):
+        inBin = (radius >= 0.0) & (radius <= rMax)
+    index = numpy.zeros(len(radius), dtype=int)
+    index[inBin] = numpy.minimum((radius[inBin]*(nBins/rMax)).astype(int), nBins - 1)
+    return edges, index, inBin
+
+
+def radialProfile(radius, values, nBins=20, rMax=None):
+    """Get robust statistics of values in bins of radius.
+
+    @param radius  radius of each point (see focalPlaneRadius())
+    @param values  the value (eg. a magnitude residual) at each point
+    @param nBins   number of radial bins
+    @param rMax    outer edge of the last bin (default: the largest radius)
+
+    @return dict of arrays (one entry per bin): radius (bin centers), npoint, median,
+            stdev (0.741*iqrange), meanclip
+    """
+    values = numpy.asarray(values, dtype=float)
+    edges, index, inBin = radialBins(radius, nBins, rMax)
+    stats = groupStats.groupStatistics(values[inBin], index[inBin], nBins)
+    return {
+        'radius'   : 0.5*(edges[:-1] + edges[1:]),
+        'npoint'   : stats['npoint'],
+        'median'   : stats['median'],
+        'stdev'    : groupStats.IQ_TO_STDEV*stats['iqrange'],
+        'meanclip' : stats['meanclip'],
+        }
@@ -22,7 +22,7 @@
 
 import sys, os, re
 import numpy
-import lsst.afw.math as afwMath
+import GroupStats as groupStats
 
 class RaftCcdData(object):
 
@@ -79,6 +79,11 @@ class RaftCcdData(object):
                 for ccd, value in ccdDict.items():
                     self.cache = numpy.append(self.cache, value)
 
+    def getValues(self, recache=False):
+        """Get the values for all rafts and ccds as a single array."""
+        self.cacheValues(recache)
+        return self.cache
+
     def summarize(self, methodName, recache=False, default=numpy.NaN):
         self.cacheValues(recache)
         if methodName == 'median':
@@ -93,11 +98,42 @@ class RaftCcdData(object):
         
 
 class RaftCcdVector(RaftCcdData):
+    """An array of values for each raft,ccd.
+
+    Values are appended to a buffer for each ccd which grows geometrically, so filling
+    a ccd one value at a time is linear rather than quadratic.  The buffers are copied
+    into self.data (as views of their filled part) whenever the values are read.
+    """
 
     def __init__(self, detector):
+        self.buffers = {}   # (raft, ccd): [array, number of values used]
+        self.dirty = set()
         RaftCcdData.__init__(self, detector, initValue=numpy.array([], dtype=numpy.float))
 
+    def freeze(self):
+        """Point self.data at the values appended so far."""
+        for raft, ccd in self.dirty:
+            buf, n = self.buffers[(raft, ccd)]
+            self.data[raft][ccd] = buf[:n]
+        self.dirty = set()
+
+    def set(self, raft, ccd, value):
+        self.buffers.pop((raft, ccd), None)
+        self.dirty.discard((raft, ccd))
+        RaftCcdData.set(self, raft, ccd, value)
+
+    def get(self, raft, ccd, default=None):
+        self.freeze()
+        return RaftCcdData.get(self, raft, ccd, default)
+
+    def cacheValues(self, recache=False):
+        self.freeze()
+        if (self.cache is None) or recache:
+            values = [numpy.ravel(value) for ccdDict in self.data.values() for value in ccdDict.values()]
+            self.cache = numpy.concatenate([numpy.array([])] + values)
+
     def xxxlistKeysAndValues(self, methodName=None, nHighest=None, nLowest=None):
+        self.freeze()
         kvList = []
         for raft in sorted(self.data.keys()):
             for ccd in sorted(self.data[raft].keys()):
@@ -127,36 +163,39 @@ class RaftCcdVector(RaftCcdData):
 
 
     def listKeysAndValues(self, methodName=None, nHighest=None, nLowest=None, limits=None):
-
-        methods = {
-            "median" : afwMath.MEDIAN,
-            "meanclip" : afwMath.MEANCLIP,
-            "stdevclip" : afwMath.STDEVCLIP,
-            "mean" : afwMath.MEAN,
-            "stdev" : afwMath.STDEV,
-            }
+        """Reduce each ccd's values to a statistic (afwMath-style, see GroupStats), for all ccds at once.
+
+        @param methodName  median, meanclip, stdevclip, mean, or stdev
+        @param nHighest    use only the nHighest largest values of each ccd
+        @param nLowest     use only the nLowest smallest values of each ccd (if nHighest isn't given)
+        @param limits      use only values with lo < value < hi
+
+        @return list of [raft, ccd, value, number of values used]
+        """
+
+        self.freeze()
+        keys = self.raftCcdKeys()
+        arrays = []
+        for raft, ccd in keys:
+            dtmp = numpy.asarray(self.data[raft][ccd], dtype=float)
+            if nHighest is not None:
+                dtmp = numpy.sort(dtmp)[-nHighest:]
+            if (not nLowest is None) and (nHighest is None):
+                dtmp = numpy.sort(dtmp)[0:nLowest]
+            arrays.append(dtmp)
+
+        values = numpy.concatenate([numpy.array([])] + arrays)
+        groups = numpy.repeat(numpy.arange(len(keys)), [len(a) for a in arrays])
+        if limits is not None:
+            lo, hi = limits
+            w = numpy.where( (values > lo) & (values < hi) )
+            values, groups = values[w], groups[w]
+
+        stats = groupStats.groupStatistics(values, groups, len(keys))
         
         kvList = []
-        for raft in sorted(self.data.keys()):
-            for ccd in sorted(self.data[raft].keys()):
-                dtmp = self.data[raft][ccd].copy()
-                if nHighest is not None:
-                    dtmp.sort()
-                    dtmp = dtmp[-nHighest:]
-                if (not nLowest is None) and (nHighest is None):
-                    dtmp.sort()
-                    dtmp = dtmp[0:nLowest]
-                    
-                if limits is not None:
-                    lo, hi = limits
-                    w = numpy.where( (dtmp > lo) & (dtmp < hi) )
-                    dtmp = dtmp[w]
-                    
-                stat = afwMath.makeStatistics(dtmp, afwMath.NPOINT | methods[methodName])
-                value = stat.getValue(methods[methodName])
-                n = stat.getValue(afwMath.NPOINT)
-                kvList.append([raft, ccd, value, n])
-                
+        for i, (raft, ccd) in enumerate(keys):
+            kvList.append([raft, ccd, stats[methodName][i], stats['npoint'][i]])
         return kvList
 
         
@@ -164,5 +203,32 @@ class RaftCcdVector(RaftCcdData):
         RaftCcdData.reset(self, initValue)
 
     def append(self, raft, ccd, value):
-        self.data[raft][ccd] = numpy.append(self.data[raft][ccd], value)
+        buf = self.buffers.get((raft, ccd))
+        # the common case: a number, with room for it in the buffer
+        if buf is not None and buf[1] < len(buf[0]) and buf[0].dtype.kind not in 'SUO' and \
+                numpy.isscalar(value) and not isinstance(value, basestring):
+            buf[0][buf[1]] = value
+            buf[1] += 1
+            self.dirty.add((raft, ccd))
+        else:
+            self.extend(raft, ccd, value)
+
+    def extend(self, raft, ccd, values):
+        """Append an array of values (the result is the same as numpy.append() would give)."""
+        values = numpy.ravel(numpy.asarray(values))
+        key = (raft, ccd)
+        if not self.buffers.has_key(key):
+            current = numpy.ravel(numpy.asarray(self.data[raft][ccd]))
+            self.buffers[key] = [current, len(current)]
+        buf, n = self.buffers[key]
+
+        dtype = numpy.promote_types(buf.dtype, values.dtype)
+        nNew = n + len(values)
+        if nNew > len(buf) or dtype != buf.dtype:
+            grown = numpy.empty(max(16, 2*nNew), dtype=dtype)
+            grown[:n] = buf[:n]
+            buf = grown
+        buf[n:nNew] = values
+        self.buffers[key] = [buf, nNew]
+        self.dirty.add(key)
 
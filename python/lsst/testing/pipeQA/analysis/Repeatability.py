@@ -0,0 +1,174 @@
+#
+# LSST Data Management System
+# Copyright 2008, 2009, 2010 LSST Corporation.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+#
+
+
+"""Streaming repeatability statistics over many visits.
+
+Each visit's matched values (eg. magnitude differences) are added once, and only
+running statistics are kept: for each object its count, mean and sum of squared
+deviations (Welford's method), and for each magnitude bin the same for all the
+values in the bin (merged batch by batch, as by Chan et al.).  Memory is therefore
+constant per object, however many visits are added.
+"""
+
+import numpy
+
+
+def _mergeMoments(n1, mean1, m21, n2, mean2, m22):
+    """Combine the count, mean and sum of squared deviations of two sets of values."""
+    n = n1 + n2
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        delta = mean2 - mean1
+        frac = numpy.where(n > 0, n2/n, 0.0)
+        mean = mean1 + delta*frac
+        m2 = m21 + m22 + delta*delta*n1*frac
+    return n, mean, m2
+
+
+class RepeatabilityAccumulator(object):
+    """Accumulate per-object and per-magnitude-bin statistics of a value, visit by visit."""
+
+    def __init__(self, magBins=numpy.arange(14.0, 26.01, 0.5)):
+        """
+        @param magBins  Edges of the magnitude bins
+        """
+        self.magBins = numpy.asarray(magBins, dtype=float)
+        nBin = len(self.magBins) - 1
+
+        # per object, sorted by id
+        self.ids     = numpy.array([], dtype=numpy.int64)
+        self.n       = numpy.array([], dtype=float)
+        self.mean    = numpy.array([], dtype=float)
+        self.m2      = numpy.array([], dtype=float)
+        self.magMean = numpy.array([], dtype=float)
+
+        # per magnitude bin
+        self.binN    = numpy.zeros(nBin)
+        self.binMean = numpy.zeros(nBin)
+        self.binM2   = numpy.zeros(nBin)
+
+        self.nVisit = 0
+
+
+    def add(self, ids, values, mags):
+        """Add one visit's values.
+
+        @param ids     object ids (each at most once)
+        @param values  the value measured for each object in this visit
+        @param mags    the magnitude of each object, for binning
+        """
+        ids    = numpy.asarray(ids, dtype=numpy.int64)
+        values = numpy.asarray(values, dtype=float)
+        mags   = numpy.asarray(mags, dtype=float)
+
+        good = numpy.isfinite(values) & numpy.isfinite(mags)
+        ids, values, mags = ids[good], values[good], mags[good]
+
+        order = numpy.argsort(ids)
+        ids, values, mags = ids[order], values[order], mags[order]
+        if len(ids) > 1 and (ids[1:] == ids[:-1]).any():
+            raise ValueError("Object ids must be unique within a visit")
+
+        self.nVisit += 1
+        self._addObjects(ids, values, mags)
+        self._addBins(values, mags)
+
+
+    def _addObjects(self, ids, values, mags):
+        # new objects start with no values
+        pos = numpy.searchsorted(self.ids, ids)
+        known = pos < len(self.ids)
+        known[known] = self.ids[pos[known]] == ids[known]
+        newIds = ids[~known]
+        if len(newIds) > 0:
+            zeros = numpy.zeros(len(newIds))
+            allIds = numpy.concatenate([self.ids, newIds])
+            order = numpy.argsort(allIds, kind='mergesort')
+            self.ids     = allIds[order]
+            self.n       = numpy.concatenate([self.n, zeros])[order]
+            self.mean    = numpy.concatenate([self.mean, zeros])[order]
+            self.m2      = numpy.concatenate([self.m2, zeros])[order]
+            self.magMean = numpy.concatenate([self.magMean, zeros])[order]
+            pos = numpy.searchsorted(self.ids, ids)
+
+        # Welford's update; each object appears once, so the updates don't collide
+        self.n[pos] += 1.0
+        n = self.n[pos]
+        delta = values - self.mean[pos]
+        self.mean[pos] += delta/n
+        self.m2[pos] += delta*(values - self.mean[pos])
+        self.magMean[pos] += (mags - self.magMean[pos])/n
+
+
+    def _addBins(self, values, mags):
+        nBin = len(self.binN)
+        ibin = numpy.searchsorted(self.magBins, mags, side='right') - 1
+        inBin = (ibin >= 0) & (ibin < nBin)
+        ibin, values = ibin[inBin], values[inBin]
+
+        n = numpy.bincount(ibin, minlength=nBin).astype(float)
+        with numpy.errstate(invalid='ignore', divide='ignore'):
+            mean = numpy.where(n > 0, numpy.bincount(ibin, weights=values, minlength=nBin)/n, 0.0)
+        dev = values - mean[ibin]
+        m2 = numpy.bincount(ibin, weights=dev*dev, minlength=nBin)
+
+        self.binN, self.binMean, self.binM2 = \
+            _mergeMoments(self.binN, self.binMean, self.binM2, n, mean, m2)
+
+
+    def objectStats(self, minVisits=2):
+        """Get the statistics of each object seen in at least minVisits visits.
+
+        @return dict of arrays: id, n, mean, stdev (sample), mag (mean)
+        """
+        use = self.n >= minVisits
+        with numpy.errstate(invalid='ignore', divide='ignore'):
+            stdev = numpy.sqrt(self.m2[use]/(self.n[use] - 1.0))
+        return {'id': self.ids[use], 'n': self.n[use], 'mean': self.mean[use], 'stdev': stdev,
+                'mag': self.magMean[use]}
+
+
+    def binStats(self):
+        """Get the statistics of all the values in each magnitude bin.
+
+        @return dict of arrays: magLo, magHi, n, mean, stdev (sample; NaN with < 2 values)
+        """
+        with numpy.errstate(invalid='ignore', divide='ignore'):
+            stdev = numpy.where(self.binN > 1, numpy.sqrt(self.binM2/(self.binN - 1.0)), numpy.NaN)
+            mean = numpy.where(self.binN > 0, self.binMean, numpy.NaN)
+        return {'magLo': self.magBins[:-1], 'magHi': self.magBins[1:], 'n': self.binN,
+                'mean': mean, 'stdev': stdev}
+
+
+    def repeatability(self, magMax, minVisits=2, magMin=None):
+        """The median over objects brighter than magMax (and fainter than magMin) of their stdev between visits.
+
+        @return the median stdev (NaN if there are no such objects), and the number of objects used
+        """
+        stats = self.objectStats(minVisits)
+        use = stats['mag'] < magMax
+        if magMin is not None:
+            use &= stats['mag'] > magMin
+        stdev = stats['stdev'][use]
+        if len(stdev) == 0:
+            return numpy.NaN, 0
+        return numpy.median(stdev), len(stdev)
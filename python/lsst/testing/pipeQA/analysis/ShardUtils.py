@@ -0,0 +1,188 @@
+#
+# LSST Data Management System
+# Copyright 2008, 2009, 2010 LSST Corporation.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+#
+
+import os, re, glob
+import hashlib
+import json
+import numpy
+
+
+def parseShard(shardStr):
+    """Parse a shard request 'i/N' into (i, N)."""
+    m = re.search("^(\d+)/(\d+)$", str(shardStr))
+    if not m:
+        raise ValueError("Shard must be specified as i/N (got '%s')" % (shardStr))
+    iShard, nShard = int(m.group(1)), int(m.group(2))
+    if nShard < 1 or iShard >= nShard:
+        raise ValueError("Shard index must be in 0..N-1 (got %d/%d)" % (iShard, nShard))
+    return iShard, nShard
+
+
+def unitHash(key):
+    """A hash of a unit key which is stable across processes, platforms and python versions."""
+    return int(hashlib.md5(str(key)).hexdigest()[:15], 16)
+
+
+def unitCosts(keys, costs=None):
+    """Cost of each unit: as given in costs, else the median of the given costs (else 1)."""
+    known = [float(costs[k]) for k in keys if costs and k in costs]
+    default = numpy.median(known) if len(known) > 0 else 1.0
+    return dict([(k, float(costs[k]) if costs and k in costs else default) for k in keys])
+
+
+def orderByCost(keys, costs=None):
+    """Order units of work most expensive first, with ties in hash order.
+
+    The order depends only on the set of keys (and costs), so every process
+    computes the same one.
+
+    @param keys    unit keys (eg. dataId strings)
+    @param costs   optional dict of key:cost (missing keys get the median cost)
+    """
+    keys = sorted(set(keys), key=lambda k: (unitHash(k), k))
+    cost = unitCosts(keys, costs)
+    # stable sort, so equal costs stay in hash order
+    return sorted(keys, key=lambda k: -cost[k])
+
+
+def assignShards(keys, nShard, costs=None):
+    """Assign units of work to shards.
+
+    Units are placed largest-cost first on the least loaded shard.  Ties are
+    broken by a hash of the key, so with no costs the units are dealt out
+    round-robin in hash order and every shard gets the same count (+/-1).
+
+    @param keys    unit keys (eg. dataId strings)
+    @param nShard  number of shards
+    @param costs   optional dict of key:cost (missing keys get the median cost)
+
+    @return dict of key:shard index
+    """
+
+    keys = orderByCost(keys, costs)
+    cost = unitCosts(keys, costs)
+
+    load = numpy.zeros(nShard)
+    assignment = {}
+    for k in keys:
+        iShard = int(numpy.argmin(load))
+        assignment[k] = iShard
+        load[iShard] += cost[k]
+    return assignment
+
+
+def shardRecordFile(shardDir, iShard, nShard):
+    return os.path.join(shardDir, "shard-%04dof%04d.json" % (iShard, nShard))
+
+
+def writeShardRecord(shardDir, iShard, nShard, units, done, missing, times, complete):
+    """Write the state of a shard, so the gather step can check that it finished.
+
+    @param units    keys assigned to this shard
+    @param done     keys which have been run
+    @param missing  keys which had no data to run
+    @param times    dict of key:seconds taken (a cost estimate for later runs)
+    @param complete True once the shard has finished
+    """
+    if not os.path.exists(shardDir):
+        try:
+            os.makedirs(shardDir)
+        except OSError:
+            # another shard may have beaten us to it
+            if not os.path.isdir(shardDir):
+                raise
+
+    record = {
+        'shard'    : iShard,
+        'nShard'   : nShard,
+        'units'    : sorted(units),
+        'done'     : sorted(done),
+        'missing'  : sorted(missing),
+        'times'    : times,
+        'complete' : complete,
+        }
+
+    # write then rename, so a reader never sees a partial file
+    filename = shardRecordFile(shardDir, iShard, nShard)
+    tmp = filename + ".tmp%d" % (os.getpid())
+    fp = open(tmp, 'w')
+    json.dump(record, fp, indent=1)
+    fp.close()
+    os.rename(tmp, filename)
+
+
+def readShardRecords(shardDir, nShard=None):
+    """Read the shard records in shardDir (optionally only those of an nShard-way split)."""
+    records = {}
+    for filename in sorted(glob.glob(os.path.join(shardDir, "shard-*of*.json"))):
+        fp = open(filename)
+        record = json.load(fp)
+        fp.close()
+        if nShard is not None and record['nShard'] != nShard:
+            continue
+        records[record['shard']] = record
+    return records
+
+
+def loadCosts(path):
+    """Load unit costs from a json file of key:cost, or from the 'times' of a directory of shard records."""
+    if os.path.isdir(path):
+        costs = {}
+        for record in readShardRecords(path).values():
+            costs.update(record['times'])
+        return costs
+
+    fp = open(path)
+    costs = json.load(fp)
+    fp.close()
+    return costs
+
+
+def saveCosts(path, costs):
+    """Write a json file of key:cost, as read by loadCosts()."""
+    tmp = path + ".tmp%d" % (os.getpid())
+    fp = open(tmp, 'w')
+    json.dump(costs, fp, indent=1)
+    fp.close()
+    os.rename(tmp, path)
+
+
+def verifyShards(shardDir, nShard):
+    """Check that all nShard shards ran to completion.
+
+    @return a list of problems (empty if all shards completed)
+    """
+    records = readShardRecords(shardDir, nShard)
+
+    problems = []
+    for iShard in range(nShard):
+        if not records.has_key(iShard):
+            problems.append("shard %d/%d: no record in %s" % (iShard, nShard, shardDir))
+            continue
+        record = records[iShard]
+        notRun = set(record['units']) - set(record['done']) - set(record['missing'])
+        if not record['complete']:
+            problems.append("shard %d/%d: did not complete (%d of %d units not run)" %
+                            (iShard, nShard, len(notRun), len(record['units'])))
+        elif len(notRun) > 0:
+            problems.append("shard %d/%d: units not run: %s" % (iShard, nShard, ", ".join(sorted(notRun))))
+    return problems
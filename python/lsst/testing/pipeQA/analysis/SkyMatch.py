@@ -0,0 +1,127 @@
+#
+# LSST Data Management System
+# Copyright 2008, 2009, 2010 LSST Corporation.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+#
+
+
+"""Positional cross-matching of two catalogs (eg. the detections on a ccd in two visits).
+
+Both catalogs are projected onto a tangent plane, and the second is bucketed in
+cells as large as the match radius, so each point of the first need only be
+compared with the points in its own and the 8 surrounding cells.  With the
+buckets found by sorting (see IdJoin), matching costs O(N log N).
+"""
+
+import numpy
+import IdJoin as idJoin
+
+
+def tangentPlane(ra, dec, ra0, dec0):
+    """Gnomonic projection of positions about (ra0, dec0).
+
+    @param ra, dec    positions (radians)
+    @param ra0, dec0  center of the projection (radians)
+
+    @return xi, eta (radians), and a boolean array which is False for points more
+            than 90 degrees from the center (which can't be projected)
+    """
+    cosDra = numpy.cos(ra - ra0)
+    cosc = numpy.sin(dec0)*numpy.sin(dec) + numpy.cos(dec0)*numpy.cos(dec)*cosDra
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        xi  = numpy.cos(dec)*numpy.sin(ra - ra0)/cosc
+        eta = (numpy.cos(dec0)*numpy.sin(dec) - numpy.sin(dec0)*numpy.cos(dec)*cosDra)/cosc
+        ok = (cosc > 0) & numpy.isfinite(xi) & numpy.isfinite(eta)
+    return xi, eta, ok
+
+
+def center(ra, dec):
+    """The (ra, dec) of the mean unit vector of some positions (all in radians)."""
+    x = numpy.cos(dec)*numpy.cos(ra)
+    y = numpy.cos(dec)*numpy.sin(ra)
+    z = numpy.sin(dec)
+    ok = numpy.isfinite(x) & numpy.isfinite(y) & numpy.isfinite(z)
+    x, y, z = x[ok].sum(), y[ok].sum(), z[ok].sum()
+    return numpy.arctan2(y, x), numpy.arctan2(z, numpy.hypot(x, y))
+
+
+def _firstOfGroup(groups, dist):
+    """Flag, for each group label, the entry with the smallest dist (ties go to the first)."""
+    order = numpy.lexsort((dist, groups))
+    first = numpy.zeros(len(groups), dtype=bool)
+    if len(groups) > 0:
+        sortedGroups = groups[order]
+        first[order] = numpy.concatenate([[True], sortedGroups[1:] != sortedGroups[:-1]])
+    return first
+
+
+def matchPositions(ra1, dec1, ra2, dec2, radius, unique=True):
+    """Match two lists of positions.
+
+    @param ra1, dec1  positions in the first catalog (degrees)
+    @param ra2, dec2  positions in the second catalog (degrees)
+    @param radius     match radius (arcsec)
+    @param unique     only keep pairs which are each other's nearest neighbour;
+                      otherwise return every pair within the radius
+
+    @return index1, index2, dist: the pairs, in increasing order of index1,
+            and their separations (arcsec)
+    """
+    ra1, dec1, ra2, dec2 = [numpy.radians(numpy.asarray(v, dtype=float)) for v in (ra1, dec1, ra2, dec2)]
+    r = numpy.radians(radius/3600.0)
+
+    empty = numpy.array([], dtype=int)
+    if len(ra1) == 0 or len(ra2) == 0:
+        return empty, empty, numpy.array([])
+
+    ra0, dec0 = center(numpy.concatenate([ra1, ra2]), numpy.concatenate([dec1, dec2]))
+    x1, y1, ok1 = tangentPlane(ra1, dec1, ra0, dec0)
+    x2, y2, ok2 = tangentPlane(ra2, dec2, ra0, dec0)
+    use1, use2 = numpy.where(ok1)[0], numpy.where(ok2)[0]
+    if len(use1) == 0 or len(use2) == 0:
+        return empty, empty, numpy.array([])
+
+    # cells of the match radius, numbered so neighbours' keys differ by 1 in y and 'width' in x
+    cx1, cy1 = numpy.floor(x1[use1]/r).astype(numpy.int64), numpy.floor(y1[use1]/r).astype(numpy.int64)
+    cx2, cy2 = numpy.floor(x2[use2]/r).astype(numpy.int64), numpy.floor(y2[use2]/r).astype(numpy.int64)
+    cxMin = min(cx1.min(), cx2.min()) - 1
+    cyMin = min(cy1.min(), cy2.min()) - 1
+    width = max(cy1.max(), cy2.max()) - cyMin + 2
+    key1 = (cx1 - cxMin)*width + (cy1 - cyMin)
+    key2 = (cx2 - cxMin)*width + (cy2 - cyMin)
+
+    index1, index2 = [], []
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            i1, i2 = idJoin.joinAll(key1 + dx*width + dy, key2)
+            index1.append(use1[i1])
+            index2.append(use2[i2])
+    index1 = numpy.concatenate(index1)
+    index2 = numpy.concatenate(index2)
+
+    dist = numpy.hypot(x1[index1] - x2[index2], y1[index1] - y2[index2])
+    near = dist <= r
+    index1, index2, dist = index1[near], index2[near], dist[near]
+
+    if unique:
+        mutual = _firstOfGroup(index1, dist) & _firstOfGroup(index2, dist)
+        index1, index2, dist = index1[mutual], index2[mutual], dist[mutual]
+
+    order = numpy.lexsort((dist, index1))
+    return index1[order], index2[order], numpy.degrees(dist[order])*3600.0
@@ -34,18 +34,13 @@ import RaftCcdData                  as raftCcdData
 import QaAnalysisUtils              as qaAnaUtil
 
 from   .QaAnalysisTask              import QaAnalysisTask
+from   .QaAnalysisConfig            import SummaryQaConfig
 import lsst.pex.config              as pexConfig
 
 import QaPlotUtils                  as qaPlotUtil
 
 
 
-class SummaryQaConfig(pexConfig.Config):
-    cameras = pexConfig.ListField(dtype = str,
-                                  doc = "Cameras to run SummaryQaTask",
-                                  default = ("suprimecam", "hsc"))
-
-    
 class SummaryQaTask(QaAnalysisTask):
     ConfigClass = SummaryQaConfig
     _DefaultName = "summaryQa"
@@ -35,6 +35,7 @@ from matplotlib.patches import Circle
 
 
 import QaPlotUtils as qaPlotUtil
+import RadialProfile as radialProfile
 
 def plot(data):
 
@@ -95,6 +96,12 @@ def plot(data):
             
         sp1 = fig.add_subplot(111)
         sp1.plot(radii, dmags, 'ro', ms=2, alpha = 0.5)
+
+        # the vignetting curve: median offset (and its robust scatter) in radial bins
+        profile = radialProfile.radialProfile(radii, dmags, nBins=20)
+        have = profile['npoint'] > 1
+        sp1.errorbar(profile['radius'][have], profile['median'][have], yerr=profile['stdev'][have],
+                     fmt='bs-', ms=3.0)
         fig.subplots_adjust(left=0.15)
         sp1.set_ylim(ylim)
 
@@ -27,6 +27,7 @@ import lsst.pex.config      as pexConfig
 import lsst.pipe.base       as pipeBase
 
 from .QaAnalysisTask import QaAnalysisTask
+from .QaAnalysisConfig import VignettingQaConfig
 
 import lsst.testing.pipeQA.TestCode              as testCode
 import lsst.testing.pipeQA.figures               as qaFig
@@ -34,19 +35,10 @@ import lsst.testing.pipeQA.figures.QaFigureUtils as qaFigUtils
 import RaftCcdData                               as raftCcdData
 import QaAnalysisUtils                           as qaAnaUtil
 import QaPlotUtils                               as qaPlotUtil
+import RadialProfile                             as radialProfile
 
 
 
-class VignettingQaConfig(pexConfig.Config):
-    cameras   = pexConfig.ListField(dtype = str, doc = "Cameras to run VignettingQaTask",
-                                    default = ("lsstSim", "cfht", "suprimecam", "sdss", "coadd"))
-    maxMedian = pexConfig.Field(dtype = float, doc = "Maximum median magnitude offset", default = 0.08)
-    maxRms    = pexConfig.Field(dtype = float, doc = "Maximum magnitude offset RMS", default = 0.04)
-    maxMag    = pexConfig.Field(dtype = float,
-                                doc = "Maximum magnitude star to use in VignettingQa test (-1 for median)",
-                                default = -1.0)
-
-    
 class VignettingQaTask(QaAnalysisTask):
     ConfigClass = VignettingQaConfig
     _DefaultName = "vignettingQa"
@@ -69,24 +61,55 @@ class VignettingQaTask(QaAnalysisTask):
         """
 
         
-    def _getFlux(self, data, mType, s, sref):
+    def _getFluxName(self, mType):
+        """The name (see QaData.getNamedColumn()) of the flux for mType; cat fluxes are on the reference sources."""
+        return {"psf": "Psf", "ap": "Ap", "mod": "Mod", "inst": "Inst", "cat": "rPsf"}[mType]
 
-        # if the source isn't valid, return NaN
-        if not hasattr(s, 'getId') or not hasattr(sref, 'getId'):
-            return num.NaN
 
-        
-        
-        if mType=="psf":
-            return s.getD(data.k_Psf)
-        elif mType=="ap":
-            return s.getD(data.k_Ap)
-        elif mType=="mod":
-            return s.getD(data.k_Mod)
-        elif mType=="cat":
-            return sref.getD(data.k_rPsf)
-        elif mType=="inst":
-            return s.getD(data.k_Inst)
+    def _getMedianMag(self, data, matchList, cacheKey=None):
+        """Get the median psf magnitude of the matched sources which aren't extended."""
+        ss   = [m[1] for m in matchList]
+        flux = data.getNamedColumn(ss, "Psf", cacheKey)
+        use  = num.isfinite(flux) & data.getStarMask(ss, cacheKey)
+        return num.median(data.getMagColumn(ss, "Psf", cacheKey)[use])
+
+
+    def _getOffsetColumns(self, data, matchList, startX, startY, cacheKey=None):
+        """Get the magnitude offsets, ids and focal plane radii of the good, bright stars in a matchList.
+
+        The arithmetic is done in the same order as it was done match by match, so the
+        results are identical.
+
+        @param matchList       list of [sref, s, dist]
+        @param startX, startY  focal plane position of the ccd's pixel origin
+        @param cacheKey        key for the ccd's columns in data's cache (see QaData.getNamedColumn)
+
+        @return dict of arrays: dmag, ids (int64), radius
+        """
+        srefs = [m[0] for m in matchList]
+        ss    = [m[1] for m in matchList]
+
+        cols = []
+        for mType in (self.magType1, self.magType2):
+            name = self._getFluxName(mType)
+            sources = srefs if mType == "cat" else ss
+            cols.append((data.getNamedColumn(sources, name, cacheKey), data.getMagColumn(sources, name, cacheKey)))
+        (f1, m1), (f2, m2) = cols
+
+        ids = num.array([s.getId() for s in ss], dtype=num.int64)
+        x   = data.getNamedColumn(ss, "x", cacheKey)
+        y   = data.getNamedColumn(ss, "y", cacheKey)
+
+        with num.errstate(invalid='ignore', divide='ignore'):
+            flagged = data.getFlagMask(ss, self.config.badFlags, cacheKey)
+            good = data.getStarMask(ss, cacheKey) & (f1 > 0.0) & (f2 > 0.0) & ~flagged
+            m1, m2 = m1[good], m2[good]
+            keep = ~(m2 > self.maxMag) & num.isfinite(m1) & num.isfinite(m2)
+
+        radius = radialProfile.focalPlaneRadius(x[good][keep], y[good][keep], startX, startY)
+        return {"dmag"   : m1[keep] - m2[keep],
+                "ids"    : ids[good][keep],
+                "radius" : radius}
 
         
     def free(self):
@@ -132,38 +155,13 @@ class VignettingQaTask(QaAnalysisTask):
                 mdict    = self.matchListDictSrc[key]['matched']
 
                 if self.config.maxMag == -1:
-                    mags = []
-                    for m in mdict:
-                        _1, s, _2 = m
-                        flux = s.getD(data.k_Psf)
-                        if num.isfinite(flux) and not s.getD(data.k_ext):
-                            m = -2.5*num.log10(flux)
-                            mags.append(m)
-                    self.maxMag = num.median(mags)
-                
-                for m in mdict:
-                    sref, s, dist = m
-
-                    if s.getD(data.k_ext): # if non-stellar
-                        continue
-
-                    f1 = self._getFlux(data, self.magType1, s, sref)
-                    f2 = self._getFlux(data, self.magType2, s, sref)
-
-                    if (f1 > 0.0 and f2 > 0.0  and not data.isFlagged(s)):
-                        m1 = -2.5*num.log10(f1)
-                        m2 = -2.5*num.log10(f2)
-
-                        if m2 > self.maxMag:
-                            continue
+                    self.maxMag = self._getMedianMag(data, mdict, cacheKey=(key, 'matched'))
 
-                        if num.isfinite(m1) and num.isfinite(m2):
-                            self.dmag.append(raftId, ccdId, m1 - m2)
-                            self.ids.append(raftId, ccdId, str(s.getId()))
-                            xmm     = startX + s.getD(data.k_x)
-                            ymm     = startY + s.getD(data.k_y)
-                            radiusp = num.sqrt(xmm**2 + ymm**2)
-                            self.radius.append(raftId, ccdId, radiusp)
+                # ids are int64, so they're set rather than extended onto the (float) initValue
+                cols = self._getOffsetColumns(data, mdict, startX, startY, cacheKey=(key, 'matched'))
+                self.dmag.set(raftId, ccdId, cols['dmag'])
+                self.ids.set(raftId, ccdId, cols['ids'])
+                self.radius.set(raftId, ccdId, cols['radius'])
 
                 # Calculate stats
                 dmags = self.dmag.get(raftId, ccdId)
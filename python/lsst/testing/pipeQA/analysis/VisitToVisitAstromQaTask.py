@@ -34,15 +34,15 @@ import lsst.testing.pipeQA.figures  as qaFig
 import lsst.testing.pipeQA.TestCode as testCode
 import lsst.testing.pipeQA.figures.QaFigureUtils as qaFigUtils
 import RaftCcdData as raftCcdData
-from .AstrometricErrorQaTask import AstrometricErrorQaTask, AstrometricErrorQaConfig
+import IdJoin as idJoin
+import SkyMatch as skyMatch
+from .AstrometricErrorQaTask import AstrometricErrorQaTask
+from .QaAnalysisConfig       import VisitToVisitAstromQaConfig
 
 import matplotlib.cm as cm
 import matplotlib.colors as colors
 from matplotlib.font_manager import FontProperties
 
-class VisitToVisitAstromQaConfig(AstrometricErrorQaConfig):
-    cameras = pexConfig.ListField(dtype = str, doc = "Cameras to run PhotCompareQaTask", default = ("lsstSim", "hscSim", "suprimecam", "cfht"))
-
 class VisitToVisitAstromQaTask(AstrometricErrorQaTask):
     ConfigClass = VisitToVisitAstromQaConfig
     _DefaultName = "visitToVisitAstromQa"
@@ -61,10 +61,28 @@ class VisitToVisitAstromQaTask(AstrometricErrorQaTask):
 
         """
     def free(self):
-        AstrometricErrorQaAnalysis.free(self)
+        AstrometricErrorQaTask.free(self)
         del self.visitMatches   
 
 
+    def _getColumns(self, matchList):
+        """Get the positions and flags of the detections in a match list, in a column each.
+
+        @param matchList  list of [sref, s, ...] matches
+        @return dict of arrays: ra, dec (degrees), x, y, flags (of the detection),
+                star (STAR flag of the reference object)
+        """
+        return {
+            'ra'    : num.array([m[1].getRa() for m in matchList], dtype=float),
+            'dec'   : num.array([m[1].getDec() for m in matchList], dtype=float),
+            'x'     : num.array([m[1].getXAstrom() for m in matchList], dtype=float),
+            'y'     : num.array([m[1].getYAstrom() for m in matchList], dtype=float),
+            'flags' : num.array([m[1].getFlagForDetection() for m in matchList], dtype=num.int64),
+            'star'  : num.array([m[0].getFlagForDetection() for m in matchList],
+                                dtype=num.int64) & measAlg.Flags.STAR,
+            }
+
+
     def test(self, data, dataId):
         self.matchListDictSrc = data.getMatchListBySensor(dataId, useRef='src')
         self.detector         = data.getDetectorBySensor(dataId)
@@ -96,57 +114,40 @@ class VisitToVisitAstromQaTask(AstrometricErrorQaTask):
             # All visit dets in footprint of original image
             visMatchList = self.visitMatches[key]
 
-            # List of reference object ids
-            srcObjIds = num.array([x[0].getId() for x in srcMatchList])
-            visObjIds = num.array([x[0].getId() for x in visMatchList])
-            common    = list(set(srcObjIds) & set(visObjIds))
+            cols1 = self._getColumns(srcMatchList)
+            cols2 = self._getColumns(visMatchList)
 
             self.log.log(self.log.INFO, "%s : " % (key))
-            if len(common) == 0:
-                self.log.log(self.log.WARN, "  No overlap, Using pre-to-post PT1.2 objectID mapping...")
-                    
-                # Try objectID hack from PT1.2 to post-PT1.2:
-                visObjIds *= 2
-                isStar     = (num.array([x[0].getFlagForDetection() for x in visMatchList]) & measAlg.Flags.STAR) > 0
-                visObjIds += isStar
-                common     = list(set(srcObjIds) & set(visObjIds))
-            self.log.log(self.log.INFO, "  Found %d matches" % (len(common)))
-                    
-            # Iterate over all object ids
-            for i in range(len(common)):
-                srcObjId  = common[i]
-                idxS = num.where(srcObjIds == srcObjId)[0]
-                idxV = num.where(visObjIds == srcObjId)[0] 
+            if self.config.matchBy == "position":
+                idxS, idxV, dist = skyMatch.matchPositions(cols1['ra'], cols1['dec'], cols2['ra'], cols2['dec'],
+                                                           self.config.matchRadius)
+            else:
+                # List of reference object ids
+                srcObjIds = num.array([x[0].getId() for x in srcMatchList])
+                visObjIds = num.array([x[0].getId() for x in visMatchList])
+
+                if not (idJoin.countIds(srcObjIds, visObjIds) > 0).any():
+                    self.log.log(self.log.WARN, "  No overlap, Using pre-to-post PT1.2 objectID mapping...")
+
+                    # Try objectID hack from PT1.2 to post-PT1.2:
+                    visObjIds *= 2
+                    visObjIds += cols2['star'] > 0
 
                 # only take 1-to-1 matches
-                if len(idxS) != 1 or len(idxV) != 1:
-                    continue
-    
-                sref1 = srcMatchList[idxS[0]][0]
-                srcv1 = srcMatchList[idxS[0]][1]
-    
-                sref2 = visMatchList[idxV[0]][0]
-                srcv2 = visMatchList[idxV[0]][1]
-
-                #coord1 = afwCoord.Coord(afwGeom.Point2D(srcv1.getRa(), srcv1.getDec()))  # coords originally in degrees
-                #coord2 = afwCoord.Coord(afwGeom.Point2D(srcv2.getRa(), srcv2.getDec()))  # coords originally in degrees
-                #angle  = coord1.angularSeparation(coord2)
-
-                # Measurment flags; note no star/gal separation yet
-                flags1 = srcv1.getFlagForDetection()
-                flags2 = srcv2.getFlagForDetection()
-                # Get star/gal info here
-                isStar = sref1.getFlagForDetection() & measAlg.Flags.STAR
-
-                if (not flags1 & badFlags) and (not flags2 & badFlags) and isStar:
-                    ra1, dec1, ra2, dec2 = [x * num.pi / 180.0 for x in (srcv1.getRa(), srcv1.getDec(), srcv2.getRa(), srcv2.getDec())]
-                    dRa  = (ra1 - ra2) * abs(num.cos(dec1))
-                    dDec = (dec1 - dec2)
-
-                    self.dRa.append(raft, ccd, dRa)
-                    self.dDec.append(raft, ccd, dDec)
-                    self.x.append(raft, ccd, srcv1.getXAstrom())
-                    self.y.append(raft, ccd, srcv1.getYAstrom())
+                idxS, idxV = idJoin.joinUnique(srcObjIds, visObjIds)
+            self.log.log(self.log.INFO, "  Found %d matches" % (len(idxS)))
+
+            # Measurment flags; note no star/gal separation yet
+            good = (((cols1['flags'][idxS] & badFlags) == 0) & ((cols2['flags'][idxV] & badFlags) == 0) &
+                    (cols1['star'][idxS] > 0))
+            idxS, idxV = idxS[good], idxV[good]
+
+            ra1, dec1, ra2, dec2 = [x * num.pi / 180.0 for x in (cols1['ra'][idxS], cols1['dec'][idxS],
+                                                                 cols2['ra'][idxV], cols2['dec'][idxV])]
+            self.dRa.extend(raft, ccd, (ra1 - ra2) * num.abs(num.cos(dec1)))
+            self.dDec.extend(raft, ccd, (dec1 - dec2))
+            self.x.extend(raft, ccd, cols1['x'][idxS])
+            self.y.extend(raft, ccd, cols1['y'][idxS])
 
         testSet = self.getTestSet(data, dataId)
         testSet.addMetadata({"Description": self.description})
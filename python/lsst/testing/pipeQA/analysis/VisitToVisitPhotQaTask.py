@@ -29,24 +29,20 @@ import lsst.pex.config              as pexConfig
 import lsst.pipe.base               as pipeBase
 
 from .QaAnalysisTask import QaAnalysisTask
+from .QaAnalysisConfig import VisitToVisitPhotQaConfig
 import lsst.testing.pipeQA.figures  as qaFig
 import lsst.testing.pipeQA.TestCode as testCode
 import lsst.testing.pipeQA.figures.QaFigureUtils as qaFigUtils
 import RaftCcdData as raftCcdData
+import GroupStats as groupStats
 import QaAnalysisUtils as qaAnaUtil
+import IdJoin as idJoin
+import Repeatability as repeatability
 
 import matplotlib.cm as cm
 import matplotlib.colors as colors
 from matplotlib.font_manager import FontProperties
 
-class VisitToVisitPhotQaConfig(pexConfig.Config):
-    cameras = pexConfig.ListField(dtype = str, doc = "Cameras to run PhotCompareQaTask", default = ("lsstSim", "hscSim", "suprimecam", "cfht"))
-    magTypes = pexConfig.ListField(dtype = str, doc = "Make separate figures for different magnitude types", default = ("ap", "psf", "inst", "mod"))
-    magCut = pexConfig.Field(dtype = float, doc = "Faintest magnitude for establishing photometric RMS", default = 20.0)
-    deltaMin = pexConfig.Field(dtype = float, doc = "Minimum allowed delta", default = -0.02)
-    deltaMax = pexConfig.Field(dtype = float, doc = "Maximum allowed delta", default =  0.02)
-    rmsMax = pexConfig.Field(dtype = float, doc = "Maximum allowed photometric RMS on bright end", default =  0.02)
-
 class VisitToVisitPhotQaTask(QaAnalysisTask):
     ConfigClass = VisitToVisitPhotQaConfig
     _DefaultName = "visitToVisitPhotQa"
@@ -126,6 +122,32 @@ class VisitToVisitPhotQaTask(QaAnalysisTask):
         elif mType=="inst":
             return s.getInstFluxErr()
 
+    def _getMagColumns(self, matchList, index):
+        """Get the magnitudes (etc.) of some of the matches in a list, in a column each.
+
+        @param matchList  list of [sref, s, ...] matches
+        @param index      indices of the matches wanted
+
+        @return dict of arrays: flux, mag, magErr and refMag (NaN where flux <= 0),
+                flags (of the source) and star (STAR flag of the reference object)
+        """
+        matches = [matchList[i] for i in index]
+
+        flux    = num.array([self._getFlux(self.magType, m[1], m[0]) for m in matches], dtype=float)
+        fluxErr = num.array([self._getFluxErr(self.magType, m[1], m[0]) for m in matches], dtype=float)
+        refFlux = num.array([self._getFlux("cat", m[1], m[0]) for m in matches], dtype=float)
+        flags   = num.array([m[1].getFlagForDetection() for m in matches], dtype=num.int64)
+        star    = num.array([m[0].getFlagForDetection() for m in matches], dtype=num.int64) & measAlg.Flags.STAR
+
+        with num.errstate(invalid='ignore', divide='ignore'):
+            good   = flux > 0.0
+            mag    = num.where(good, -2.5 * num.log10(flux), num.NaN)
+            magErr = num.where(good, 2.5 / num.log(10.0) * fluxErr / flux, num.NaN)
+            refMag = num.where(good, -2.5 * num.log10(refFlux), num.NaN)
+
+        return {'flux' : flux, 'mag' : mag, 'magErr' : magErr, 'refMag' : refMag,
+                'flags' : flags, 'star' : star}
+
     def alloc(self):
         # Filter name
         self.ownFilt       = None
@@ -144,6 +166,9 @@ class VisitToVisitPhotQaTask(QaAnalysisTask):
         self.refId       = {}
         self.star        = {}
 
+        # Running statistics over all visits, for each ccd
+        self.repeat      = None
+
         # Results of tests
         self.meanDmags   = {}
         self.medianDmags = {}
@@ -163,6 +188,7 @@ class VisitToVisitPhotQaTask(QaAnalysisTask):
         del self.visitRefMag
         del self.refId
         del self.star
+        del self.repeat
 
         # realloc what needs to be reused
         self.alloc()
@@ -180,6 +206,8 @@ class VisitToVisitPhotQaTask(QaAnalysisTask):
         else:
             visitList = self.visits
 
+        self.repeat = raftCcdData.RaftCcdData(self.detector, initValue=None)
+
         for visit in visitList:
             self.visitMatches[visit] = data.getVisitMatchesBySensor(self.database, visit, dataId)
             kvs = self.visitMatches[visit].keys()
@@ -214,70 +242,51 @@ class VisitToVisitPhotQaTask(QaAnalysisTask):
                 # List of reference object ids
                 srcObjIds = num.array([x[0].getId() for x in srcMatchList])
                 visObjIds = num.array([x[0].getId() for x in visMatchList])
-                common    = list(set(srcObjIds) & set(visObjIds))
 
                 self.log.log(self.log.INFO, "%s :" % (key))
-                if len(common) == 0:
+                if not (idJoin.countIds(srcObjIds, visObjIds) > 0).any():
                     self.log.log(self.log.INFO, "  No overlap, Using pre-to-post PT1.2 objectID mapping...")
                     
                     # Try objectID hack from PT1.2 to post-PT1.2:
                     visObjIds *= 2
                     isStar     = (num.array([x[0].getFlagForDetection() for x in visMatchList]) & measAlg.Flags.STAR) > 0
                     visObjIds += isStar
-                    common     = list(set(srcObjIds) & set(visObjIds))
-                self.log.log(self.log.INFO, "Found %d matches" % (len(common)))
-                    
-                # Iterate over all object ids
-                for i in range(len(common)):
-                    srcObjId  = common[i]
-                    idxS = num.where(srcObjIds == srcObjId)[0]
-                    idxV = num.where(visObjIds == srcObjId)[0] 
-
-                    # only take 1-to-1 matches
-                    if len(idxS) != 1 or len(idxV) != 1:
-                        continue
-    
-                    sref1 = srcMatchList[idxS[0]][0]
-                    srcv1 = srcMatchList[idxS[0]][1]
-    
-                    sref2 = visMatchList[idxV[0]][0]
-                    srcv2 = visMatchList[idxV[0]][1]
-    
-                    f1  = self._getFlux(self.magType, srcv1, sref1)
-                    f2  = self._getFlux(self.magType, srcv2, sref2)
-                    df1 = self._getFluxErr(self.magType, srcv1, sref1)
-                    df2 = self._getFluxErr(self.magType, srcv2, sref2)
-    
-                    fref1 = self._getFlux("cat", srcv1, sref1)
-                    fref2 = self._getFlux("cat", srcv2, sref2)
-
-                    # Measurment flags; note no star/gal separation yet
-                    flags1 = srcv1.getFlagForDetection()
-                    flags2 = srcv2.getFlagForDetection()
-                    # Get star/gal info here
-                    isStar = sref1.getFlagForDetection() & measAlg.Flags.STAR
-
-                    if (f1 > 0.0 and f2 > 0.0) and (not flags1 & badFlags) and (not flags2 & badFlags):
-                        m1  = -2.5 * num.log10(f1) 
-                        m2  = -2.5 * num.log10(f2) 
-                        dm1 = 2.5 / num.log(10.0) * df1 / f1
-                        dm2 = 2.5 / num.log(10.0) * df2 / f2
-    
-                        M1  = -2.5 * num.log10(fref1) 
-                        M2  = -2.5 * num.log10(fref2) 
-    
-                        if num.isfinite(m1) and num.isfinite(m2) and num.isfinite(M1) and num.isfinite(M2):
-                            self.mag[visit].append(raft, ccd, m1)
-                            self.magErr[visit].append(raft, ccd, dm1)
 
-                            self.visitMag[visit].append(raft, ccd, m2)
-                            self.visitMagErr[visit].append(raft, ccd, dm2)
+                # only take 1-to-1 matches
+                idxS, idxV = idJoin.joinUnique(srcObjIds, visObjIds)
+                self.log.log(self.log.INFO, "Found %d matches" % (len(idxS)))
+
+                cols1 = self._getMagColumns(srcMatchList, idxS)
+                cols2 = self._getMagColumns(visMatchList, idxV)
+
+                # Measurment flags; note no star/gal separation yet
+                good = ((cols1['flux'] > 0.0) & (cols2['flux'] > 0.0) &
+                        ((cols1['flags'] & badFlags) == 0) & ((cols2['flags'] & badFlags) == 0))
+                good &= (num.isfinite(cols1['mag']) & num.isfinite(cols2['mag']) &
+                         num.isfinite(cols1['refMag']) & num.isfinite(cols2['refMag']))
+
+                self.mag[visit].extend(raft, ccd, cols1['mag'][good])
+                self.magErr[visit].extend(raft, ccd, cols1['magErr'][good])
+
+                self.visitMag[visit].extend(raft, ccd, cols2['mag'][good])
+                self.visitMagErr[visit].extend(raft, ccd, cols2['magErr'][good])
 
-                            self.refMag[visit].append(raft, ccd, M1)
-                            self.visitRefMag[visit].append(raft, ccd, M2)
+                self.refMag[visit].extend(raft, ccd, cols1['refMag'][good])
+                self.visitRefMag[visit].extend(raft, ccd, cols2['refMag'][good])
 
-                            self.refId[visit].append(raft, ccd, srcObjId)
-                            self.star[visit].append(raft, ccd, isStar)
+                self.refId[visit].extend(raft, ccd, srcObjIds[idxS][good])
+                # Get star/gal info here
+                self.star[visit].extend(raft, ccd, cols1['star'][good])
+
+                # running statistics of each star's delta mag, visit to visit
+                if self.config.streamVisits:
+                    if self.repeat.get(raft, ccd) is None:
+                        self.repeat.set(raft, ccd, repeatability.RepeatabilityAccumulator())
+                    isStar = good & (cols1['star'] > 0)
+                    self.repeat.get(raft, ccd).add(srcObjIds[idxS][isStar],
+                                                   cols1['mag'][isStar] - cols2['mag'][isStar] -
+                                                   (cols1['refMag'][isStar] - cols2['refMag'][isStar]),
+                                                   cols1['refMag'][isStar])
 
             # TMI
             #testLabel = "%s_%s_%s" % (self.database, visit, self.magType)
@@ -335,10 +344,35 @@ class VisitToVisitPhotQaTask(QaAnalysisTask):
                     label = "stdev "+tag 
                     comment = "stdev "+tag+" (mag lt %.1f, nstar/clip=%d/%d)" % (self.magCut, len(dmS), npts)
                     testSet.addTest( testCode.Test(label, std, self.rmsLimits, comment, areaLabel=areaLabel))
-                
+
+            if self.config.streamVisits:
+                # only the running statistics in self.repeat are kept from visit to visit
+                for vectors in (self.mag, self.magErr, self.refMag, self.visitMag, self.visitMagErr,
+                                self.visitRefMag, self.refId, self.star, self.visitMatches):
+                    del vectors[visit]
+
+        # repeatability of each star over all the visits, in place of the per-visit figures
+        if self.config.streamVisits:
+            testSet = self.getTestSet(data, dataId, label="%s" % (self.magType))
+            for raft, ccd, acc in self.repeat.listKeysAndValues():
+                if acc is None:
+                    continue
+                # the same stars as the per-visit stats
+                rms, nstar = acc.repeatability(self.magCut, magMin=10.0)
+                if nstar > 0:
+                    areaLabel = data.cameraInfo.getDetectorName(raft, ccd)
+                    label = "repeatability "+self.magType
+                    comment = "median stdev of "+self.magType+" over %d visits (mag lt %.1f, nstar=%d)" % (
+                        acc.nVisit, self.magCut, nstar)
+                    testSet.addTest( testCode.Test(label, rms, self.rmsLimits, comment, areaLabel=areaLabel))
+
 
 
     def plot(self, data, dataId, showUndefined=False):
+        if self.config.streamVisits:
+            self.log.log(self.log.INFO, "streamVisits is set; the per-visit arrays needed for figures weren't kept")
+            return
+
         if len(self.visits) == 0:
             visitList = [dataId['visit'],]
         else:
@@ -365,25 +399,19 @@ class VisitToVisitPhotQaTask(QaAnalysisTask):
 
 
     def plotErrvSig(self, sp, x, y, dy, bins):
-        binxs   = []
-        binerrs = []
-        binstds = []
-
-        for i in range(1, len(bins)):
-            idx = num.where((x>bins[i-1]) & (x<bins[i]))[0]
-            if len(idx) == 0:
-                continue
-            binx   = afwMath.makeStatistics(x[idx], afwMath.MEAN).getValue(afwMath.MEAN)
-            binerr = afwMath.makeStatistics(dy[idx], afwMath.MEAN).getValue(afwMath.MEAN)
-            binsig = 0.741 * afwMath.makeStatistics(y[idx], afwMath.IQRANGE).getValue(afwMath.IQRANGE)
-
-            binxs.append(binx)
-            binerrs.append(binerr)
-            binstds.append(binsig)
-
-        binxs   = num.array(binxs)
-        binerrs = num.array(binerrs)
-        binstds = num.array(binstds)
+        # bin i holds bins[i-1] < x < bins[i]; all bins are done together
+        bins = num.asarray(bins)
+        ibin = num.searchsorted(bins, x)
+        inBin = (ibin > 0) & (ibin < len(bins))
+        inBin[inBin] &= (x[inBin] != bins[ibin[inBin]])
+        idx = num.where(inBin)[0]
+        groups = ibin[idx] - 1
+        nBin = len(bins) - 1
+
+        have = num.bincount(groups, minlength=nBin) > 0
+        binxs   = groupStats.groupStatistics(x[idx], groups, nBin)['mean'][have]
+        binerrs = groupStats.groupStatistics(dy[idx], groups, nBin)['mean'][have]
+        binstds = 0.741*groupStats.groupStatistics(y[idx], groups, nBin)['iqrange'][have]
         sp.plot(binxs, binstds, "r-", label="Phot RMS")
         sp.plot(binxs, binerrs, "b--", label="Avg Error Bar")
         sp.legend(prop=FontProperties(size="xx-small"), loc="upper left")
@@ -610,8 +638,7 @@ class VisitToVisitPhotQaTask(QaAnalysisTask):
         for raft, ccd in self.mag[visitA].raftCcdKeys():
             idA = self.refId[visitA].get(raft, ccd)
             idB = self.refId[visitB].get(raft, ccd)
-            idX = num.intersect1d(idA, idB)
-            sliceA, sliceB = num.where(num.equal.outer(idA, idB) == True)
+            sliceA, sliceB = idJoin.joinAll(idA, idB)
             
             m1A  = self.mag[visitA].get(raft, ccd)[sliceA]
             m2A  = self.visitMag[visitA].get(raft, ccd)[sliceA]
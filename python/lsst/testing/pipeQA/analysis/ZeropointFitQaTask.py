@@ -30,6 +30,7 @@ import lsst.pex.config              as pexConfig
 import lsst.pipe.base               as pipeBase
 
 from   .QaAnalysisTask              import QaAnalysisTask
+from   .QaAnalysisConfig            import ZeropointFitQaConfig
 import lsst.testing.pipeQA.figures  as qaFig
 import lsst.testing.pipeQA.figures.QaFigureUtils as qaFigUtils
 import QaAnalysisUtils              as qaAnaUtil
@@ -38,19 +39,6 @@ import QaPlotUtils                  as qaPlotUtil
 
 
 
-class ZeropointFitQaConfig(pexConfig.Config):
-    cameras   = pexConfig.ListField(dtype = str,
-                                    doc = "Cameras to run ZeropointFitQa",
-                                    default = ("lsstSim", "cfht", "sdss", "coadd", "hsc"))
-    offsetMin = pexConfig.Field(dtype = float,
-                                doc = "Median offset of stars from zeropoint fit; minimum good value",
-                                default = -0.1)
-    offsetMax = pexConfig.Field(dtype = float,
-                                doc = "Median offset of stars from zeropoint fit; maximum good value",
-                                default = +0.1)
-
-    
-    
 class ZeropointFitQaTask(QaAnalysisTask):
     ConfigClass = ZeropointFitQaConfig
     _DefaultName = "zeropointFitQa"
@@ -92,6 +80,57 @@ class ZeropointFitQaTask(QaAnalysisTask):
         del self.zeroPoint
         del self.medOffset
         
+    def _getFluxName(self):
+        """The name (see QaData.getNamedColumn()) of the flux we're using."""
+        if self.fluxType == "psf":
+            return "Psf"
+        else:
+            return "Ap"
+
+    def _getMatchedColumns(self, data, matchList, fmag0, cacheKey=None):
+        """Get the catalog and (un-calibrated) instrumental magnitudes of good matches.
+
+        The arithmetic is done in the same order as it was done match by match, so the
+        results are identical.
+
+        @param matchList  list of [sref, s, dist]
+        @param fmag0      flux of a zero-magnitude object, to un-calibrate the fluxes
+        @param cacheKey   key for the ccd's columns in data's cache (see QaData.getNamedColumn)
+
+        @return dict of arrays: Refmag, Imgmag, Imgerr, and star (boolean)
+        """
+        srefs = [m[0] for m in matchList]
+        ss    = [m[1] for m in matchList]
+        name  = self._getFluxName()
+
+        fref = data.getNamedColumn(srefs, "rPsf", cacheKey)
+        ferr = data.getNamedColumn(ss, name + "E", cacheKey)
+
+        # un-calibrate the magnitudes
+        f = data.getUncalibratedFluxColumn(ss, name, fmag0, cacheKey)
+
+        with num.errstate(invalid='ignore', divide='ignore'):
+            good = (fref > 0.0) & (f > 0.0) & ~data.getFlagMask(ss, self.config.badFlags, cacheKey)
+            mrefmag  = data.getMagColumn(srefs, "rPsf", cacheKey)[good]
+            mimgmag  = -2.5*num.log10(f[good])
+            mimgmerr =  2.5 / num.log(10.0) * ferr[good] / f[good]
+        finite = num.isfinite(mrefmag) & num.isfinite(mimgmag)
+
+        return {"Refmag" : mrefmag[finite],
+                "Imgmag" : mimgmag[finite],
+                "Imgerr" : mimgmerr[finite],
+                "star"   : data.getStarMask(ss, cacheKey)[good][finite]}
+
+    def _getOrphanMags(self, data, orphans, fmag0, cacheKey=None):
+        """Get the (un-calibrated) instrumental magnitudes of the orphans with positive fluxes."""
+        name = self._getFluxName()
+        f = data.getNamedColumn(orphans, name, cacheKey)
+        with num.errstate(invalid='ignore'):
+            positive = f > 0.0
+        # un-calibrate the magnitudes
+        f = data.getUncalibratedFluxColumn(orphans, name, fmag0, cacheKey)[positive]
+        return -2.5 * num.log10(f)
+
     def test(self, data, dataId, fluxType = "psf"):
 
         testSet = self.getTestSet(data, dataId)
@@ -132,49 +171,18 @@ class ZeropointFitQaTask(QaAnalysisTask):
 
             fmag0 = self.calib[key].getFluxMag0()[0]
             if fmag0 <= 0.0:
-                self.zeroPoint.set(raftId, ccdId, NaN)
+                self.zeroPoint.set(raftId, ccdId, num.NaN)
                 continue
             zpt = -2.5*num.log10(fmag0)
             self.zeroPoint.set(raftId, ccdId, zpt)
 
             if self.matchListDictSrc.has_key(key):
                 # Matched
-                mdict    = self.matchListDictSrc[key]['matched']
-                stars    = []
-                galaxies = []
-
-                for m in mdict:
-                    sref, s, dist = m
-                    if fluxType == "psf":
-                        fref  = sref.getD(data.k_rPsf)
-                        f     = s.getD(data.k_Psf)
-                        ferr  = s.getD(data.k_PsfE)
-                    else:
-                        fref  = sref.getD(data.k_rPsf)
-                        f     = s.getD(data.k_Ap)
-                        ferr  = s.getD(data.k_ApE)
-
-                    # un-calibrate the magnitudes
-                    f *= fmag0
-                    
-                    if (fref > 0.0 and f > 0.0 and not data.isFlagged(s)):
-                        mrefmag  = -2.5*num.log10(fref)
-                        mimgmag  = -2.5*num.log10(f)
-                        mimgmerr =  2.5 / num.log(10.0) * ferr / f
-    
-                        star = 0 if s.getD(data.k_ext) else 1
-                        
-                        if num.isfinite(mrefmag) and num.isfinite(mimgmag):
-                            if star:
-                                stars.append((mrefmag, mimgmag, mimgmerr))
-                            else:
-                                galaxies.append((mrefmag, mimgmag, mimgmerr))
-                self.matchedStar.set(raftId, ccdId, {"Refmag": num.array([x[0] for x in stars]),
-                                                     "Imgmag": num.array([x[1] for x in stars]),
-                                                     "Imgerr": num.array([x[2] for x in stars])})
-                self.matchedGalaxy.set(raftId, ccdId, {"Refmag": num.array([x[0] for x in galaxies]),
-                                                       "Imgmag": num.array([x[1] for x in galaxies]),
-                                                       "Imgerr": num.array([x[2] for x in galaxies])})
+                cols = self._getMatchedColumns(data, self.matchListDictSrc[key]['matched'], fmag0,
+                                               cacheKey=(key, 'matched'))
+                star = cols.pop('star')
+                self.matchedStar.set(raftId, ccdId, dict([(k, v[star]) for k, v in cols.items()]))
+                self.matchedGalaxy.set(raftId, ccdId, dict([(k, v[~star]) for k, v in cols.items()]))
             
                 # Non-detections
                 undetectedStars = []
@@ -189,19 +197,8 @@ class ZeropointFitQaTask(QaAnalysisTask):
                 self.undetectedGalaxy.set(raftId, ccdId, num.array(undetectedGalaxies))
 
                 # Orphans
-                orphans = []
-                for orphan in self.matchListDictSrc[key]['orphan']:
-                    if self.fluxType == "psf":
-                        f = orphan.getD(data.k_Psf)
-                    else:
-                        f = orphan.getD(data.k_Ap)
-                    if f > 0.0:
-                        # un-calibrate the magnitudes
-                        f *= fmag0
-                        
-                        orphans.append(-2.5 * num.log10(f))
-                        
-                self.orphan.set(raftId, ccdId, num.array(orphans))
+                self.orphan.set(raftId, ccdId, self._getOrphanMags(data, self.matchListDictSrc[key]['orphan'],
+                                                                   fmag0, cacheKey=(key, 'orphan')))
 
                 # Metrics
                 offset      = num.array(self.matchedStar.get(raftId, ccdId)["Imgmag"]) # make a copy
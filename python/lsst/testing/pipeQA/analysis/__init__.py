@@ -22,13 +22,8 @@
 
 from PipeQaTask               import *
 from QaAnalysisTask           import *
-from EmptySectorQaTask        import *
-from PhotCompareQaTask        import *
-from PsfShapeQaTask           import *
-from AstrometricErrorQaTask   import *
-from CompletenessQaTask       import *
-from ZeropointFitQaTask       import *
-from VignettingQaTask         import *
+from QaAnalysisConfig         import *
 
-from VisitToVisitPhotQaTask   import *
-from VisitToVisitAstromQaTask import *
+# The tasks themselves (EmptySectorQaTask, PhotCompareQaTask, ...) are not imported here;
+# PipeQaTask imports only the ones it runs.  Import them by module, eg.
+#   from lsst.testing.pipeQA.analysis.PhotCompareQaTask import PhotCompareQaTask
@@ -34,7 +34,7 @@ def makeQaData(label, rerun=None, retrievalType=None, camera=None, **kwargs):
 
     @param label         data identifier - either a directory in TESTBED_PATH/SUPRIME_DATA_DIR or a DB name
     @param rerun         data rerun to retrieve
-    @param retrievalType 'butler', 'db', or None (will search first for butler, then database)
+    @param retrievalType 'butler', 'db', 'sqlite', or None (will search first for butler, then database)
     @param camera        Specify which camera is to be used
     """
     
@@ -113,6 +113,17 @@ def makeQaData(label, rerun=None, retrievalType=None, camera=None, **kwargs):
             from DbQaData         import DbQaData
             return DbQaData(label, rerun, cameraToUse, **kwargs)
 
+    
+    #####################
+    # make a db QaData from a local sqlite file
+    if retrievalType.lower() == "sqlite":
+
+        if camera in ["hsc","suprimecam","suprimecam-mit"]:
+            raise Exception("sqlite retrieval is only available for the LSST database schema (camera=%s)" %
+                            (camera))
+        from SqliteDbQaData   import SqliteDbQaData
+        return SqliteDbQaData(label, rerun, cameraToUse, **kwargs)
+
 
 
 
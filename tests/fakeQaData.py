@@ -0,0 +1,60 @@
+"""Stand-ins for source records, catalogs and QaData, for testing the QaAnalysisTasks' column helpers.
+
+This isn't a test itself (see SConscript); the test*.py modules import it.
+"""
+
+import numpy
+from lsst.testing.pipeQA.QaData import QaData
+
+class FakeSource(object):
+    """Just enough of a source record for the QaAnalysisTasks."""
+    def __init__(self, values, id=None):
+        self.values = values
+        self.id = id
+    def getId(self):
+        return id(self) if self.id is None else self.id
+    def get(self, key):
+        return self.values[key]
+    getD = get
+    getI = get
+
+class FakeCatalog(object):
+    """A catalog which hands out whole columns, like a contiguous SourceCatalog.
+
+    If it isn't contiguous, asking for a column raises, as afw does (with an LsstCppException).
+    """
+    def __init__(self, sources, contiguous=True):
+        self.sources = sources
+        self.contiguous = contiguous
+        self.nGet = 0
+    def __len__(self):
+        return len(self.sources)
+    def __iter__(self):
+        return iter(self.sources)
+    def isContiguous(self):
+        return self.contiguous
+    def get(self, key):
+        if not self.contiguous:
+            raise RuntimeError("Record data is not contiguous in memory")
+        self.nGet += 1
+        return numpy.array([s.get(key) for s in self.sources])
+
+class FakeData(QaData):
+    """A QaData without a butler or database: just its caches, and keys named after themselves (k_Psf = "k_Psf")."""
+
+    keyNames = ["Psf", "PsfE", "Ap", "ApE", "Mod", "ModE", "Inst", "InstE", "rPsf", "rPsfE",
+                "x", "y", "Ra", "Dec", "rRa", "rDec", "ext", "ixx", "iyy", "ixy",
+                "intc", "satc", "edg", "nchild"]
+
+    def __init__(self):
+        for name in self.keyNames:
+            setattr(self, "k_" + name, "k_" + name)
+        self.nGetColumn = 0
+        self.initCache()
+
+    def getColumn(self, sources, key):
+        self.nGetColumn += 1
+        return QaData.getColumn(self, sources, key)
+
+class FakeConfig(object):
+    badFlags = QaData.defaultFlags
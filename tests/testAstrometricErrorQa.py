@@ -0,0 +1,61 @@
+import unittest
+import numpy
+import lsst.utils.tests as tests
+from lsst.testing.pipeQA.analysis.AstrometricErrorQaTask import AstrometricErrorQaTask
+from fakeQaData import FakeSource, FakeData, FakeConfig
+
+class AstrometricErrorQaTestCases(unittest.TestCase):
+    """Check that the array offsets are exactly those of the match-by-match loop."""
+
+    def testIdentical(self):
+        numpy.random.seed(4)
+        data = FakeData()
+        matchList = []
+        for i in range(3000):
+            ra, dec = numpy.random.uniform(0.0, 360.0), numpy.random.uniform(-89.0, 89.0)
+            s = FakeSource({"k_Ra": ra + numpy.random.normal(0.0, 1.0e-4),
+                            "k_Dec": dec + numpy.random.normal(0.0, 1.0e-4),
+                            "k_x": numpy.random.uniform(0, 2048), "k_y": numpy.random.uniform(0, 4096),
+                            "k_intc": int(numpy.random.uniform() < 0.05), "k_satc": 0,
+                            "k_edg": 0, "k_nchild": int(numpy.random.uniform() < 0.05)})
+            sref = FakeSource({"k_rRa": ra, "k_rDec": dec})
+            matchList.append([sref, s, 0.0])
+
+        # the match-by-match calculation from the original test()
+        expected = dict([(k, []) for k in ('dRa', 'dDec', 'x', 'y')])
+        for sref, s, dist in matchList:
+            ra, dec, raRef, decRef = \
+                [numpy.radians(x) for x in [s.getD(data.k_Ra), s.getD(data.k_Dec),
+                                            sref.getD(data.k_rRa), sref.getD(data.k_rDec)]]
+            dDec = decRef - dec
+            dRa  = (raRef - ra)*abs(numpy.cos(decRef))
+            if not data.isFlagged(s):
+                expected['dRa'].append(dRa)
+                expected['dDec'].append(dDec)
+                expected['x'].append(s.getD(data.k_x))
+                expected['y'].append(s.getD(data.k_y))
+
+        task = AstrometricErrorQaTask.__new__(AstrometricErrorQaTask)
+        task.config = FakeConfig()
+        offsets = task._getOffsetColumns(data, matchList)
+        for name, values in expected.items():
+            self.assertTrue(numpy.array_equal(numpy.array(values), offsets[name]), name)
+        self.assertEqual(numpy.median(offsets['dRa']), numpy.median(expected['dRa']))
+
+#####
+
+def suite():
+    """Returns a suite containing all the test cases in this module."""
+    tests.init()
+
+    suites = []
+    suites += unittest.makeSuite(AstrometricErrorQaTestCases)
+    suites += unittest.makeSuite(tests.MemoryTestCase)
+    return unittest.TestSuite(suites)
+
+def run(doExit=False):
+    """Run the tests"""
+    tests.run(suite(), doExit)
+
+if __name__ == "__main__":
+    run(True)
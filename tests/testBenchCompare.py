@@ -0,0 +1,78 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy
+import lsst.utils.tests as tests
+import lsst.testing.pipeQA.BenchCompare as benchCompare
+
+class BenchCompareTestCases(unittest.TestCase):
+    """Check that real regressions are caught, and ccd-to-ccd noise isn't."""
+
+    def setUp(self):
+        numpy.random.seed(1)
+        self.dir = tempfile.mkdtemp()
+        self.ccds = ["v1-c%d" % i for i in range(30)]
+        self.base = dict([(ccd, {"task.photCompareQa.test": 2.0 + 0.1*i,
+                                 "throughput.SourceSets": 5000.0,
+                                 "rss.peak": 500000.0}) for i, ccd in enumerate(self.ccds)])
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def scaled(self, metric, factor, scatter=0.0):
+        new = {}
+        for ccd, metrics in self.base.items():
+            new[ccd] = dict(metrics)
+            new[ccd][metric] *= factor*(1.0 + scatter*numpy.random.normal())
+        return new
+
+    def status(self, new, relTol=0.1):
+        results = benchCompare.compareBench(self.base, new, relTol=relTol)
+        return dict([(r['metric'], r['status']) for r in results])
+
+    def testSame(self):
+        status = self.status(self.scaled("task.photCompareQa.test", 1.0, 0.03))
+        self.assertEqual(set(status.values()), set(["ok"]))
+
+    def testRegressed(self):
+        status = self.status(self.scaled("task.photCompareQa.test", 1.3))
+        self.assertEqual(status["task.photCompareQa.test"], "REGRESSED")
+        self.assertEqual(status["rss.peak"], "ok")
+
+        # lower throughput is the regression
+        status = self.status(self.scaled("throughput.SourceSets", 0.7))
+        self.assertEqual(status["throughput.SourceSets"], "REGRESSED")
+        status = self.status(self.scaled("throughput.SourceSets", 1.5))
+        self.assertEqual(status["throughput.SourceSets"], "improved")
+
+    def testNoisy(self):
+        # a 15% slowdown isn't significant with 50% ccd-to-ccd noise ...
+        status = self.status(self.scaled("task.photCompareQa.test", 1.15, 0.5))
+        self.assertEqual(status["task.photCompareQa.test"], "ok")
+        # ... but is when the timings are steady
+        status = self.status(self.scaled("task.photCompareQa.test", 1.15, 0.01))
+        self.assertEqual(status["task.photCompareQa.test"], "REGRESSED")
+
+    def testFile(self):
+        filename = os.path.join(self.dir, "bench.json")
+        benchCompare.writeBench(filename, self.base, {'dataset': "test"})
+        self.assertEqual(benchCompare.readBench(filename), self.base)
+
+#####
+
+def suite():
+    """Returns a suite containing all the test cases in this module."""
+    tests.init()
+
+    suites = []
+    suites += unittest.makeSuite(BenchCompareTestCases)
+    suites += unittest.makeSuite(tests.MemoryTestCase)
+    return unittest.TestSuite(suites)
+
+def run(doExit=False):
+    """Run the tests"""
+    tests.run(suite(), doExit)
+
+if __name__ == "__main__":
+    run(True)
@@ -0,0 +1,85 @@
+import unittest
+import numpy
+import lsst.utils.tests as tests
+import lsst.testing.pipeQA.analysis.CompletenessFit as completenessFit
+
+class CompletenessFitTestCases(unittest.TestCase):
+    """Check the batched depths against the per-ccd loop, and against known curves."""
+
+    def setUp(self):
+        numpy.random.seed(10)
+        self.bins = numpy.arange(14, 27, 0.5)
+        self.truth = numpy.random.uniform(21.0, 24.5, 40)
+        self.width = numpy.random.uniform(0.2, 0.5, 40)
+        self.found, self.all = [], []
+        for depth, width in zip(self.truth, self.width):
+            mags = numpy.random.uniform(14.0, 26.5, 4000)
+            complete = 0.5 - numpy.arctan((mags - depth)/width)/numpy.pi
+            detected = numpy.random.uniform(size=len(mags)) < complete
+            self.found.append(mags[detected])
+            self.all.append(mags)
+        # a ccd with no objects, and one with only bright ones
+        self.found += [numpy.array([]), numpy.array([15.0, 15.2])]
+        self.all += [numpy.array([]), numpy.array([15.0, 15.2])]
+
+    def loopDepth(self, found, all):
+        # the per-ccd calculation from the original CompletenessQaTask.limitingMag
+        if len(all) == 0:
+            return 0.0
+        histAll   = numpy.histogram(all, bins=self.bins)
+        histFound = numpy.histogram(found, bins=self.bins)
+        magbins = 0.5 * (histAll[1][1:] + histAll[1][:-1])
+        w = numpy.where(histAll[0] != 0)
+        x = magbins[w]
+        y = 1.0 * histFound[0][w] / (1.0 * histAll[0][w])
+        binsize = self.bins[1] - self.bins[0]
+        x = numpy.append(x, x[-1] + binsize)
+        y = numpy.append(y, 0.0)
+        for i in numpy.arange(len(y) - 1, 1, -1):
+            if y[i] <= 0.5 and y[i-1] > 0.5:
+                return (0.5 - y[i-1]) / (y[i] - y[i-1]) * (x[i] - x[i-1]) + x[i-1]
+        return 0.0
+
+    def testHistograms(self):
+        hist = completenessFit.stackedHistogram(self.all, self.bins)
+        for k in range(len(self.all)):
+            self.assertTrue(numpy.array_equal(hist[k], numpy.histogram(self.all[k], bins=self.bins)[0]))
+
+    def testInterpolated(self):
+        histFound = completenessFit.stackedHistogram(self.found, self.bins)
+        histAll = completenessFit.stackedHistogram(self.all, self.bins)
+        depths = completenessFit.interpolatedDepths(histFound, histAll, self.bins)
+        for k in range(len(self.all)):
+            self.assertAlmostEqual(depths[k], self.loopDepth(self.found[k], self.all[k]), 12)
+
+    def testFitted(self):
+        histFound = completenessFit.stackedHistogram(self.found, self.bins)
+        histAll = completenessFit.stackedHistogram(self.all, self.bins)
+        guess = completenessFit.interpolatedDepths(histFound, histAll, self.bins)
+        depth, A, B = completenessFit.fittedDepths(histFound, histAll, self.bins, guess)
+        n = len(self.truth)
+        self.assertTrue(numpy.all(numpy.abs(depth[:n] - self.truth) < 0.15))
+        self.assertTrue(numpy.all(numpy.abs(1.0/A[:n] - self.width) < 0.15))
+        self.assertTrue(numpy.isnan(depth[n]))
+
+        # and from a poor starting guess
+        depth2, A2, B2 = completenessFit.fittedDepths(histFound, histAll, self.bins)
+        self.assertTrue(numpy.all(numpy.abs(depth2[:n] - depth[:n]) < 1.0e-4))
+
+#####
+
+def suite():
+    """Returns a suite containing all the test cases in this module."""
+    tests.init()
+
+    suites = []
+    suites += unittest.makeSuite(CompletenessFitTestCases)
+    suites += unittest.makeSuite(tests.MemoryTestCase)
+    return unittest.TestSuite(suites)
+
+def run(doExit=False):
+    """Run the tests"""
+    tests.run(suite(), doExit)
+
+if __name__ == "__main__":
+    run(True)
@@ -0,0 +1,118 @@
+import unittest
+import numpy
+import lsst.utils.tests as tests
+import lsst.afw.math as afwMath
+import lsst.testing.pipeQA.analysis.GroupStats as groupStats
+
+def clipOne(values, nSigma=3.0, nIter=3):
+    """Straightforward single-array version of afwMath's MEANCLIP/STDEVCLIP."""
+    values = values[numpy.isfinite(values)]
+    q25, median, q75 = numpy.percentile(values, [25.0, 50.0, 75.0])
+    center, hwidth = median, nSigma*groupStats.IQ_TO_STDEV*(q75 - q25)
+    for i in range(nIter):
+        use = values[numpy.abs(values - center) <= hwidth]
+        center, std = use.mean(), use.std(ddof=1)
+        hwidth = nSigma*std
+    return median, q75 - q25, center, std
+
+class GroupStatsTestCases(unittest.TestCase):
+    """Check the grouped statistics against a group-at-a-time calculation."""
+
+    def testSimple(self):
+        stats = groupStats.statistics([4.0, 1.0, 3.0, 2.0, numpy.NaN])
+        self.assertEqual(stats['npoint'], 4)
+        self.assertEqual(stats['median'], 2.5)
+        self.assertEqual(stats['iqrange'], 1.5)
+        self.assertAlmostEqual(stats['stdev'], numpy.std([1.0, 2.0, 3.0, 4.0], ddof=1))
+
+    def testGroups(self):
+        numpy.random.seed(2)
+        nGroup = 20
+        groups = numpy.random.randint(0, nGroup - 1, 5000)   # the last group is empty
+        values = numpy.random.normal(groups, 1.0 + 0.1*groups)
+        outliers = numpy.random.uniform(size=len(values)) < 0.05
+        values[outliers] += 30.0
+
+        stats = groupStats.groupStatistics(values, groups, nGroup)
+        for i in range(nGroup - 1):
+            v = values[groups == i]
+            median, iqr, meanclip, stdevclip = clipOne(v)
+            self.assertEqual(stats['npoint'][i], len(v))
+            self.assertAlmostEqual(stats['mean'][i], v.mean())
+            self.assertAlmostEqual(stats['median'][i], median)
+            self.assertAlmostEqual(stats['iqrange'][i], iqr)
+            self.assertAlmostEqual(stats['meanclip'][i], meanclip)
+            self.assertAlmostEqual(stats['stdevclip'][i], stdevclip)
+            self.assertTrue(abs(meanclip - i) < 0.5)
+
+        self.assertEqual(stats['npoint'][-1], 0)
+        self.assertTrue(numpy.isnan(stats['median'][-1]))
+        self.assertTrue(numpy.isnan(stats['meanclip'][-1]))
+
+    def testInfinities(self):
+        # as in afw, only NaNs are ignored
+        stats = groupStats.statistics([1.0, 2.0, 3.0, numpy.inf, numpy.NaN])
+        self.assertEqual(stats['npoint'], 4)
+        self.assertEqual(stats['median'], 2.5)
+        self.assertEqual(stats['mean'], numpy.inf)
+
+    def testLabels(self):
+        labels, index = groupStats.groupIndex(["2,2", "1,1", "2,2"])
+        self.assertEqual(list(labels), ["1,1", "2,2"])
+        self.assertEqual(list(index), [1, 0, 1])
+
+class AfwStatisticsTestCases(unittest.TestCase):
+    """Check the grouped statistics against afwMath.makeStatistics() with its defaults."""
+
+    def assertSame(self, value, expected, name):
+        if numpy.isnan(expected):
+            self.assertTrue(numpy.isnan(value), "%s: %s != NaN" % (name, value))
+        else:
+            self.assertAlmostEqual(value, expected, 10, "%s: %s != %s" % (name, value, expected))
+
+    def check(self, groupValues):
+        values = numpy.concatenate(groupValues)
+        groups = numpy.concatenate([numpy.zeros(len(v), dtype=int) + i for i, v in enumerate(groupValues)])
+        stats = groupStats.groupStatistics(values, groups, len(groupValues))
+
+        flags = afwMath.NPOINT | afwMath.MEDIAN | afwMath.IQRANGE | afwMath.MEANCLIP | afwMath.STDEVCLIP
+        for i, v in enumerate(groupValues):
+            afwStats = afwMath.makeStatistics(v, flags)
+            self.assertEqual(stats['npoint'][i], afwStats.getValue(afwMath.NPOINT))
+            for name, flag in (("median", afwMath.MEDIAN), ("iqrange", afwMath.IQRANGE),
+                               ("meanclip", afwMath.MEANCLIP), ("stdevclip", afwMath.STDEVCLIP)):
+                self.assertSame(stats[name][i], afwStats.getValue(flag), "group %d %s" % (i, name))
+
+    def testRandom(self):
+        numpy.random.seed(3)
+        groupValues = []
+        for n in (3, 4, 10, 101, 1000):
+            v = numpy.random.normal(5.0, 2.0, n)
+            v[::7] += 40.0          # outliers
+            groupValues.append(v)
+        self.check(groupValues)
+
+    def testSmall(self):
+        self.check([numpy.array([3.0]), numpy.array([1.0, 2.0]), numpy.array([2.0, 1.0, numpy.NaN])])
+
+    def testEqual(self):
+        self.check([numpy.zeros(5) + 2.5, numpy.ones(2), numpy.array([1.0, 1.0, 1.0, 7.0])])
+
+#####
+
+def suite():
+    """Returns a suite containing all the test cases in this module."""
+    tests.init()
+
+    suites = []
+    suites += unittest.makeSuite(GroupStatsTestCases)
+    suites += unittest.makeSuite(AfwStatisticsTestCases)
+    suites += unittest.makeSuite(tests.MemoryTestCase)
+    return unittest.TestSuite(suites)
+
+def run(doExit=False):
+    """Run the tests"""
+    tests.run(suite(), doExit)
+
+if __name__ == "__main__":
+    run(True)
@@ -0,0 +1,74 @@
+import unittest
+import numpy
+import lsst.utils.tests as tests
+import lsst.testing.pipeQA.analysis.IdJoin as idJoin
+
+class IdJoinTestCases(unittest.TestCase):
+    """Check the sorted id joins against the id-by-id loops they replace."""
+
+    def setUp(self):
+        numpy.random.seed(7)
+        self.idsA = numpy.random.randint(0, 3000, 2000)
+        self.idsB = numpy.random.randint(0, 3000, 2500)
+
+    def testCounts(self):
+        counts = idJoin.countIds(self.idsA, self.idsB)
+        for i in range(0, len(self.idsA), 37):
+            self.assertEqual(counts[i], (self.idsB == self.idsA[i]).sum())
+
+    def testUnique(self):
+        idxA, idxB = idJoin.joinUnique(self.idsA, self.idsB)
+
+        expected = []
+        for id in set(self.idsA) & set(self.idsB):
+            iA = numpy.where(self.idsA == id)[0]
+            iB = numpy.where(self.idsB == id)[0]
+            if len(iA) == 1 and len(iB) == 1:
+                expected.append((iA[0], iB[0]))
+        self.assertTrue(len(expected) > 0)
+        self.assertEqual(zip(idxA, idxB), sorted(expected))
+
+    def testAll(self):
+        # the pairs, in the order, that numpy.equal.outer() gave
+        idsA, idsB = self.idsA[:500].astype(float), self.idsB[:700].astype(float)
+        idsA[::40] = numpy.NaN
+        idsB[::30] = numpy.NaN
+        expectedA, expectedB = numpy.where(numpy.equal.outer(idsA, idsB))
+        idxA, idxB = idJoin.joinAll(idsA, idsB)
+        self.assertTrue(len(idxA) > 0)
+        self.assertTrue(numpy.array_equal(idxA, expectedA))
+        self.assertTrue(numpy.array_equal(idxB, expectedB))
+
+        idxA, idxB = idJoin.joinAll(numpy.array([]), idsB)
+        self.assertEqual(len(idxA), 0)
+        self.assertEqual(len(idxB), 0)
+
+    def testNoOverlap(self):
+        idxA, idxB = idJoin.joinUnique(numpy.arange(10), numpy.arange(10, 20))
+        self.assertEqual(len(idxA), 0)
+        self.assertEqual(len(idxB), 0)
+        idxA, idxB = idJoin.joinUnique(numpy.array([]), numpy.arange(10))
+        self.assertEqual(len(idxA), 0)
+
+    def testNaN(self):
+        idxA, idxB = idJoin.joinUnique(numpy.array([1.0, numpy.NaN, 3.0]), numpy.array([numpy.NaN, 3.0]))
+        self.assertEqual(list(idxA), [2])
+        self.assertEqual(list(idxB), [1])
+
+#####
+
+def suite():
+    """Returns a suite containing all the test cases in this module."""
+    tests.init()
+
+    suites = []
+    suites += unittest.makeSuite(IdJoinTestCases)
+    suites += unittest.makeSuite(tests.MemoryTestCase)
+    return unittest.TestSuite(suites)
+
+def run(doExit=False):
+    """Run the tests"""
+    tests.run(suite(), doExit)
+
+if __name__ == "__main__":
+    run(True)
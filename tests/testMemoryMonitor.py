@@ -0,0 +1,65 @@
+import unittest
+import lsst.utils.tests as tests
+import lsst.testing.pipeQA.MemoryMonitor as memMon
+
+class FakeTask(object):
+    def __init__(self, name, leak):
+        self.name = name
+        self.leak = leak
+        self.cache = []
+        self.shared = Shared
+    def free(self):
+        if not self.leak:
+            self.cache = []
+    def __str__(self):
+        return self.name
+
+class Shared(object):
+    pass
+
+class MemoryMonitorTestCases(unittest.TestCase):
+    """Check that steady growth, and the task causing it, are found."""
+
+    def testIsGrowing(self):
+        self.assertTrue(memMon.isGrowing([5, 1, 2, 2, 3]))
+        self.assertFalse(memMon.isGrowing([5, 1, 2, 1, 3]))
+        self.assertFalse(memMon.isGrowing([1, 2]))
+
+    def testLeakiestTask(self):
+        monitor = memMon.MemoryMonitor()
+        tasks = [FakeTask("tidyQa", False), FakeTask("leakyQa", True)]
+        leaked = []
+        for i in range(4):
+            for task in tasks:
+                task.cache.append([object() for j in range(100)])
+                task.free()
+                monitor.taskFreed(task)
+            leaked.append([Shared() for j in range(50)])
+            monitor.snapshot("ccd%d" % i)
+
+        worst = monitor.leakiestTasks()[0]
+        self.assertEqual(worst[0], "leakyQa")
+        self.assertTrue(worst[1] >= 300)
+        self.assertTrue(worst[3])
+        self.assertTrue(memMon.isGrowing(monitor.totals()))
+
+        growing = dict([(g[0], g[1]) for g in monitor.growingTypes()])
+        self.assertTrue(growing[memMon.typeName(Shared())] >= 100)
+
+#####
+
+def suite():
+    """Returns a suite containing all the test cases in this module."""
+    tests.init()
+
+    suites = []
+    suites += unittest.makeSuite(MemoryMonitorTestCases)
+    suites += unittest.makeSuite(tests.MemoryTestCase)
+    return unittest.TestSuite(suites)
+
+def run(doExit=False):
+    """Run the tests"""
+    tests.run(suite(), doExit)
+
+if __name__ == "__main__":
+    run(True)
@@ -0,0 +1,55 @@
+import unittest
+import numpy
+import lsst.utils.tests as tests
+import lsst.testing.pipeQA.analysis.Occupancy as occupancy
+
+class OccupancyTestCases(unittest.TestCase):
+    """Check the occupancy maps against a point-by-point count."""
+
+    def loopCounts(self, x, y, nx, ny, xwid, ywid):
+        counts = numpy.zeros([nx, ny])
+        for i in range(len(x)):
+            if x[i] == x[i] and y[i] == y[i]:
+                xi, yi = int(nx*x[i]/xwid), int(ny*y[i]/ywid)
+                if xi >= 0 and xi < nx and yi >= 0 and yi < ny:
+                    counts[xi,yi] += 1
+        return counts
+
+    def testCounts(self):
+        numpy.random.seed(6)
+        nx, ny, xwid, ywid = 4, 8, 2047.0, 4095.0
+        x = numpy.random.uniform(-100.0, 2200.0, 2000)
+        y = numpy.random.uniform(-100.0, 4200.0, 2000)
+        x[::50] = numpy.NaN
+        x[1] = -0.5                 # truncated to sector 0, as int() does
+        y[2] = ywid                 # just off the grid
+        x[3:800] = 100.0            # leave some sectors empty
+
+        counts = occupancy.occupancy(x, y, nx, ny, xwid, ywid)
+        expected = self.loopCounts(x, y, nx, ny, xwid, ywid)
+        self.assertEqual(counts.shape, (nx, ny))
+        self.assertTrue(numpy.array_equal(counts, expected))
+        self.assertEqual(occupancy.countEmpty(counts), len(numpy.where(expected.flatten() == 0)[0]))
+
+    def testEmpty(self):
+        counts = occupancy.occupancy(numpy.array([]), numpy.array([]), 3, 2, 10.0, 10.0)
+        self.assertEqual(counts.shape, (3, 2))
+        self.assertEqual(occupancy.countEmpty(counts), 6)
+
+#####
+
+def suite():
+    """Returns a suite containing all the test cases in this module."""
+    tests.init()
+
+    suites = []
+    suites += unittest.makeSuite(OccupancyTestCases)
+    suites += unittest.makeSuite(tests.MemoryTestCase)
+    return unittest.TestSuite(suites)
+
+def run(doExit=False):
+    """Run the tests"""
+    tests.run(suite(), doExit)
+
+if __name__ == "__main__":
+    run(True)
@@ -0,0 +1,137 @@
+import unittest
+import numpy
+import lsst.utils.tests as tests
+from lsst.testing.pipeQA.analysis.PhotCompareQaTask import PhotCompareQaTask
+from lsst.testing.pipeQA.analysis.ZeropointFitQaTask import ZeropointFitQaTask
+from fakeQaData import FakeSource, FakeData, FakeConfig
+
+class PhotCompareQaTestCases(unittest.TestCase):
+    """Check that the columnar test() gives exactly what the source-by-source loop gave."""
+
+    def setUp(self):
+        numpy.random.seed(3)
+        self.data = FakeData()
+        self.sources = []
+        for i in range(2000):
+            values = {}
+            for k in ["k_" + name for name in FakeData.keyNames]:
+                values[k] = numpy.random.lognormal(3.0, 2.0)
+            for k in ("k_Psf", "k_Ap", "k_Mod", "k_Inst", "k_rPsf"):
+                if numpy.random.uniform() < 0.05:
+                    values[k] = numpy.random.choice([0.0, -1.0, numpy.NaN, numpy.inf])
+            for k in ("k_intc", "k_satc", "k_edg", "k_nchild"):
+                values[k] = int(numpy.random.uniform() < 0.03)
+            values["k_ext"] = numpy.random.choice([0.0, 1.0, numpy.NaN])
+            self.sources.append(FakeSource(values))
+
+    def loop(self, task, ss, srefs, catalog):
+        """The source-by-source calculation from the original PhotCompareQaTask.test()"""
+        data = self.data
+        out = dict([(k, []) for k in ('derr', 'diff', 'mag', 'x', 'y', 'star')])
+        for s, sref in zip(ss, srefs):
+            f1  = task._getFlux(data, task.magType1, s, sref)
+            f2  = task._getFlux(data, task.magType2, s, sref)
+            df1 = task._getFluxErr(data, task.magType1, s, sref)
+            df2 = task._getFluxErr(data, task.magType2, s, sref)
+            if (f1 > 0.0 and f2 > 0.0 and not data.isFlagged(s)):
+                m1 = -2.5*numpy.log10(f1)
+                m2 = -2.5*numpy.log10(f2)
+                if catalog:
+                    dm1 = 2.5 / numpy.log(10.0) * df1 / f1
+                    dm2 = 2.5 / numpy.log(10.0) * df2 / f2
+                else:
+                    dm1 = 2.5*df1 / (f1*numpy.log(10.0))
+                    dm2 = 2.5*df2 / (f2*numpy.log(10.0))
+                star = 0 if s.getD(data.k_ext) else 1
+                if numpy.isfinite(m1) and numpy.isfinite(m2):
+                    out['derr'].append(numpy.sqrt(dm1**2 + dm2**2))
+                    out['diff'].append(m1 - m2)
+                    out['mag'].append(m1)
+                    out['x'].append(s.getD(data.k_x))
+                    out['y'].append(s.getD(data.k_y))
+                    out['star'].append(star)
+        return out
+
+    def testIdentical(self):
+        srefs = list(reversed(self.sources))
+        for mType1, mType2 in (("psf", "ap"), ("mod", "inst"), ("psf", "cat"), ("cat", "ap")):
+            task = PhotCompareQaTask.__new__(PhotCompareQaTask)
+            task.config = FakeConfig()
+            task.magType1, task.magType2 = mType1, mType2
+            catalog = "cat" in (mType1, mType2)
+            refs = srefs if catalog else self.sources
+
+            expected = self.loop(task, self.sources, refs, catalog)
+            columns = task._getMagColumns(self.data, self.sources, refs, catalog=catalog)
+            for name, values in expected.items():
+                self.assertEqual(len(values), len(columns[name]))
+                # bit for bit
+                self.assertTrue(numpy.array_equal(numpy.array(values, dtype=float),
+                                                  columns[name].astype(float)), name)
+
+class SharedColumnTestCases(unittest.TestCase):
+    """Check that tasks looking at the same matchList under one cacheKey share its columns."""
+
+    def setUp(self):
+        numpy.random.seed(8)
+        self.matchList = []
+        for i in range(1000):
+            values = {"k_ext": float(numpy.random.uniform() < 0.3), "k_intc": int(numpy.random.uniform() < 0.05),
+                      "k_satc": 0, "k_edg": 0, "k_nchild": 0}
+            for k in ("k_Psf", "k_PsfE", "k_x", "k_y"):
+                values[k] = numpy.random.lognormal(3.0, 2.0)
+            sref = FakeSource({"k_rPsf": numpy.random.lognormal(3.0, 2.0), "k_rPsfE": 1.0})
+            self.matchList.append([sref, FakeSource(values), 0.0])
+
+        self.photCompare = PhotCompareQaTask.__new__(PhotCompareQaTask)
+        self.photCompare.config = FakeConfig()
+        self.photCompare.magType1, self.photCompare.magType2 = "psf", "cat"
+        self.zeropointFit = ZeropointFitQaTask.__new__(ZeropointFitQaTask)
+        self.zeropointFit.config = FakeConfig()
+        self.zeropointFit.fluxType = "psf"
+
+    def getColumns(self, data, cacheKey):
+        srefs = [m[0] for m in self.matchList]
+        ss    = [m[1] for m in self.matchList]
+        zpt = self.zeropointFit._getMatchedColumns(data, self.matchList, 2.0, cacheKey=cacheKey)
+        phot = self.photCompare._getMagColumns(data, ss, srefs, catalog=True, cacheKey=cacheKey)
+        return zpt, phot
+
+    def testShared(self):
+        data = FakeData()
+        zpt, phot = self.getColumns(data, None)
+
+        shared = FakeData()
+        cacheKey = ("ccd1", "matched")
+        zptShared, photShared = self.getColumns(shared, cacheKey)
+        for expected, got in ((zpt, zptShared), (phot, photShared)):
+            for name in expected.keys():
+                self.assertTrue(numpy.array_equal(expected[name], got[name]), name)
+
+        # ZeropointFit read rPsf, Psf, PsfE, ext and the 4 flags; PhotCompare re-used them,
+        # and only read rPsfE, x and y
+        self.assertEqual(shared.nGetColumn, 8 + 3)
+        self.assertTrue(data.nGetColumn > shared.nGetColumn)
+
+        # and a second pass reads nothing
+        self.getColumns(shared, cacheKey)
+        self.assertEqual(shared.nGetColumn, 8 + 3)
+
+#####
+
+def suite():
+    """Returns a suite containing all the test cases in this module."""
+    tests.init()
+
+    suites = []
+    suites += unittest.makeSuite(PhotCompareQaTestCases)
+    suites += unittest.makeSuite(SharedColumnTestCases)
+    suites += unittest.makeSuite(tests.MemoryTestCase)
+    return unittest.TestSuite(suites)
+
+def run(doExit=False):
+    """Run the tests"""
+    tests.run(suite(), doExit)
+
+if __name__ == "__main__":
+    run(True)
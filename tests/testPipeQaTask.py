@@ -124,6 +124,28 @@ class PipeQaTestCases(unittest.TestCase):
 
         shutil.rmtree(self.wwwRerun)
 
+    def testBatchMem(self):
+        # --batchMem 1000 loads the whole raft in one batch (the 3 ccds are well under 1GB),
+        #   but the tasks must still run (and make their figures) once per ccd
+        os.mkdir(self.wwwRerun)
+
+        args = ["-e", "--batchMem", "1000", "-v", self.testVisit1, "-r", self.testRaft, "-c", re.sub(",1", ".*", self.testCcd), self.testDatabase]
+        for disArg in self.disableTasks():
+            args.append(disArg)
+
+        self.qaTask.parseAndRun(args)
+        for ccd in (0, 1, 2):
+            self.validateFiles(self.testVisit1, self.testFilt1, self.testRaft, re.sub(",1", ",%d" % (ccd), self.testCcd))
+
+        # a summary only run isn't batched, it just runs the last ccd
+        args = ["-e", "-S", "summOnly", "--batchMem", "1000", "-v", self.testVisit1, "-r", self.testRaft, "-c", re.sub(",1", ".*", self.testCcd), self.testDatabase]
+        for disArg in self.disableTasks():
+            args.append(disArg)
+        self.qaTask.parseAndRun(args)
+        self.validateFiles(self.testVisit1, self.testFilt1, self.testRaft, re.sub(",1", ",2", self.testCcd))
+
+        shutil.rmtree(self.wwwRerun)
+
     def testMulti(self):
         # -g 5:n says 'group all visits matching '888.*' in groups of 5, and run the n'th one
         #        so the first example runs the first 5 visits, the second one runs the next 5 visits
@@ -0,0 +1,93 @@
+import unittest
+import numpy
+import lsst.utils.tests as tests
+from lsst.testing.pipeQA.analysis.PsfShapeQaTask import PsfShapeQaTask
+from fakeQaData import FakeSource, FakeData, FakeConfig
+
+class PsfShapeQaTestCases(unittest.TestCase):
+    """Check that the array shapes are exactly those of the source-by-source loop."""
+
+    def testIdentical(self):
+        numpy.random.seed(5)
+        data = FakeData()
+        ss = []
+        for i in range(3000):
+            ixx, iyy = numpy.random.uniform(1.0, 4.0, 2)
+            ixy = numpy.random.normal(0.0, 0.5)
+            if i % 97 == 0:
+                ixx = iyy = ixy = 0.0
+            if i % 101 == 0:
+                ixx = numpy.NaN
+            flux = 10.0**numpy.random.uniform(2.0, 5.0)
+            if i % 53 == 0:
+                flux = -flux
+            ss.append(FakeSource({"k_Psf": flux, "k_ext": float(numpy.random.uniform() < 0.2),
+                                  "k_ixx": ixx, "k_iyy": iyy, "k_ixy": ixy,
+                                  "k_x": numpy.random.uniform(0, 2048), "k_y": numpy.random.uniform(0, 4096),
+                                  "k_Ra": numpy.random.uniform(0, 360), "k_Dec": numpy.random.uniform(-89, 89),
+                                  "k_intc": int(numpy.random.uniform() < 0.05), "k_satc": 0,
+                                  "k_edg": 0, "k_nchild": 0}))
+
+        # the source-by-source calculation from the original test()
+        sigmaToFwhm = 2.0*numpy.sqrt(2.0*numpy.log(2.0))
+        mags = []
+        for s in ss:
+            flux = s.getD(data.k_Psf)
+            if flux > 0 and numpy.isfinite(flux) and not s.getD(data.k_ext):
+                mags.append(-2.5*numpy.log10(flux))
+        mag_med = numpy.median(mags)
+
+        expected = dict([(k, []) for k in ('ellip', 'theta', 'x', 'y', 'ra', 'dec', 'fwhm')])
+        for s in ss:
+            ixx, iyy, ixy = s.getD(data.k_ixx), s.getD(data.k_iyy), s.getD(data.k_ixy)
+            tmp = 0.25*(ixx-iyy)**2 + ixy**2
+            if tmp < 0:
+                continue
+            a2 = 0.5*(ixx+iyy) + numpy.sqrt(tmp)
+            b2 = 0.5*(ixx+iyy) - numpy.sqrt(tmp)
+            if a2 == 0 or b2/a2 < 0:
+                continue
+            ellip = 1.0 - numpy.sqrt(b2/a2)
+            theta = 0.5*numpy.arctan2(2.0*ixy, ixx-iyy)
+            if theta < 0.0:
+                theta += numpy.pi
+            isStar = 0 if s.getD(data.k_ext) else 1
+            flux = s.getD(data.k_Psf)
+            mag = 99.0
+            if flux > 0:
+                mag = -2.5*numpy.log10(s.getD(data.k_Psf))
+            if (numpy.isfinite(ellip) and numpy.isfinite(theta) and
+                isStar and mag < mag_med and not data.isFlagged(s)):
+                expected['ellip'].append(ellip)
+                expected['theta'].append(theta)
+                expected['x'].append(s.getD(data.k_x))
+                expected['y'].append(s.getD(data.k_y))
+                expected['ra'].append(s.getD(data.k_Ra))
+                expected['dec'].append(s.getD(data.k_Dec))
+                expected['fwhm'].append(sigmaToFwhm*numpy.sqrt(0.5*(a2 + b2)))
+
+        task = PsfShapeQaTask.__new__(PsfShapeQaTask)
+        task.config = FakeConfig()
+        shapes = task._getShapeColumns(data, ss)
+        self.assertTrue(len(shapes['ellip']) > 0)
+        for name, values in expected.items():
+            self.assertTrue(numpy.array_equal(numpy.array(values), shapes[name]), name)
+        self.assertEqual(numpy.mean(shapes['fwhm']), numpy.mean(expected['fwhm']))
+
+#####
+
+def suite():
+    """Returns a suite containing all the test cases in this module."""
+    tests.init()
+
+    suites = []
+    suites += unittest.makeSuite(PsfShapeQaTestCases)
+    suites += unittest.makeSuite(tests.MemoryTestCase)
+    return unittest.TestSuite(suites)
+
+def run(doExit=False):
+    """Run the tests"""
+    tests.run(suite(), doExit)
+
+if __name__ == "__main__":
+    run(True)
@@ -0,0 +1,81 @@
+import unittest
+import numpy
+import lsst.utils.tests as tests
+import lsst.testing.pipeQA.analysis.QaAnalysisUtils as qaAnaUtil
+
+class RobustPolyFitGroupsTestCases(unittest.TestCase):
+    """Check that the grouped fitter gives exactly what robustPolyFit() does on each group alone."""
+
+    def setUp(self):
+        numpy.random.seed(5)
+        self.x, self.y, self.groups = [], [], []
+        sizes = [2, 3, 4, 7, 30, 200, 20000, 1, 0, 50]
+        for g, n in enumerate(sizes):
+            x = numpy.random.uniform(14.0, 24.0, n)
+            y = 0.01*g*(x - 20.0) + numpy.random.normal(0.0, 0.02, n)
+            if g == 3:
+                y = numpy.round(y)      # bins with identical values (dy = 0)
+            if g == 9:
+                x = numpy.round(x)      # repeated x values
+                y[::5] += 2.0           # outliers
+            self.x.append(x)
+            self.y.append(y)
+            self.groups.append(numpy.zeros(n, dtype=int) + g)
+        self.nGroup = len(sizes)
+        self.sizes = sizes
+
+    def check(self, nbin, niter):
+        # interleave the groups, so they aren't contiguous
+        x, y, groups = [numpy.concatenate(a) for a in (self.x, self.y, self.groups)]
+        perm = numpy.random.permutation(len(x))
+        x, y, groups = x[perm], y[perm], groups[perm]
+        fits = qaAnaUtil.robustPolyFitGroups(x, y, groups, 1, nbin=nbin, niter=niter, nGroup=self.nGroup + 1)
+        self.assertEqual(fits.shape, (self.nGroup + 1, 4))
+        for g in range(self.nGroup):
+            if self.sizes[g] == 0:
+                self.assertTrue(numpy.isnan(fits[g]).all())
+                continue
+            inGroup = groups == g
+            expected = qaAnaUtil.robustPolyFit(x[inGroup], y[inGroup], 1, nbin=nbin, niter=niter)
+            self.assertTrue(numpy.array_equal(fits[g], expected),
+                            "group %d: %s %s" % (g, fits[g], expected))
+        self.assertTrue(numpy.isnan(fits[-1]).all())
+
+    def testBins(self):
+        for nbin in (1, 2, 3, 5, 10):
+            self.check(nbin, 1)
+
+    def testClipping(self):
+        for nbin in (3, 10):
+            self.check(nbin, 3)
+
+    def testSingleGroups(self):
+        for i in range(200):
+            n = numpy.random.randint(2, 300)
+            x = numpy.random.uniform(14.0, 24.0, n)
+            y = numpy.random.normal(0.0, 0.05, n)
+            fits = qaAnaUtil.robustPolyFitGroups(x, y, numpy.zeros(n, dtype=int), 1)
+            self.assertTrue(numpy.array_equal(fits[0], qaAnaUtil.robustPolyFit(x, y, 1)))
+
+    def testEmpty(self):
+        fits = qaAnaUtil.robustPolyFitGroups([], [], [], 1, nGroup=2)
+        self.assertEqual(fits.shape, (2, 4))
+        self.assertTrue(numpy.isnan(fits).all())
+
+#####
+
+def suite():
+    """Returns a suite containing all the test cases in this module."""
+    tests.init()
+
+    suites = []
+    suites += unittest.makeSuite(RobustPolyFitGroupsTestCases)
+    suites += unittest.makeSuite(tests.MemoryTestCase)
+    return unittest.TestSuite(suites)
+
+def run(doExit=False):
+    """Run the tests"""
+    tests.run(suite(), doExit)
+
+if __name__ == "__main__":
+    run(True)
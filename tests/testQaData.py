@@ -0,0 +1,145 @@
+import unittest
+import numpy
+import lsst.utils.tests as tests
+from lsst.testing.pipeQA.QaData import QaData
+from fakeQaData import FakeSource, FakeCatalog
+
+class FlagMaskTestCases(unittest.TestCase):
+
+    def setUp(self):
+        numpy.random.seed(9)
+        self.data = QaData.__new__(QaData)
+        for flag in ("intc", "satc", "edg", "nchild", "neg", "bad"):
+            setattr(self.data, "k_" + flag, flag)
+        self.data.flagMaskCache = {}
+        self.data.derivedCache = {}
+
+        self.sources = []
+        for i in range(500):
+            values = {}
+            for flag in ("intc", "satc", "edg", "neg", "bad"):
+                values[flag] = int(numpy.random.uniform() < 0.05)
+            values["nchild"] = numpy.random.choice([0, 0, 0, 2])
+            self.sources.append(FakeSource(values))
+
+    def testDefault(self):
+        mask = self.data.getFlagMask(self.sources)
+        self.assertEqual(mask.dtype, bool)
+        self.assertEqual(list(mask), [bool(self.data.isFlagged(s)) for s in self.sources])
+        self.assertTrue(numpy.array_equal(mask, self.data.isFlaggedArray(self.sources)))
+
+    def testNonContiguous(self):
+        # a catalog built row by row can't hand out columns; its records are read one by one
+        catalog = FakeCatalog(self.sources, contiguous=False)
+        self.assertTrue(numpy.array_equal(self.data.getColumn(catalog, "edg"),
+                                          [s.get("edg") for s in self.sources]))
+        self.assertTrue(numpy.array_equal(self.data.getFlagMask(catalog), self.data.getFlagMask(self.sources)))
+
+    def testFlags(self):
+        mask = self.data.getFlagMask(self.sources, ["edg", "bad"])
+        expected = [s.get("edg") != 0 or s.get("bad") != 0 for s in self.sources]
+        self.assertEqual(list(mask), expected)
+        self.assertFalse(self.data.getFlagMask(self.sources, []).any())
+
+    def testCache(self):
+        catalog = FakeCatalog(self.sources)
+        mask = self.data.getFlagMask(catalog, ["intc", "nchild"], cacheKey=("ccd1", "src"))
+        nGet = catalog.nGet
+        self.assertTrue(self.data.getFlagMask(catalog, ["intc", "nchild"], cacheKey=("ccd1", "src")) is mask)
+        self.assertEqual(catalog.nGet, nGet)
+
+        # a different set of flags is a different mask
+        other = self.data.getFlagMask(catalog, ["satc"], cacheKey=("ccd1", "src"))
+        self.assertTrue(catalog.nGet > nGet)
+        self.assertFalse(numpy.array_equal(mask, other))
+
+        # a catalog of a different length isn't given a stale mask
+        short = self.data.getFlagMask(self.sources[:100], ["intc", "nchild"], cacheKey=("ccd1", "src"))
+        self.assertEqual(len(short), 100)
+        self.assertTrue(numpy.array_equal(short, mask[:100]))
+
+    def testSameSources(self):
+        # lists of the same records (eg. built by two tasks from one matchList) share a mask
+        key = ("ccd1", "matched")
+        mask = self.data.getFlagMask(list(self.sources), cacheKey=key)
+        self.assertTrue(self.data.getFlagMask(list(self.sources), cacheKey=key) is mask)
+
+        # but a list of other records, even of the same length, doesn't
+        others = list(reversed(self.sources))
+        reversedMask = self.data.getFlagMask(others, cacheKey=key)
+        self.assertTrue(numpy.array_equal(reversedMask, mask[::-1]))
+        self.assertTrue(numpy.array_equal(self.data.getNamedColumn(others, "intc", key),
+                                          self.data.getColumn(others, "intc")))
+
+class DerivedColumnTestCases(unittest.TestCase):
+
+    def setUp(self):
+        numpy.random.seed(10)
+        self.data = QaData.__new__(QaData)
+        for name in ("Psf", "PsfE", "ext"):
+            setattr(self.data, "k_" + name, name)
+        self.data.derivedCache = {}
+
+        sources = []
+        for i in range(300):
+            sources.append(FakeSource({"Psf": numpy.random.uniform(-10.0, 1000.0),
+                                       "PsfE": numpy.random.uniform(1.0, 10.0),
+                                       "ext": numpy.random.choice([0.0, 1.0])}))
+        self.catalog = FakeCatalog(sources)
+
+    def testValues(self):
+        with numpy.errstate(invalid='ignore'):
+            for s, mag, magErr, star, counts in zip(self.catalog,
+                                                    self.data.getMagColumn(self.catalog, "Psf"),
+                                                    self.data.getMagErrColumn(self.catalog, "Psf"),
+                                                    self.data.getStarMask(self.catalog),
+                                                    self.data.getUncalibratedFluxColumn(self.catalog, "Psf", 3.0)):
+                flux = s.get("Psf")
+                if flux > 0:
+                    self.assertEqual(mag, -2.5*numpy.log10(flux))
+                else:
+                    self.assertTrue(numpy.isnan(mag))
+                self.assertEqual(magErr, 2.5 / numpy.log(10.0) * s.get("PsfE") / flux)
+                self.assertEqual(star, s.get("ext") == 0)
+                self.assertEqual(counts, flux*3.0)
+
+    def testCache(self):
+        key = ("ccd1", "src")
+        mag = self.data.getMagColumn(self.catalog, "Psf", key)
+        nGet = self.catalog.nGet
+        self.assertEqual(nGet, 1)
+
+        # the flux column behind the magnitudes is shared, and nothing is computed twice
+        self.assertTrue(self.data.getMagColumn(self.catalog, "Psf", key) is mag)
+        self.data.getNamedColumn(self.catalog, "Psf", key)
+        self.data.getUncalibratedFluxColumn(self.catalog, "Psf", 2.0, key)
+        self.assertEqual(self.catalog.nGet, nGet)
+
+        # other sources under another key, or a different fmag0, are separate
+        self.assertFalse(self.data.getMagColumn(self.catalog, "Psf", ("ccd2", "src")) is mag)
+        self.assertFalse(self.data.getUncalibratedFluxColumn(self.catalog, "Psf", 4.0, key) is
+                         self.data.getUncalibratedFluxColumn(self.catalog, "Psf", 2.0, key))
+
+        # after clearCache() (which empties derivedCache) the columns are read again
+        self.data.derivedCache.clear()
+        self.assertFalse(self.data.getMagColumn(self.catalog, "Psf", key) is mag)
+        self.assertTrue(self.catalog.nGet > nGet)
+
+#####
+
+def suite():
+    """Returns a suite containing all the test cases in this module."""
+    tests.init()
+
+    suites = []
+    suites += unittest.makeSuite(FlagMaskTestCases)
+    suites += unittest.makeSuite(DerivedColumnTestCases)
+    suites += unittest.makeSuite(tests.MemoryTestCase)
+    return unittest.TestSuite(suites)
+
+def run(doExit=False):
+    """Run the tests"""
+    tests.run(suite(), doExit)
+
+if __name__ == "__main__":
+    run(True)
@@ -0,0 +1,95 @@
+import unittest
+import numpy
+import lsst.utils.tests as tests
+import lsst.testing.pipeQA.analysis.RaftCcdData as raftCcdData
+
+class FakeId(object):
+    def __init__(self, name):
+        self.name = name
+    def getName(self):
+        return self.name
+
+class FakeDetector(object):
+    def __init__(self, raft, ccd):
+        self.raft = FakeRaft(raft)
+        self.ccd = ccd
+    def getParent(self):
+        return self.raft
+    def getId(self):
+        return FakeId(self.ccd)
+
+class FakeRaft(object):
+    def __init__(self, raft):
+        self.raft = raft
+    def getId(self):
+        return FakeId(self.raft)
+
+class RaftCcdVectorTestCases(unittest.TestCase):
+    """Check that the buffered RaftCcdVector gives what numpy.append always did."""
+
+    def setUp(self):
+        self.detector = dict([(i, FakeDetector("R0", "C%d" % i)) for i in range(3)])
+
+    def testAppend(self):
+        vec = raftCcdData.RaftCcdVector(self.detector)
+        expected = numpy.array([])
+        for i in range(100):
+            vec.append("R0", "C0", 0.5*i)
+            expected = numpy.append(expected, 0.5*i)
+            if i % 37 == 0:
+                self.assertTrue(numpy.all(vec.get("R0", "C0") == expected))
+        vec.append("R0", "C0", True)
+        vec.extend("R0", "C0", numpy.arange(5))
+        expected = numpy.append(numpy.append(expected, True), numpy.arange(5))
+
+        got = vec.get("R0", "C0")
+        self.assertEqual(got.dtype, expected.dtype)
+        self.assertTrue(numpy.all(got == expected))
+        self.assertEqual(len(vec.get("R0", "C1")), 0)
+        self.assertEqual(len(vec.getValues()), len(expected))
+        self.assertEqual(vec.summarize('max'), 99*0.5)
+
+    def testStrings(self):
+        vec = raftCcdData.RaftCcdVector(self.detector)
+        expected = numpy.array([])
+        for i in range(20):
+            vec.append("R0", "C1", str(10**i))
+            expected = numpy.append(expected, str(10**i))
+        self.assertEqual(list(vec.get("R0", "C1")), list(expected))
+
+    def testSet(self):
+        vec = raftCcdData.RaftCcdVector(self.detector)
+        vec.append("R0", "C2", 1.0)
+        vec.set("R0", "C2", numpy.array([3.0, 4.0]))
+        vec.append("R0", "C2", 5.0)
+        self.assertEqual(list(vec.get("R0", "C2")), [3.0, 4.0, 5.0])
+
+    def testListKeysAndValues(self):
+        vec = raftCcdData.RaftCcdVector(self.detector)
+        vec.extend("R0", "C0", [1.0, 2.0, 3.0, 100.0])
+        vec.extend("R0", "C2", [5.0, numpy.NaN])
+        kv = vec.listKeysAndValues('median')
+        self.assertEqual([k[1] for k in kv], ["C0", "C1", "C2"])
+        self.assertEqual([k[2] for k in kv[::2]], [2.5, 5.0])
+        self.assertEqual([k[3] for k in kv], [4, 0, 1])
+        self.assertTrue(numpy.isnan(kv[1][2]))
+        self.assertEqual(vec.listKeysAndValues('median', nLowest=2)[0][2], 1.5)
+        self.assertEqual(vec.listKeysAndValues('mean', limits=[0.0, 50.0])[0][2], 2.0)
+
+#####
+
+def suite():
+    """Returns a suite containing all the test cases in this module."""
+    tests.init()
+
+    suites = []
+    suites += unittest.makeSuite(RaftCcdVectorTestCases)
+    suites += unittest.makeSuite(tests.MemoryTestCase)
+    return unittest.TestSuite(suites)
+
+def run(doExit=False):
+    """Run the tests"""
+    tests.run(suite(), doExit)
+
+if __name__ == "__main__":
+    run(True)
@@ -0,0 +1,80 @@
+import unittest
+import numpy
+import lsst.utils.tests as tests
+import lsst.testing.pipeQA.analysis.Repeatability as repeatability
+
+class RepeatabilityTestCases(unittest.TestCase):
+    """Check the streaming statistics against those of all the values at once."""
+
+    def setUp(self):
+        numpy.random.seed(9)
+        nObj, nVisit = 400, 12
+        self.mags = numpy.random.uniform(15.0, 24.0, nObj)
+        self.visits = []
+        for v in range(nVisit):
+            ids = numpy.where(numpy.random.uniform(size=nObj) < 0.7)[0]
+            numpy.random.shuffle(ids)
+            values = 0.01*v + numpy.random.normal(0.0, 0.02, len(ids))
+            mags = self.mags[ids] + numpy.random.normal(0.0, 0.01, len(ids))
+            self.visits.append((ids + 1000, values, mags))
+
+        self.acc = repeatability.RepeatabilityAccumulator()
+        for ids, values, mags in self.visits:
+            self.acc.add(ids, values, mags)
+
+    def testObjects(self):
+        stats = self.acc.objectStats(minVisits=2)
+        self.assertTrue(len(stats['id']) > 300)
+        for k in range(0, len(stats['id']), 17):
+            id = stats['id'][k]
+            values = numpy.array([v[numpy.where(i == id)[0]][0] for i, v, m in self.visits if id in i])
+            mags = numpy.array([m[numpy.where(i == id)[0]][0] for i, v, m in self.visits if id in i])
+            self.assertEqual(stats['n'][k], len(values))
+            self.assertAlmostEqual(stats['mean'][k], values.mean(), 12)
+            self.assertAlmostEqual(stats['stdev'][k], values.std(ddof=1), 12)
+            self.assertAlmostEqual(stats['mag'][k], mags.mean(), 10)
+
+    def testBins(self):
+        values = numpy.concatenate([v for i, v, m in self.visits])
+        mags = numpy.concatenate([m for i, v, m in self.visits])
+        stats = self.acc.binStats()
+        for b in range(len(stats['n'])):
+            inBin = (mags >= stats['magLo'][b]) & (mags < stats['magHi'][b])
+            self.assertEqual(stats['n'][b], inBin.sum())
+            if inBin.sum() > 1:
+                self.assertAlmostEqual(stats['mean'][b], values[inBin].mean(), 12)
+                self.assertAlmostEqual(stats['stdev'][b], values[inBin].std(ddof=1), 12)
+            elif inBin.sum() == 0:
+                self.assertTrue(numpy.isnan(stats['mean'][b]))
+
+    def testRepeatability(self):
+        rms, n = self.acc.repeatability(20.0)
+        stats = self.acc.objectStats()
+        self.assertEqual(n, (stats['mag'] < 20.0).sum())
+        # the visit-to-visit scatter is sqrt(0.02**2 + the spread of the 0.01*v offsets)
+        self.assertTrue(0.02 < rms < 0.05)
+        self.assertEqual(self.acc.nVisit, len(self.visits))
+
+        rms, n = self.acc.repeatability(20.0, magMin=18.0)
+        self.assertEqual(n, ((stats['mag'] > 18.0) & (stats['mag'] < 20.0)).sum())
+
+    def testDuplicates(self):
+        self.assertRaises(ValueError, self.acc.add, [1, 2, 1], [0.0, 0.0, 0.0], [20.0, 20.0, 20.0])
+
+#####
+
+def suite():
+    """Returns a suite containing all the test cases in this module."""
+    tests.init()
+
+    suites = []
+    suites += unittest.makeSuite(RepeatabilityTestCases)
+    suites += unittest.makeSuite(tests.MemoryTestCase)
+    return unittest.TestSuite(suites)
+
+def run(doExit=False):
+    """Run the tests"""
+    tests.run(suite(), doExit)
+
+if __name__ == "__main__":
+    run(True)
@@ -0,0 +1,77 @@
+import os
+import shutil
+import tempfile
+import unittest
+import lsst.utils.tests as tests
+import lsst.testing.pipeQA.analysis.ShardUtils as shardUtil
+
+class ShardUtilsTestCases(unittest.TestCase):
+    """Check that (visit,ccd) units are split deterministically and evenly."""
+
+    def setUp(self):
+        self.keys = ["visit%d-ccd%d" % (v, c) for v in range(7) for c in range(10)]
+        self.shardDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.shardDir)
+
+    def testParse(self):
+        self.assertEqual(shardUtil.parseShard("3/8"), (3, 8))
+        for bad in ("8/8", "1", "-1/2", "a/b"):
+            self.assertRaises(ValueError, shardUtil.parseShard, bad)
+
+    def testBalancedByCount(self):
+        nShard = 4
+        assignment = shardUtil.assignShards(self.keys, nShard)
+        self.assertEqual(sorted(assignment.keys()), sorted(self.keys))
+        counts = [assignment.values().count(i) for i in range(nShard)]
+        self.assertTrue(max(counts) - min(counts) <= 1)
+
+        # the order the units are found in must not matter
+        self.assertEqual(shardUtil.assignShards(list(reversed(self.keys)), nShard), assignment)
+
+    def testBalancedByCost(self):
+        nShard = 3
+        costs = dict([(k, 1.0 + 10.0*(i % 5 == 0)) for i, k in enumerate(self.keys)])
+        assignment = shardUtil.assignShards(self.keys, nShard, costs)
+        loads = [sum([costs[k] for k in self.keys if assignment[k] == i]) for i in range(nShard)]
+        self.assertTrue(max(loads) - min(loads) <= max(costs.values()))
+
+        # dispatch order: most expensive first, and independent of input order
+        order = shardUtil.orderByCost(self.keys, costs)
+        self.assertEqual([costs[k] for k in order], sorted(costs.values(), reverse=True))
+        self.assertEqual(shardUtil.orderByCost(list(reversed(self.keys)), costs), order)
+
+    def testVerify(self):
+        nShard = 2
+        assignment = shardUtil.assignShards(self.keys, nShard)
+        units = [[k for k in self.keys if assignment[k] == i] for i in range(nShard)]
+
+        self.assertEqual(len(shardUtil.verifyShards(self.shardDir, nShard)), nShard)
+
+        shardUtil.writeShardRecord(self.shardDir, 0, nShard, units[0], units[0], [], {}, True)
+        shardUtil.writeShardRecord(self.shardDir, 1, nShard, units[1], units[1][1:], [], {}, False)
+        self.assertEqual(len(shardUtil.verifyShards(self.shardDir, nShard)), 1)
+
+        times = dict([(k, 2.0) for k in units[1]])
+        shardUtil.writeShardRecord(self.shardDir, 1, nShard, units[1], units[1][1:], units[1][:1], times, True)
+        self.assertEqual(shardUtil.verifyShards(self.shardDir, nShard), [])
+        self.assertEqual(shardUtil.loadCosts(self.shardDir), times)
+
+#####
+
+def suite():
+    """Returns a suite containing all the test cases in this module."""
+    tests.init()
+
+    suites = []
+    suites += unittest.makeSuite(ShardUtilsTestCases)
+    suites += unittest.makeSuite(tests.MemoryTestCase)
+    return unittest.TestSuite(suites)
+
+def run(doExit=False):
+    """Run the tests"""
+    tests.run(suite(), doExit)
+
+if __name__ == "__main__":
+    run(True)
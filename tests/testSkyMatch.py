@@ -0,0 +1,84 @@
+import unittest
+import numpy
+import lsst.utils.tests as tests
+import lsst.testing.pipeQA.analysis.SkyMatch as skyMatch
+
+def separation(ra1, dec1, ra2, dec2):
+    """Angular separation (arcsec) of positions in degrees."""
+    ra1, dec1, ra2, dec2 = [numpy.radians(v) for v in (ra1, dec1, ra2, dec2)]
+    h = numpy.sin(0.5*(dec2 - dec1))**2 + numpy.cos(dec1)*numpy.cos(dec2)*numpy.sin(0.5*(ra2 - ra1))**2
+    return numpy.degrees(2.0*numpy.arcsin(numpy.sqrt(h)))*3600.0
+
+class SkyMatchTestCases(unittest.TestCase):
+    """Check the bucketed matcher against brute force."""
+
+    def makeCatalogs(self, ra0, dec0, n=1500):
+        numpy.random.seed(8)
+        # a ccd-sized field (0.2 deg), and the same stars, jittered, in a second visit
+        ra1 = ra0 + numpy.random.uniform(-0.1, 0.1, n)/numpy.cos(numpy.radians(dec0))
+        dec1 = dec0 + numpy.random.uniform(-0.1, 0.1, n)
+        keep = numpy.random.uniform(size=n) < 0.8
+        ra2 = (ra1 + numpy.random.normal(0.0, 0.2/3600.0, n)/numpy.cos(numpy.radians(dec1)))[keep]
+        dec2 = (dec1 + numpy.random.normal(0.0, 0.2/3600.0, n))[keep]
+        # and some extra detections
+        ra2 = numpy.concatenate([ra2, ra0 + numpy.random.uniform(-0.1, 0.1, 300)/numpy.cos(numpy.radians(dec0))])
+        dec2 = numpy.concatenate([dec2, dec0 + numpy.random.uniform(-0.1, 0.1, 300)])
+        return ra1 % 360.0, dec1, ra2 % 360.0, dec2
+
+    def bruteForce(self, ra1, dec1, ra2, dec2, radius):
+        pairs = []
+        for i in range(len(ra1)):
+            d = separation(ra1[i], dec1[i], ra2, dec2)
+            for j in numpy.where(d <= radius)[0]:
+                pairs.append((i, j))
+        return pairs
+
+    def testAllPairs(self):
+        radius = 5.0
+        for ra0, dec0 in [(150.0, 2.0), (0.0, -30.0), (75.0, 88.0)]:
+            ra1, dec1, ra2, dec2 = self.makeCatalogs(ra0, dec0)
+            idx1, idx2, dist = skyMatch.matchPositions(ra1, dec1, ra2, dec2, radius, unique=False)
+            expected = self.bruteForce(ra1, dec1, ra2, dec2, radius)
+            self.assertTrue(len(expected) > len(ra1)/2)
+            self.assertEqual(sorted(zip(idx1, idx2)), sorted(expected))
+            self.assertTrue(numpy.allclose(dist, separation(ra1[idx1], dec1[idx1], ra2[idx2], dec2[idx2]),
+                                           atol=1.0e-4))
+
+    def testUnique(self):
+        radius = 2.0
+        ra1, dec1, ra2, dec2 = self.makeCatalogs(0.0, 10.0)
+        idx1, idx2, dist = skyMatch.matchPositions(ra1, dec1, ra2, dec2, radius)
+        self.assertEqual(len(set(idx1)), len(idx1))
+        self.assertEqual(len(set(idx2)), len(idx2))
+        self.assertTrue(numpy.all(numpy.diff(idx1) > 0))
+        # each pair is mutually nearest
+        for i, j in zip(idx1, idx2):
+            self.assertEqual(numpy.argmin(separation(ra1[i], dec1[i], ra2, dec2)), j)
+            self.assertEqual(numpy.argmin(separation(ra1, dec1, ra2[j], dec2[j])), i)
+        # the jittered copies (80% of the stars) are nearly all found
+        self.assertTrue(len(idx1) > 0.75*len(ra1))
+
+    def testEmpty(self):
+        idx1, idx2, dist = skyMatch.matchPositions([], [], [1.0], [1.0], 1.0)
+        self.assertEqual(len(idx1), 0)
+        idx1, idx2, dist = skyMatch.matchPositions([1.0, numpy.NaN], [1.0, 1.0], [1.0], [1.0], 1.0)
+        self.assertEqual(list(idx1), [0])
+        self.assertEqual(list(idx2), [0])
+
+#####
+
+def suite():
+    """Returns a suite containing all the test cases in this module."""
+    tests.init()
+
+    suites = []
+    suites += unittest.makeSuite(SkyMatchTestCases)
+    suites += unittest.makeSuite(tests.MemoryTestCase)
+    return unittest.TestSuite(suites)
+
+def run(doExit=False):
+    """Run the tests"""
+    tests.run(suite(), doExit)
+
+if __name__ == "__main__":
+    run(True)
@@ -0,0 +1,83 @@
+import os
+import tempfile
+import unittest
+import sqlite3
+import lsst.utils.tests as tests
+import lsst.testing.pipeQA.SqliteDatabaseQuery as sqliteQuery
+
+class SqliteDbInterfaceTestCases(unittest.TestCase):
+    """Check that the MySQL+scisql queries used by DbQaData are served from sqlite."""
+
+    def setUp(self):
+        fd, self.dbFile = tempfile.mkstemp(suffix=".sqlite3")
+        os.close(fd)
+
+        db = sqlite3.connect(self.dbFile)
+        db.execute("create table RefObject (refObjectId INTEGER, isStar INTEGER, ra DOUBLE, decl DOUBLE)")
+        db.execute("create table Science_Ccd_Exposure (visit INTEGER, " +
+                   ", ".join(["corner%d%s DOUBLE" % (i, c) for i in range(1, 5) for c in ("Ra", "Decl")]) +
+                   ", expMidpt DATETIME)")
+
+        # a grid of reference objects straddling ra=0
+        self.refs = []
+        i = 0
+        for ra in [359.5 + 0.05*j for j in range(21)]:
+            for dec in [-0.5 + 0.05*j for j in range(21)]:
+                self.refs.append((i, 1, ra % 360.0, dec))
+                i += 1
+        db.executemany("insert into RefObject values (?, ?, ?, ?)", self.refs)
+        db.execute("insert into Science_Ccd_Exposure values " +
+                   "(1, 359.83, -0.17, 0.17, -0.17, 0.17, 0.17, 359.83, 0.17, '2012-07-06 18:35:55')")
+        db.commit()
+        db.close()
+
+        self.dbInterface = sqliteQuery.SqliteDbInterface(sqliteQuery.DatabaseIdentity(self.dbFile))
+
+    def tearDown(self):
+        del self.dbInterface
+        os.unlink(self.dbFile)
+
+    def testShowColumns(self):
+        columns = [r[0] for r in self.dbInterface.execute("show columns from RefObject;")]
+        self.assertEqual(columns, ["refObjectId", "isStar", "ra", "decl"])
+
+    def testPointInPoly(self):
+        sql  = 'SELECT scisql_s2CPolyToBin('
+        sql += '   sce.corner1Ra, sce.corner1Decl, sce.corner2Ra, sce.corner2Decl, '
+        sql += '   sce.corner3Ra, sce.corner3Decl, sce.corner4Ra, sce.corner4Decl) '
+        sql += 'FROM Science_Ccd_Exposure as sce WHERE (sce.visit = 1) INTO @poly; '
+        self.assertEqual(self.dbInterface.execute(sql), [])
+        self.assertEqual(self.dbInterface.execute("CALL scisql.scisql_s2CPolyRegion(@poly, 20);"), [])
+
+        sql2 = 'SELECT sro.refObjectId FROM RefObject AS sro '
+        sql2 += 'WHERE (scisql_s2PtInCPoly(sro.ra, sro.decl, @poly) = 1) '
+        self.assertTrue(self.dbInterface.translate(sql2)[0].find("RefObject_rtree") > 0)
+        found = sorted([r[0] for r in self.dbInterface.execute(sql2)])
+
+        # the polygon edges are within 1e-5 deg of ra,dec = +/-0.17 and no grid point is that close
+        expected = sorted([r[0] for r in self.refs
+                           if (r[2] > 359.83 or r[2] < 0.17) and abs(r[3]) < 0.17])
+        self.assertEqual(found, expected)
+        self.assertEqual(len(found), 49)
+
+    def testDateTime(self):
+        expMidpt = self.dbInterface.execute("select expMidpt from Science_Ccd_Exposure")[0][0]
+        self.assertEqual(expMidpt.strftime("%Y-%m-%d"), "2012-07-06")
+
+#####
+
+def suite():
+    """Returns a suite containing all the test cases in this module."""
+    tests.init()
+
+    suites = []
+    suites += unittest.makeSuite(SqliteDbInterfaceTestCases)
+    suites += unittest.makeSuite(tests.MemoryTestCase)
+    return unittest.TestSuite(suites)
+
+def run(doExit=False):
+    """Run the tests"""
+    tests.run(suite(), doExit)
+
+if __name__ == "__main__":
+    run(True)
@@ -0,0 +1,78 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+import lsst.utils.tests as tests
+from lsst.testing.pipeQA.Tracer import Tracer
+
+class TracerTestCases(unittest.TestCase):
+    """Check the spans recorded for --trace, and the files written from them."""
+
+    def setUp(self):
+        self.tracer = Tracer()
+        self.tracer.enable()
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def testDisabled(self):
+        tracer = Tracer()
+        func = lambda x: x + 1
+        self.assertTrue(tracer.wrap(func, "f", "task") is func)
+        tracer.complete("f", "task", 0.0, 1.0)
+        self.assertEqual(tracer.events, [])
+
+    def testFolded(self):
+        # ccd [0,10] contains load [1,4] (which contains sql [2,3]) and test [5,9]
+        self.tracer.complete("ccd", "ccd", 0.0, 10.0)
+        self.tracer.complete("Loading SourceSets", "load", 1.0, 4.0)
+        self.tracer.complete("sql", "sql", 2.0, 3.0, sql="select 1")
+        self.tracer.complete("test", "task", 5.0, 9.0)
+
+        pid = "pid%d" % (os.getpid())
+        stacks = self.tracer.foldedStacks()
+        self.assertEqual(stacks, {
+            pid + ";ccd" : 3.0e6,
+            pid + ";ccd;Loading_SourceSets" : 2.0e6,
+            pid + ";ccd;Loading_SourceSets;sql" : 1.0e6,
+            pid + ";ccd;test" : 4.0e6,
+            })
+
+        filename = os.path.join(self.dir, "trace.json")
+        self.tracer.writeChromeTrace(filename)
+        events = json.load(open(filename))['traceEvents']
+        self.assertEqual(len(events), 4)
+        self.assertEqual(events[2]['args']['sql'], "select 1")
+
+    def testAbsorb(self):
+        worker = Tracer()
+        worker.enable()
+        traced = worker.wrap(lambda x: x + 1, "butler.get", "butler", nameArg=True)
+        self.assertEqual(traced(1), 2)
+        self.assertEqual(worker.events[0]['name'], "butler.get 1")
+        worker.saveEvents(os.path.join(self.dir, "trace.worker1"))
+
+        self.tracer.complete("ccd", "ccd", 0.0, 1.0)
+        self.tracer.absorb(os.path.join(self.dir, "trace.worker*"))
+        self.assertEqual(len(self.tracer.events), 2)
+        self.assertEqual(os.listdir(self.dir), [])
+
+#####
+
+def suite():
+    """Returns a suite containing all the test cases in this module."""
+    tests.init()
+
+    suites = []
+    suites += unittest.makeSuite(TracerTestCases)
+    suites += unittest.makeSuite(tests.MemoryTestCase)
+    return unittest.TestSuite(suites)
+
+def run(doExit=False):
+    """Run the tests"""
+    tests.run(suite(), doExit)
+
+if __name__ == "__main__":
+    run(True)
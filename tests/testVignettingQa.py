@@ -0,0 +1,122 @@
+import unittest
+import numpy
+import lsst.utils.tests as tests
+import lsst.testing.pipeQA.analysis.RadialProfile as radialProfile
+from lsst.testing.pipeQA.analysis.VignettingQaTask import VignettingQaTask
+from fakeQaData import FakeSource, FakeData, FakeConfig
+
+class RadialProfileTestCases(unittest.TestCase):
+
+    def testRadius(self):
+        x = numpy.array([0.0, 3.0, 10.0])
+        y = numpy.array([0.0, 4.0, -5.0])
+        r = radialProfile.focalPlaneRadius(x, y, -3.0, -4.0)
+        self.assertTrue(numpy.allclose(r, [5.0, 0.0, numpy.hypot(7.0, 9.0)]))
+        r = radialProfile.focalPlaneRadius(x, y, 0.0, 0.0, scale=2.0)
+        self.assertTrue(numpy.allclose(r, [0.0, 10.0, 2.0*numpy.hypot(10.0, 5.0)]))
+
+    def testProfile(self):
+        numpy.random.seed(3)
+        radius = numpy.random.uniform(0.0, 100.0, 20000)
+        values = 1.0e-3*radius + numpy.random.normal(0.0, 0.01, len(radius))
+        values[::50] = 5.0   # outliers
+        profile = radialProfile.radialProfile(radius, values, nBins=10, rMax=100.0)
+
+        self.assertTrue(numpy.allclose(profile['radius'], numpy.arange(5.0, 100.0, 10.0)))
+        self.assertEqual(profile['npoint'].sum(), len(radius))
+        for i in range(10):
+            sel = (radius >= 10.0*i) & (radius < 10.0*(i + 1))
+            self.assertEqual(profile['npoint'][i], sel.sum())
+            self.assertAlmostEqual(profile['median'][i], numpy.median(values[sel]), 12)
+        self.assertTrue(numpy.allclose(profile['median'], 1.0e-3*profile['radius'], atol=0.003))
+        self.assertTrue(numpy.allclose(profile['stdev'], 0.01, rtol=0.15))
+
+    def testEmptyBins(self):
+        profile = radialProfile.radialProfile([1.0, numpy.NaN, 200.0], [0.1, 0.2, 0.3], nBins=4, rMax=100.0)
+        self.assertEqual(list(profile['npoint']), [1, 0, 0, 0])
+        self.assertTrue(numpy.isnan(profile['median'][1:]).all())
+
+
+class VignettingQaTestCases(unittest.TestCase):
+    """Check that the columnar offsets are exactly those of the match-by-match loop."""
+
+    def setUp(self):
+        numpy.random.seed(17)
+        self.data = FakeData()
+        self.matchList = []
+        for i in range(3000):
+            values = {"k_ext": float(numpy.random.uniform() < 0.3),
+                      "k_intc": int(numpy.random.uniform() < 0.05), "k_satc": 0, "k_edg": 0, "k_nchild": 0,
+                      "k_x": numpy.random.uniform(0.0, 2048.0), "k_y": numpy.random.uniform(0.0, 4096.0)}
+            for k in ("k_Psf", "k_Ap"):
+                values[k] = numpy.random.lognormal(3.0, 2.0)*(-1.0 if numpy.random.uniform() < 0.05 else 1.0)
+            if i % 97 == 0:
+                values["k_Ap"] = numpy.NaN
+            s = FakeSource(values, id=2**40 + i)
+            sref = FakeSource({"k_rPsf": numpy.random.lognormal(3.0, 2.0)*(-1.0 if i % 41 == 0 else 1.0)}, id=i)
+            self.matchList.append([sref, s, 0.0])
+
+    def loop(self, maxMag, startX, startY):
+        # the match-by-match calculation from the original test()
+        data = self.data
+        dmags, ids, radii = [], [], []
+        for sref, s, dist in self.matchList:
+            if s.getD(data.k_ext):
+                continue
+            f1 = s.getD(data.k_Ap)
+            f2 = sref.getD(data.k_rPsf)
+            if (f1 > 0.0 and f2 > 0.0  and not data.isFlagged(s)):
+                m1 = -2.5*numpy.log10(f1)
+                m2 = -2.5*numpy.log10(f2)
+                if m2 > maxMag:
+                    continue
+                if numpy.isfinite(m1) and numpy.isfinite(m2):
+                    dmags.append(m1 - m2)
+                    ids.append(s.getId())
+                    xmm     = startX + s.getD(data.k_x)
+                    ymm     = startY + s.getD(data.k_y)
+                    radii.append(numpy.sqrt(xmm**2 + ymm**2))
+        return dmags, ids, radii
+
+    def testIdentical(self):
+        task = VignettingQaTask.__new__(VignettingQaTask)
+        task.config = FakeConfig()
+        task.magType1, task.magType2 = "ap", "cat"
+        mags = []
+        for sref, s, dist in self.matchList:
+            flux = s.getD(self.data.k_Psf)
+            if numpy.isfinite(flux) and not s.getD(self.data.k_ext):
+                mags.append(-2.5*numpy.log10(flux))
+        medMag = task._getMedianMag(self.data, self.matchList)
+        self.assertTrue(numpy.array_equal(numpy.median(mags), medMag) or
+                        (numpy.isnan(numpy.median(mags)) and numpy.isnan(medMag)))
+
+        task.maxMag = -5.0
+
+        startX, startY = -10240.0, 2048.0
+        dmags, ids, radii = self.loop(task.maxMag, startX, startY)
+        cols = task._getOffsetColumns(self.data, self.matchList, startX, startY)
+        self.assertTrue(len(dmags) > 100)
+        self.assertTrue(numpy.array_equal(numpy.array(dmags), cols['dmag']))
+        self.assertTrue(numpy.array_equal(numpy.array(radii), cols['radius']))
+        self.assertEqual(cols['ids'].dtype, numpy.int64)
+        self.assertEqual(list(cols['ids']), ids)
+
+#####
+
+def suite():
+    """Returns a suite containing all the test cases in this module."""
+    tests.init()
+
+    suites = []
+    suites += unittest.makeSuite(RadialProfileTestCases)
+    suites += unittest.makeSuite(VignettingQaTestCases)
+    suites += unittest.makeSuite(tests.MemoryTestCase)
+    return unittest.TestSuite(suites)
+
+def run(doExit=False):
+    """Run the tests"""
+    tests.run(suite(), doExit)
+
+if __name__ == "__main__":
+    run(True)
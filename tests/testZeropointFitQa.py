@@ -0,0 +1,89 @@
+import unittest
+import numpy
+import lsst.utils.tests as tests
+from lsst.testing.pipeQA.analysis.ZeropointFitQaTask import ZeropointFitQaTask
+from fakeQaData import FakeSource, FakeData, FakeConfig
+
+class ZeropointFitQaTestCases(unittest.TestCase):
+    """Check that the columnar magnitudes are exactly those of the match-by-match loop."""
+
+    def setUp(self):
+        numpy.random.seed(11)
+        self.data = FakeData()
+        self.matchList = []
+        self.orphans = []
+        for i in range(2000):
+            values = {"k_ext": float(numpy.random.uniform() < 0.3),
+                      "k_intc": int(numpy.random.uniform() < 0.05), "k_satc": 0, "k_edg": 0, "k_nchild": 0}
+            for k in ("k_Psf", "k_PsfE", "k_Ap", "k_ApE"):
+                values[k] = numpy.random.lognormal(3.0, 2.0)*(-1.0 if numpy.random.uniform() < 0.05 else 1.0)
+            if i % 97 == 0:
+                values["k_Psf"] = numpy.NaN
+            s = FakeSource(values)
+            sref = FakeSource({"k_rPsf": numpy.random.lognormal(3.0, 2.0)*(-1.0 if i % 41 == 0 else 1.0)})
+            self.matchList.append([sref, s, 0.0])
+            self.orphans.append(FakeSource(dict(values)))
+
+    def loop(self, fluxType, fmag0):
+        # the match-by-match calculation from the original test()
+        data = self.data
+        stars, galaxies = [], []
+        for sref, s, dist in self.matchList:
+            if fluxType == "psf":
+                fref, f, ferr = sref.getD(data.k_rPsf), s.getD(data.k_Psf), s.getD(data.k_PsfE)
+            else:
+                fref, f, ferr = sref.getD(data.k_rPsf), s.getD(data.k_Ap), s.getD(data.k_ApE)
+            f *= fmag0
+            if (fref > 0.0 and f > 0.0 and not data.isFlagged(s)):
+                mrefmag  = -2.5*numpy.log10(fref)
+                mimgmag  = -2.5*numpy.log10(f)
+                mimgmerr =  2.5 / numpy.log(10.0) * ferr / f
+                star = 0 if s.getD(data.k_ext) else 1
+                if numpy.isfinite(mrefmag) and numpy.isfinite(mimgmag):
+                    if star:
+                        stars.append((mrefmag, mimgmag, mimgmerr))
+                    else:
+                        galaxies.append((mrefmag, mimgmag, mimgmerr))
+        orphans = []
+        for orphan in self.orphans:
+            f = orphan.getD(data.k_Psf) if fluxType == "psf" else orphan.getD(data.k_Ap)
+            if f > 0.0:
+                f *= fmag0
+                orphans.append(-2.5 * numpy.log10(f))
+        return stars, galaxies, orphans
+
+    def testIdentical(self):
+        fmag0 = 3.7e11
+        for fluxType in ("psf", "ap"):
+            task = ZeropointFitQaTask.__new__(ZeropointFitQaTask)
+            task.config = FakeConfig()
+            task.fluxType = fluxType
+            stars, galaxies, orphans = self.loop(fluxType, fmag0)
+
+            cols = task._getMatchedColumns(self.data, self.matchList, fmag0)
+            star = cols['star']
+            for expected, sel in ((stars, star), (galaxies, ~star)):
+                self.assertTrue(len(expected) > 0)
+                for i, k in enumerate(("Refmag", "Imgmag", "Imgerr")):
+                    self.assertTrue(numpy.array_equal(numpy.array([x[i] for x in expected]), cols[k][sel]), k)
+
+            mags = task._getOrphanMags(self.data, self.orphans, fmag0)
+            self.assertTrue(numpy.array_equal(numpy.array(orphans), mags))
+
+#####
+
+def suite():
+    """Returns a suite containing all the test cases in this module."""
+    tests.init()
+
+    suites = []
+    suites += unittest.makeSuite(ZeropointFitQaTestCases)
+    suites += unittest.makeSuite(tests.MemoryTestCase)
+    return unittest.TestSuite(suites)
+
+def run(doExit=False):
+    """Run the tests"""
+    tests.run(suite(), doExit)
+
+if __name__ == "__main__":
+    run(True)